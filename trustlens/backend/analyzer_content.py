@@ -1,57 +1,93 @@
 import cv2
 import numpy as np
 import logging
-import re
 import shutil
-from collections import defaultdict
-import pytesseract   
-
-# Fix Tesseract Path for macOS/Linux/Windows
-tesseract_exe = shutil.which("tesseract")
-if tesseract_exe:
-    pytesseract.pytesseract.tesseract_cmd = tesseract_exe
-
-try:
-    from pyzbar.pyzbar import decode as decode_barcode
-except ImportError:
-    decode_barcode = None
-
-# MediaPipe Import Logic with Fallback
-MP_AVAILABLE = False
-try:
-    import mediapipe as mp
+import threading
+from functools import lru_cache
+from instrumentation import timed
+from pii_matcher import match_words
+
+# Heavy optional engines (Tesseract, ZBar, MediaPipe) are imported lazily on
+# first use. Importing this module stays cheap, which keeps server and CLI
+# cold starts fast.
+
+@lru_cache(maxsize=None)
+def load_tesseract():
+    try:
+        import pytesseract
+    except ImportError:
+        return None
+    # Fix Tesseract Path for macOS/Linux/Windows
+    tesseract_exe = shutil.which("tesseract")
+    if tesseract_exe:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_exe
+    return pytesseract
+
+@lru_cache(maxsize=None)
+def load_barcode_decoder():
+    try:
+        from pyzbar.pyzbar import decode as decode_barcode
+    except ImportError:
+        return None
+    return decode_barcode
+
+@lru_cache(maxsize=None)
+def load_mp_face_detection():
+    # MediaPipe Import Logic with Fallback
+    try:
+        import mediapipe as mp
+    except ImportError:
+        return None
     if hasattr(mp, 'solutions') and hasattr(mp.solutions, 'face_detection'):
-        mp_face_detection = mp.solutions.face_detection
-        MP_AVAILABLE = True
-    else:
-        # try explicit import if available
-        try:
-            from mediapipe.python.solutions import face_detection as mp_face_detection
-            MP_AVAILABLE = True
-        except ImportError:
-            pass
-except ImportError:
-    pass
+        return mp.solutions.face_detection
+    # try explicit import if available
+    try:
+        from mediapipe.python.solutions import face_detection as mp_face_detection
+        return mp_face_detection
+    except ImportError:
+        return None
 
 class AnalyzerContent:
     def __init__(self):
-        self.use_mp = MP_AVAILABLE
-        if self.use_mp:
-            try:
-                self.face_detector = mp_face_detection.FaceDetection(
-                    model_selection=1, 
-                    min_detection_confidence=0.7
+        # Models are built on first use (see _load_face_model)
+        self.use_mp = False
+        self.face_detector = None
+        self.face_cascade = None
+        self._model_lock = threading.Lock()
+
+    def _load_face_model(self):
+        if self.face_detector is not None or self.face_cascade is not None:
+            return
+        with self._model_lock:
+            if self.face_detector is not None or self.face_cascade is not None:
+                return
+            mp_face_detection = load_mp_face_detection()
+            if mp_face_detection is not None:
+                try:
+                    self.face_detector = mp_face_detection.FaceDetection(
+                        model_selection=1, 
+                        min_detection_confidence=0.7
+                    )
+                    self.use_mp = True
+                except Exception as e:
+                    logging.warning(f"MediaPipe initialization failed: {e}. Falling back to OpenCV.")
+
+            if not self.use_mp:
+                self.face_cascade = cv2.CascadeClassifier(
+                    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
                 )
-            except Exception as e:
-                logging.warning(f"MediaPipe initialization failed: {e}. Falling back to OpenCV.")
-                self.use_mp = False
-        
-        if not self.use_mp:
-            self.face_cascade = cv2.CascadeClassifier(
-                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            )
 
+    def warm_up(self):
+        """Loads every engine and runs one dummy inference through each."""
+        self._load_face_model()
+        dummy = np.full((64, 64, 3), 255, dtype=np.uint8)
+        self.analyze_faces(dummy)
+        self.scan_barcodes(dummy)
+        self.scan_text_pii(dummy)
+
+    @timed("faces")
     def analyze_faces(self, image_rgb: np.ndarray):
+        self._load_face_model()
         h, w, _ = image_rgb.shape
         detections = []
         
@@ -76,6 +112,10 @@ class AnalyzerContent:
                 # Fallthrough to OpenCV
         
         # OpenCV Fallback
+        if self.face_cascade is None:
+            self.face_cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+            )
         gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
         # TIGHTER PARAMETERS: scaleFactor 1.2, minNeighbors 8 to ignore hands/noise
         faces = self.face_cascade.detectMultiScale(gray, 1.2, 8)
@@ -91,6 +131,7 @@ class AnalyzerContent:
             
         return detections, False
 
+    @timed("barcodes")
     def scan_barcodes(self, image_rgb: np.ndarray):
         detections = []
         
@@ -110,6 +151,7 @@ class AnalyzerContent:
                 })
 
         # Method 1: Pyzbar (if available)
+        decode_barcode = load_barcode_decoder()
         if decode_barcode:
             def detect_pyzbar(img_data):
                 results = decode_barcode(img_data)
@@ -159,41 +201,23 @@ class AnalyzerContent:
 
         return detections
 
+    @timed("text_pii")
     def scan_text_pii(self, image_rgb: np.ndarray):
         detections = []
+        pytesseract = load_tesseract()
         if not pytesseract:
             return detections
             
-        # Regex patterns for sensitive data
-        cc_pattern = re.compile(r'\b(?:\d[ -]*?){13,19}\b')
-        phone_pattern = re.compile(r'\b(?:\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}\b')
-        ssn_pattern = re.compile(r'\b\d{3}-\d{2}-\d{4}\b')
-        email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
-
         try:
             data = pytesseract.image_to_data(image_rgb, output_type=pytesseract.Output.DICT)
-            lines = defaultdict(list)
-            for i in range(len(data['text'])):
-                if int(data['conf'][i]) > 30 and data['text'][i].strip():
-                    key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
-                    lines[key].append(i)
-
-            for key, word_indices in lines.items():
-                line_text = " ".join([data['text'][i] for i in word_indices]).strip()
-                
-                if cc_pattern.search(line_text) or phone_pattern.search(line_text) or \
-                   ssn_pattern.search(line_text) or email_pattern.search(line_text):
-                    
-                    min_x = min(data['left'][i] for i in word_indices)
-                    min_y = min(data['top'][i] for i in word_indices)
-                    max_x = max(data['left'][i] + data['width'][i] for i in word_indices)
-                    max_y = max(data['top'][i] + data['height'][i] for i in word_indices)
-                    
-                    detections.append({
-                        "type": "PII",
-                        "box": [min_x, min_y, max_x - min_x, max_y - min_y],
-                        "text": "SENSITIVE"
-                    })
+            # One pass over the page; only validated matches, boxed to their own words
+            for match in match_words(data):
+                detections.append({
+                    "type": "PII",
+                    "kind": match["kind"],
+                    "box": match["box"],
+                    "text": "SENSITIVE"
+                })
 
         except Exception as e:
             logging.error(f"OCR Error: {e}")
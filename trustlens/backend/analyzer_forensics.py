@@ -2,8 +2,16 @@ import cv2
 import numpy as np
 from PIL import Image, ImageChops
 import io
+from instrumentation import timed
 
 class AnalyzerForensics:
+    def warm_up(self):
+        """Runs the ELA and FFT paths once so their first real call is fast."""
+        dummy = np.zeros((128, 128, 3), dtype=np.uint8)
+        self.analyze_ela(dummy)
+        self.detect_deepfake_artifacts(dummy)
+
+    @timed("forensics_ela")
     def analyze_ela(self, image_rgb: np.ndarray, quality=90):
         """Standard Error Level Analysis."""
         original = Image.fromarray(image_rgb)
@@ -16,6 +24,7 @@ class AnalyzerForensics:
         max_diff = max([ex[1] for ex in extrema])
         return max_diff > 45
 
+    @timed("forensics_fft")
     def detect_deepfake_artifacts(self, image_rgb: np.ndarray):
         """
         Feature 3: Spectral Analysis (FFT).
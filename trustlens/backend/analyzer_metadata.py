@@ -1,42 +1,331 @@
-import exifread
+import io
 import os
+import struct
+import exifread
+import logging
+from instrumentation import timed, inc
+
+# Critical privacy headers to audit
+privacy_map = {
+    'GPS GPSLatitude': 'GPS Location',
+    'Image Make': 'Camera Make',
+    'Image Model': 'Camera Model',
+    'Image Software': 'Software/OS',
+    'EXIF DateTimeOriginal': 'Timestamp',
+    'Image Artist': 'Owner/Artist'
+}
+
+# Numeric TIFF tag ids for the privacy_map entries, per IFD
+IFD0_TAGS = {0x010F: 'Image Make', 0x0110: 'Image Model', 0x0131: 'Image Software', 0x013B: 'Image Artist'}
+EXIF_TAGS = {0x9003: 'EXIF DateTimeOriginal'}
+GPS_TAGS = {0x0002: 'GPS GPSLatitude'}
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+
+# Size in bytes of each TIFF field type (BYTE, ASCII, SHORT, LONG, RATIONAL, ...)
+TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff', '.heic', '.heif', '.avif'}
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise EOFError("Truncated image header")
+    return data
+
+
+def _jpeg_exif(f):
+    """Walks JPEG marker segments until APP1/Exif, skipping everything else."""
+    f.seek(2)
+    while True:
+        byte = _read_exact(f, 1)
+        if byte != b'\xff':
+            return None
+        marker = _read_exact(f, 1)[0]
+        while marker == 0xFF:  # fill bytes
+            marker = _read_exact(f, 1)[0]
+        if marker in (0xD9, 0xDA):  # EOI / start of scan: no more headers
+            return None
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:  # standalone markers
+            continue
+        length = struct.unpack('>H', _read_exact(f, 2))[0]
+        if marker == 0xE1:
+            payload = _read_exact(f, length - 2)
+            if payload.startswith(b'Exif\x00\x00'):
+                return payload[6:]
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _png_exif(f):
+    """Walks PNG chunks until eXIf. EXIF must precede the pixel data."""
+    f.seek(8)
+    while True:
+        length, ctype = struct.unpack('>I4s', _read_exact(f, 8))
+        if ctype == b'eXIf':
+            return _read_exact(f, length)
+        if ctype in (b'IDAT', b'IEND'):
+            return None
+        f.seek(length + 4, os.SEEK_CUR)  # payload + CRC
+
+
+def _webp_exif(f):
+    """Walks RIFF chunks of a WebP container looking for EXIF."""
+    f.seek(12)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        fourcc, size = struct.unpack('<4sI', header)
+        if fourcc == b'EXIF':
+            data = _read_exact(f, size)
+            return data[6:] if data.startswith(b'Exif\x00\x00') else data
+        f.seek(size + (size & 1), os.SEEK_CUR)
+
+
+def _iter_boxes(f, end):
+    """Yields (type, payload_start, payload_end) for ISOBMFF boxes up to `end`."""
+    while f.tell() + 8 <= end:
+        start = f.tell()
+        size, btype = struct.unpack('>I4s', _read_exact(f, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', _read_exact(f, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return
+        yield btype, start + header, start + size
+        f.seek(start + size)
+
+
+def _uint(data, pos, size):
+    if size == 0:
+        return 0, pos
+    return int.from_bytes(data[pos:pos + size], 'big'), pos + size
+
+
+def _heif_exif(f, file_size):
+    """Locates the Exif item of a HEIC/HEIF/AVIF file via its meta box (iinf + iloc)."""
+    f.seek(0)
+    for btype, start, end in _iter_boxes(f, file_size):
+        if btype != b'meta':
+            continue
+        f.seek(start + 4)  # full box: version + flags
+        exif_id, locations = None, {}
+        for child, c_start, c_end in _iter_boxes(f, end):
+            f.seek(c_start)
+            data = _read_exact(f, c_end - c_start)
+            if child == b'iinf':
+                version = data[0]
+                pos = 4 + (2 if version == 0 else 4)
+                sub = io.BytesIO(data)
+                sub.seek(pos)
+                for etype, e_start, e_end in _iter_boxes(sub, len(data)):
+                    if etype != b'infe' or data[e_start] < 2:
+                        continue
+                    id_size = 2 if data[e_start] == 2 else 4
+                    item_id, p = _uint(data, e_start + 4, id_size)
+                    if data[p + 2:p + 6] == b'Exif':
+                        exif_id = item_id
+            elif child == b'iloc':
+                version = data[0]
+                offset_size, length_size = data[4] >> 4, data[4] & 0x0F
+                base_size = data[5] >> 4
+                index_size = data[5] & 0x0F if version in (1, 2) else 0
+                count, pos = _uint(data, 6, 2 if version < 2 else 4)
+                for _ in range(count):
+                    item_id, pos = _uint(data, pos, 2 if version < 2 else 4)
+                    if version in (1, 2):
+                        pos += 2  # construction method
+                    pos += 2  # data reference index
+                    base, pos = _uint(data, pos, base_size)
+                    extents, pos = _uint(data, pos, 2)
+                    first = None
+                    for _ in range(extents):
+                        _, pos = _uint(data, pos, index_size)
+                        off, pos = _uint(data, pos, offset_size)
+                        length, pos = _uint(data, pos, length_size)
+                        if first is None:
+                            first = (base + off, length)
+                    locations[item_id] = first
+            f.seek(c_end)
+        if exif_id is None or not locations.get(exif_id):
+            return None
+        offset, length = locations[exif_id]
+        f.seek(offset)
+        payload = _read_exact(f, length)
+        # Exif item = 4-byte offset to the TIFF header, then the TIFF data
+        tiff_start = 4 + struct.unpack('>I', payload[:4])[0]
+        return payload[tiff_start:]
+    return None
+
+
+def find_exif_block(f):
+    """
+    Returns the raw TIFF/EXIF block of an image, reading only header bytes.
+    Returns None if the container has no EXIF, and raises ValueError for
+    formats we can't walk ourselves.
+    """
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    f.seek(0)
+    head = f.read(16)
+    if head.startswith(b'\xff\xd8'):
+        return _jpeg_exif(f)
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return _png_exif(f)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _webp_exif(f)
+    if head[4:8] == b'ftyp':
+        return _heif_exif(f, file_size)
+    raise ValueError("Unsupported container for header-only EXIF read")
+
+
+def _format_value(endian, ftype, count, raw):
+    if ftype == 2:
+        return raw.split(b'\x00', 1)[0].decode('utf-8', errors='replace').strip()
+    if ftype in (5, 10):
+        fmt = endian + ('II' if ftype == 5 else 'ii')
+        parts = []
+        for i in range(count):
+            num, den = struct.unpack(fmt, raw[i * 8:i * 8 + 8])
+            if den == 0:
+                parts.append("0")
+            elif num % den == 0:
+                parts.append(str(num // den))
+            else:
+                parts.append(f"{num}/{den}")
+        return f"[{', '.join(parts)}]" if count > 1 else parts[0]
+    if ftype in (3, 4, 9):
+        fmt = endian + {3: 'H', 4: 'I', 9: 'i'}[ftype] * count
+        values = struct.unpack(fmt, raw[:TYPE_SIZES[ftype] * count])
+        return str(values[0]) if count == 1 else str(list(values))
+    return raw.hex()
+
+
+def parse_tiff_tags(tiff):
+    """
+    Extracts the privacy_map tags from a TIFF/EXIF block.
+    Stops as soon as every wanted tag is found, and only follows the EXIF
+    and GPS sub-IFDs if tags are still missing.
+    """
+    if len(tiff) < 8 or tiff[:2] not in (b'II', b'MM'):
+        return {}
+    endian = '<' if tiff[:2] == b'II' else '>'
+    found = {}
+
+    def read_ifd(offset, wanted):
+        pointers = {}
+        if offset <= 0 or offset + 2 > len(tiff):
+            return pointers
+        # IFD entries are sorted by tag id, so nothing we need lies past this one
+        last_tag = max(set(wanted) | {EXIF_IFD_POINTER, GPS_IFD_POINTER})
+        count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+        for i in range(count):
+            entry = offset + 2 + i * 12
+            if entry + 12 > len(tiff):
+                break
+            tag, ftype, n = struct.unpack(endian + 'HHI', tiff[entry:entry + 8])
+            if tag > last_tag:
+                break
+            if tag in (EXIF_IFD_POINTER, GPS_IFD_POINTER):
+                pointers[tag] = struct.unpack(endian + 'I', tiff[entry + 8:entry + 12])[0]
+            elif tag in wanted and ftype in TYPE_SIZES:
+                size = TYPE_SIZES[ftype] * n
+                if size <= 4:
+                    raw = tiff[entry + 8:entry + 8 + size]
+                else:
+                    value_offset = struct.unpack(endian + 'I', tiff[entry + 8:entry + 12])[0]
+                    raw = tiff[value_offset:value_offset + size]
+                if len(raw) == size:
+                    found[wanted[tag]] = _format_value(endian, ftype, n, raw)
+            if len(found) == len(privacy_map):
+                break
+        return pointers
+
+    ifd0 = struct.unpack(endian + 'I', tiff[4:8])[0]
+    pointers = read_ifd(ifd0, IFD0_TAGS)
+    if 'EXIF DateTimeOriginal' not in found and EXIF_IFD_POINTER in pointers:
+        read_ifd(pointers[EXIF_IFD_POINTER], EXIF_TAGS)
+    if 'GPS GPSLatitude' not in found and GPS_IFD_POINTER in pointers:
+        read_ifd(pointers[GPS_IFD_POINTER], GPS_TAGS)
+    return found
+
 
 class AnalyzerMetadata:
+    def _build_report(self, tags, is_stripped):
+        audit_data = []
+        risk_score = 0
+        for tag, label in privacy_map.items():
+            if tag in tags:
+                value = str(tags[tag])
+                # If GPS is found, we flag it as high risk
+                risk_level = "High" if "GPS" in label else "Medium"
+                audit_data.append({"tag": label, "value": value, "risk": risk_level})
+                risk_score += 20
+
+        device = " ".join(str(tags[t]) for t in ('Image Make', 'Image Model') if t in tags)
+        return {
+            "score": min(risk_score, 100),
+            "audit": audit_data,
+            "summary": f"Detected {len(audit_data)} sensitive EXIF headers.",
+            # Structured values consumed by RiskEngine
+            "gps_found": 'GPS GPSLatitude' in tags,
+            "device_info": device or "Unknown",
+            "is_stripped": is_stripped,
+        }
+
+    def _read_tags(self, f):
+        try:
+            tiff = find_exif_block(f)
+            return (parse_tiff_tags(tiff) if tiff else {}), tiff is None
+        except ValueError:
+            # TIFF and exotic containers: let exifread walk the file
+            f.seek(0)
+            # details=False keeps the processing fast for the scan phase
+            tags = exifread.process_file(f, details=False)
+            return {k: str(v) for k, v in tags.items() if k in privacy_map}, not tags
+
+    @timed("metadata")
+    def get_metadata_risk_from_bytes(self, data: bytes):
+        """
+        Audits EXIF headers straight from an in-memory upload.
+        Only the header segments are parsed; pixel data is never touched.
+        """
+        try:
+            tags, is_stripped = self._read_tags(io.BytesIO(data))
+        except Exception as e:
+            logging.warning(f"[METADATA_ERR] {e}")
+            inc("trustlens_errors_total", {"kind": "metadata"})
+            tags, is_stripped = {}, False
+        return self._build_report(tags, is_stripped)
+
+    @timed("metadata")
     def get_metadata_risk(self, file_path):
         """
         Extracts specific EXIF tags for the Metadata Audit table.
         """
-        audit_data = []
-        risk_score = 0
-        
         try:
             with open(file_path, 'rb') as f:
-                # details=False keeps the processing fast for the scan phase
-                tags = exifread.process_file(f, details=False)
-                
-                # Critical privacy headers to audit
-                privacy_map = {
-                    'GPS GPSLatitude': 'GPS Location',
-                    'Image Make': 'Camera Make',
-                    'Image Model': 'Camera Model',
-                    'Image Software': 'Software/OS',
-                    'EXIF DateTimeOriginal': 'Timestamp',
-                    'Image Artist': 'Owner/Artist'
-                }
-
-                for tag, label in privacy_map.items():
-                    if tag in tags:
-                        value = str(tags[tag])
-                        # If GPS is found, we flag it as high risk
-                        risk_level = "High" if "GPS" in label else "Medium"
-                        audit_data.append({"tag": label, "value": value, "risk": risk_level})
-                        risk_score += 20
-                        
+                tags, is_stripped = self._read_tags(f)
         except Exception as e:
-            print(f"[METADATA_ERR] {e}")
+            logging.warning(f"[METADATA_ERR] {e}")
+            inc("trustlens_errors_total", {"kind": "metadata"})
+            tags, is_stripped = {}, False
+        return self._build_report(tags, is_stripped)
 
-        return {
-            "score": min(risk_score, 100),
-            "audit": audit_data,
-            "summary": f"Detected {len(audit_data)} sensitive EXIF headers."
-        }
\ No newline at end of file
+    def audit_directory(self, directory, recursive=True):
+        """
+        Batch mode: yields (path, report) for every image under `directory`,
+        using header reads only.
+        """
+        for root, dirs, files in os.walk(directory):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    path = os.path.join(root, name)
+                    yield path, self.get_metadata_risk(path)
+            if not recursive:
+                break
@@ -0,0 +1,169 @@
+import time
+import cv2
+import numpy as np
+from config import Config
+from instrumentation import timed
+
+# Names of the expensive stages the triage can switch off.
+STAGE_FACES = "faces"
+STAGE_BARCODES = "barcodes"
+STAGE_TEXT = "text_pii"
+ALL_STAGES = (STAGE_FACES, STAGE_BARCODES, STAGE_TEXT)
+
+
+class AnalyzerTriage:
+    """
+    Cheap pre-classifier that runs before AnalyzerContent.
+    It looks at a thumbnail and decides which detectors are worth running.
+    """
+
+    def __init__(self):
+        # Running average of how long each stage takes (ms), used to
+        # estimate how much work a skip actually saved.
+        self.stage_cost_ms = {}
+        self.stats = {"images": 0, "stages_run": 0, "stages_skipped": 0, "ms_saved": 0.0}
+
+    def warm_up(self):
+        self.classify(np.zeros((64, 64, 3), dtype=np.uint8))
+
+    def _thumbnail(self, image_rgb: np.ndarray):
+        """
+        Downscales by a whole factor k. A point sample at twice the target
+        size, then a 2x2 area average: INTER_AREA straight from a 12MP photo
+        costs more than the whole triage, and 2px text strokes survive this.
+        """
+        h, w = image_rgb.shape[:2]
+        k = -(-max(h, w) // Config.TRIAGE_THUMB_SIZE)
+        if k <= 1:
+            return image_rgb
+        sample = cv2.resize(image_rgb, (w // k * 2, h // k * 2), interpolation=cv2.INTER_NEAREST)
+        return cv2.resize(sample, (w // k, h // k), interpolation=cv2.INTER_AREA)
+
+    def _cells(self, values: np.ndarray, block: int):
+        """Sums a float32 2D map over non-overlapping block x block cells."""
+        hb, wb = values.shape[0] // block, values.shape[1] // block
+        if hb == 0 or wb == 0:
+            return values.sum(keepdims=True).reshape(1, 1)
+        trimmed = values[:hb * block, :wb * block]
+        return cv2.resize(trimmed, (wb, hb), interpolation=cv2.INTER_AREA) * float(block * block)
+
+    def _share(self, mask: np.ndarray, block: int):
+        """Fraction of set pixels of a 0/255 mask per block x block cell."""
+        hb, wb = mask.shape[0] // block, mask.shape[1] // block
+        if hb == 0 or wb == 0:
+            return np.full((1, 1), np.count_nonzero(mask) / max(1, mask.size), dtype=np.float32)
+        trimmed = mask[:hb * block, :wb * block].astype(np.float32) * (1.0 / 255.0)
+        return cv2.resize(trimmed, (wb, hb), interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def _verdict(count: int, minimum: int):
+        """Run at the minimum count, defer when close to it, skip otherwise."""
+        if count >= minimum:
+            return "run"
+        if count > 0 and count >= minimum * Config.TRIAGE_NEAR_RATIO:
+            return "defer"
+        return "skip"
+
+    @timed("triage")
+    def classify(self, image_rgb: np.ndarray):
+        """
+        Returns which detectors should run on this image.
+        Each decision is True when the target is *possible*, so a False
+        means the stage can safely be skipped. Stages listed in "deferred"
+        only came close to their threshold: they still run, after the others.
+        """
+        start = time.perf_counter()
+        if not Config.TRIAGE_ENABLED:
+            return {"text": True, "barcode": True, "face": True, "deferred": [], "scores": {}, "elapsed_ms": 0.0}
+
+        thumb = self._thumbnail(image_rgb)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_RGB2GRAY)
+        block, fine = Config.TRIAGE_BLOCK_SIZE, Config.TRIAGE_FINE_BLOCK_SIZE
+        cell_area = float(block * block)
+
+        # 1. Text: strokes produce a high density of edges in small areas.
+        edges = cv2.Canny(gray, 100, 200)
+        fine_edges = self._share(edges, fine)
+        text_cells = int(np.count_nonzero(fine_edges >= Config.TRIAGE_TEXT_EDGE_DENSITY))
+
+        # 2. Barcodes: gradients inside a code all point the same way.
+        # Doubled angles (2θ) catch 1D stripes, quadrupled angles (4θ) catch
+        # the two perpendicular directions of a QR/Datamatrix grid.
+        gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        mag2 = gx * gx + gy * gy
+        z2_re, z2_im = gx * gx - gy * gy, 2.0 * gx * gy
+        inv = 1.0 / (mag2 + 1e-6)
+        z4_re = (z2_re * z2_re - z2_im * z2_im) * inv
+        z4_im = 2.0 * z2_re * z2_im * inv
+
+        energy = self._cells(mag2, block) + 1e-6
+        coh2 = np.hypot(self._cells(z2_re, block), self._cells(z2_im, block)) / energy
+        coh4 = np.hypot(self._cells(z4_re, block), self._cells(z4_im, block)) / energy
+        coherent = np.maximum(coh2, coh4) >= Config.TRIAGE_BARCODE_COHERENCE
+        busy = (energy / cell_area >= Config.TRIAGE_BARCODE_MIN_ENERGY) & \
+               (self._share(edges, block) >= Config.TRIAGE_BARCODE_EDGE_DENSITY)
+        barcode_cells = int(np.count_nonzero(coherent & busy))
+
+        # 3. Faces: skin-coloured cells with features around them. Grayscale
+        # images carry no colour, so we can't rule people out and keep the detector on.
+        ycrcb = cv2.cvtColor(thumb, cv2.COLOR_RGB2YCrCb)
+        skin = self._share(cv2.inRange(ycrcb, (0, 133, 77), (255, 173, 127)), fine)
+        around = cv2.blur(fine_edges, (3, 3))
+        face_cells = int(np.count_nonzero((skin >= Config.TRIAGE_SKIN_CELL_RATIO) &
+                                          (around >= Config.TRIAGE_SKIN_EDGE_DENSITY)))
+        neutral = cv2.inRange(ycrcb, (0, 126, 126), (255, 130, 130))
+        is_colorless = cv2.countNonZero(neutral) == neutral.size
+
+        verdicts = {
+            STAGE_TEXT: self._verdict(text_cells, Config.TRIAGE_TEXT_MIN_CELLS),
+            STAGE_BARCODES: self._verdict(barcode_cells, Config.TRIAGE_BARCODE_MIN_CELLS),
+            STAGE_FACES: "run" if is_colorless else self._verdict(face_cells, Config.TRIAGE_FACE_MIN_CELLS),
+        }
+        return {
+            "text": verdicts[STAGE_TEXT] != "skip",
+            "barcode": verdicts[STAGE_BARCODES] != "skip",
+            "face": verdicts[STAGE_FACES] != "skip",
+            "deferred": [s for s in ALL_STAGES if verdicts[s] == "defer"],
+            "scores": {
+                "text_cells": text_cells,
+                "barcode_cells": barcode_cells,
+                "face_cells": face_cells,
+            },
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def plan(self, decision):
+        """
+        Maps a classify() result to the stages to run, to run later at
+        lower priority (near the threshold) and to skip.
+        """
+        wanted = {
+            STAGE_FACES: decision.get("face", True),
+            STAGE_BARCODES: decision.get("barcode", True),
+            STAGE_TEXT: decision.get("text", True),
+        }
+        deferred = [s for s in ALL_STAGES if wanted[s] and s in decision.get("deferred", ())]
+        run = [s for s in ALL_STAGES if wanted[s] and s not in deferred]
+        skipped = [s for s in ALL_STAGES if not wanted[s]]
+        return run, deferred, skipped
+
+    def record_stage_time(self, stage: str, elapsed_ms: float):
+        """Feeds the running cost estimate with a measured stage duration."""
+        previous = self.stage_cost_ms.get(stage)
+        self.stage_cost_ms[stage] = elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms
+
+    def report(self, decision, skipped, deferred=()):
+        """Summary of what the triage saved, suitable for the API response."""
+        saved = sum(self.stage_cost_ms.get(s, 0.0) for s in skipped)
+        self.stats["images"] += 1
+        self.stats["stages_skipped"] += len(skipped)
+        self.stats["stages_run"] += len(ALL_STAGES) - len(skipped)
+        self.stats["ms_saved"] += saved
+        return {
+            "skipped": skipped,
+            "deferred": list(deferred),
+            "estimated_ms_saved": round(saved, 1),
+            "triage_ms": decision.get("elapsed_ms", 0.0),
+            "scores": decision.get("scores", {}),
+        }
@@ -0,0 +1,61 @@
+"""
+Benchmark: encode time vs. output size for every /api/protect output preset,
+plus the old PIL PNG path for reference.
+
+Usage:
+    python bench_encoders.py --runs 5 --size 2000
+"""
+import argparse
+import io
+import statistics
+import time
+
+import numpy as np
+from PIL import Image
+
+from output_encoders import PRESETS, encode_image
+
+
+def make_photo(size):
+    # Gradient + noise + hard shapes: compresses like a real photo, not like flat colour
+    h, w = int(size * 0.75), size
+    yy, xx = np.mgrid[0:h, 0:w]
+    img = np.stack([xx * 255 // w, yy * 255 // h, (xx + yy) * 255 // (w + h)], axis=-1)
+    img = img + np.random.default_rng(0).integers(0, 24, (h, w, 3))
+    img[h // 4:h // 2, w // 4:w // 2] = (200, 40, 40)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def pil_png(image_rgb):
+    buf = io.BytesIO()
+    Image.fromarray(image_rgb).save(buf, format='PNG', optimize=False)
+    return buf.getvalue()
+
+
+def timed(fn, runs):
+    samples, out = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Output encoder benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--size", type=int, default=2000, help="Image width in px")
+    args = parser.parse_args()
+
+    image = make_photo(args.size)
+    raw = image.nbytes
+    print(f"{'preset':<16}{'encode ms':>11}{'bytes':>12}{'ratio':>8}")
+    ms, size = timed(lambda: pil_png(image), args.runs)
+    print(f"{'pil_png (old)':<16}{ms:>11.1f}{size:>12}{raw / size:>8.2f}")
+    for name in PRESETS:
+        ms, size = timed(lambda: encode_image(image, name), args.runs)
+        print(f"{name:<16}{ms:>11.1f}{size:>12}{raw / size:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Synthetic fixtures for the benchmarks. Everything is generated locally:
+faces are rendered from scikit-image's bundled astronaut photo, QR codes come
+from OpenCV's encoder and the PII text is fake.
+"""
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+from skimage import data as sk_data
+
+SIZES = {"small": (640, 480), "large": (3000, 2000)}
+
+FAKE_PII_LINES = [
+    "Call me at 415-555-0134",
+    "Card 4111 1111 1111 1111",
+    "SSN 123-45-6789",
+    "jane.doe@example.com",
+]
+
+
+def _background(size, seed=0):
+    # Gradient + mild noise, like an out-of-focus photo background
+    w, h = size
+    yy, xx = np.mgrid[0:h, 0:w]
+    img = np.stack([60 + xx * 120 // w, 90 + yy * 100 // h, 140 + (xx + yy) * 60 // (w + h)], axis=-1)
+    img = img + np.random.default_rng(seed).integers(0, 12, (h, w, 3))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def face_sample():
+    """The bundled astronaut portrait, cropped around the face (RGB)."""
+    return sk_data.astronaut()[0:300, 120:360].copy()
+
+
+def render_faces(size, count):
+    canvas = _background(size, seed=count)
+    w, h = size
+    face = face_sample()
+    face_w = max(48, w // (count + 2))
+    face = cv2.resize(face, (face_w, int(face_w * face.shape[0] / face.shape[1])), interpolation=cv2.INTER_AREA)
+    fh, fw = face.shape[:2]
+    for i in range(count):
+        x = (i + 1) * w // (count + 1) - fw // 2
+        y = (h - fh) // 2
+        canvas[y:y + fh, x:x + fw] = face
+    return canvas
+
+
+def render_qr(size, payload="https://example.com/ticket/8842-ACCESS"):
+    canvas = np.full((size[1], size[0], 3), 255, dtype=np.uint8)
+    qr = cv2.QRCodeEncoder.create().encode(payload)
+    side = min(size) // 2
+    qr = cv2.resize(qr, (side, side), interpolation=cv2.INTER_NEAREST)
+    y, x = (size[1] - side) // 2, (size[0] - side) // 2
+    canvas[y:y + side, x:x + side] = cv2.cvtColor(qr, cv2.COLOR_GRAY2RGB)
+    return canvas
+
+
+def render_pii_text(size):
+    w, h = size
+    canvas = np.full((h, w, 3), 255, dtype=np.uint8)
+    scale = w / 640
+    for i, line in enumerate(FAKE_PII_LINES):
+        y = int((i + 1) * h / (len(FAKE_PII_LINES) + 1))
+        cv2.putText(canvas, line, (int(30 * scale), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.9 * scale, (0, 0, 0), max(1, int(2 * scale)), cv2.LINE_AA)
+    return canvas
+
+
+def ocr_word_table(lines=2000, words_per_line=12, seed=0):
+    """A Tesseract image_to_data dict for a long document: prose with the fake PII lines mixed in."""
+    rng = np.random.default_rng(seed)
+    filler = "the invoice total for services rendered is due within days of receipt".split()
+    table = {k: [] for k in ("text", "conf", "block_num", "par_num", "line_num", "left", "top", "width", "height")}
+    for line in range(lines):
+        words = list(rng.choice(filler, words_per_line))
+        if line % 10 == 0:
+            words += FAKE_PII_LINES[(line // 10) % len(FAKE_PII_LINES)].split()
+        x = 0
+        for word in words:
+            for key, value in (("text", str(word)), ("conf", 90), ("block_num", 1), ("par_num", 1),
+                               ("line_num", line), ("left", x), ("top", line * 20),
+                               ("width", 8 * len(word)), ("height", 16)):
+                table[key].append(value)
+            x += 8 * len(word) + 8
+    return table
+
+
+def render_landscape(size):
+    """No text, codes or people: the triage should skip every detector."""
+    return _background(size, seed=99)
+
+
+def generate_fixtures():
+    """Returns {name: RGB array} for every fixture kind at every size."""
+    fixtures = {}
+    for label, size in SIZES.items():
+        fixtures[f"faces1_{label}"] = render_faces(size, 1)
+        fixtures[f"faces3_{label}"] = render_faces(size, 3)
+        fixtures[f"qr_{label}"] = render_qr(size)
+        fixtures[f"pii_{label}"] = render_pii_text(size)
+        fixtures[f"landscape_{label}"] = render_landscape(size)
+    return fixtures
+
+
+def to_jpeg_bytes(image_rgb, with_exif=True, quality=92):
+    """Encodes a fixture as an upload would arrive, optionally with camera EXIF."""
+    buf = io.BytesIO()
+    img = Image.fromarray(image_rgb)
+    if with_exif:
+        exif = Image.Exif()
+        exif[0x010F] = "BenchCam"
+        exif[0x0110] = "Model 1"
+        img.save(buf, format="JPEG", quality=quality, exif=exif.tobytes())
+    else:
+        img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def write_clip(path, frames=90, size=(1280, 720), fps=30):
+    """Writes a short clip of a face panning across the frame, with one hard cut."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    face = face_sample()
+    face = cv2.resize(face, (size[0] // 6, size[0] // 6 * face.shape[0] // face.shape[1]))
+    fh, fw = face.shape[:2]
+    scenes = [_background(size, seed=0), _background(size, seed=1)]
+    for i in range(frames):
+        scene = 0 if i < frames // 2 else 1
+        frame = scenes[scene].copy()
+        x = 20 + (i * 7) % (size[0] - fw - 40)
+        y = (size[1] - fh) // 2 + (30 if scene else 0)
+        frame[y:y + fh, x:x + fw] = face
+        writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    writer.release()
+    return path
@@ -0,0 +1,79 @@
+"""
+Cold-start benchmark for the two entry points (FastAPI server and CLI).
+
+Every sample runs in a fresh interpreter so nothing is cached between runs.
+
+Usage:
+    python bench_startup.py --runs 5
+    python bench_startup.py --runs 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_sample_jpeg(path):
+    # Minimal valid JPEG: SOI + EOI is enough for the EXIF reader to run.
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xd9")
+
+
+def scenarios(sample_path):
+    py = sys.executable
+    return {
+        # Importing the app is what uvicorn does before accepting traffic
+        "server_import": [py, "-c", "import server"],
+        # Import + full warm-up, i.e. the time until /health/ready would pass
+        "server_ready": [py, "-c", "import server, registry; registry.warm_up()"],
+        "cli_help": [py, "main.py", "--help"],
+        "cli_metadata_only": [py, "main.py", "--image", sample_path, "--metadata-only"],
+    }
+
+
+def time_command(cmd, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        elapsed = (time.perf_counter() - start) * 1000
+        if proc.returncode != 0:
+            return {"error": proc.stderr.decode(errors="replace").strip().splitlines()[-1:]}
+        samples.append(elapsed)
+    return {
+        "min_ms": round(min(samples), 1),
+        "median_ms": round(statistics.median(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TrustLens startup-time benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per scenario")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = os.path.join(tmp, "sample.jpg")
+        make_sample_jpeg(sample)
+        results = {name: time_command(cmd, args.runs) for name, cmd in scenarios(sample).items()}
+
+    for name, res in results.items():
+        if "error" in res:
+            print(f"{name:<20} ERROR {res['error']}")
+        else:
+            print(f"{name:<20} min {res['min_ms']:>8} ms   median {res['median_ms']:>8} ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
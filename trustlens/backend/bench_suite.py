@@ -0,0 +1,332 @@
+"""
+Reproducible benchmark suite for every analyzer, protection tool and endpoint.
+
+Fixtures are synthetic (see bench_fixtures.py), so runs are comparable across
+machines and commits. Each case reports p50/p95 latency, throughput and peak
+traced memory. The process peak RSS is reported once at the end.
+
+Usage:
+    python bench_suite.py --runs 10 --out results.json
+    python bench_suite.py --runs 10 --baseline results.json   # exit 1 on regression
+    python bench_suite.py --filter scan_barcodes --runs 3
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import bench_fixtures
+import registry
+from config import Config
+
+
+def _percentile(samples, pct):
+    return float(np.percentile(samples, pct))
+
+
+def run_case(fn, runs, warmup=1):
+    for _ in range(warmup):
+        fn()
+
+    # Memory pass first: tracemalloc slows Python code down, so it gets its own run
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    mean = statistics.fmean(samples)
+    return {
+        "p50_ms": round(_percentile(samples, 50), 3),
+        "p95_ms": round(_percentile(samples, 95), 3),
+        "mean_ms": round(mean, 3),
+        "throughput_per_s": round(1000.0 / mean, 2) if mean > 0 else None,
+        "peak_traced_mb": round(peak / 2**20, 2),
+        "runs": runs,
+    }
+
+
+def analyzer_cases(fixtures, tmp_dir, wanted):
+    content = registry.get("content")
+    triage = registry.get("triage")
+    forensics = registry.get("forensics")
+    metadata = registry.get("metadata")
+    risk = registry.get("risk")
+
+    for name, img in fixtures.items():
+        upload = bench_fixtures.to_jpeg_bytes(img)
+        yield f"triage.classify[{name}]", lambda img=img: triage.classify(img)
+        yield f"content.analyze_faces[{name}]", lambda img=img: content.analyze_faces(img)
+        yield f"content.scan_barcodes[{name}]", lambda img=img: content.scan_barcodes(img)
+        yield f"content.scan_text_pii[{name}]", lambda img=img: content.scan_text_pii(img)
+        yield f"forensics.analyze_ela[{name}]", lambda img=img: forensics.analyze_ela(img)
+        yield f"forensics.detect_deepfake_artifacts[{name}]", lambda img=img: forensics.detect_deepfake_artifacts(img)
+        yield f"metadata.from_bytes[{name}]", lambda data=upload: metadata.get_metadata_risk_from_bytes(data)
+
+    sample_meta = {"gps_found": True, "device_info": "BenchCam Model 1"}
+    detections = [{"type": "FACE", "box": [0, 0, 10, 10]}] * 3
+    yield "risk.calculate_trust_score", lambda: risk.calculate_trust_score(
+        {"ela_manipulated": False}, detections, False, [], [], sample_meta)
+
+    # PII matching alone (no OCR) over a 2000-line document
+    from pii_matcher import match_words
+    words = bench_fixtures.ocr_word_table()
+    yield "pii_matcher.match_words[2000_lines]", lambda: match_words(words)
+
+    # Offline re-score of 100k stored records under a stricter policy
+    if wanted("rescore.rescore[100k]"):
+        import rescore
+        from risk_engine import RiskPolicy, append_records, make_record
+        rng = np.random.default_rng(0)
+        records_path = os.path.join(tmp_dir, "records.jsonl")
+        records = []
+        for i in range(100_000):
+            record = make_record({"ela_manipulated": bool(rng.random() < 0.05)},
+                                 detections[:int(rng.integers(0, 4))], bool(rng.random() < 0.2),
+                                 [{}] * int(rng.random() < 0.3), [{}] * int(rng.random() < 0.1),
+                                 {"gps_found": bool(rng.random() < 0.3)}, source=f"bench-{i}")
+            risk.assess(record, with_report=False)
+            records.append(record)
+        append_records(records_path, records)
+        strict = RiskPolicy("bench-strict", {"gps": 60, "pii": 30})
+        yield "rescore.rescore[100k]", lambda: rescore.rescore(records_path, strict, diff_path=os.devnull)
+
+    # A 24MP upload brought down to the working size (reduced JPEG decode, mapped TIFF strips)
+    import utils_io
+    from PIL import Image
+    large_cases = {
+        ".jpg": ["utils_io.load_image_safe[24mp.jpg]"],
+        ".tif": ["utils_io.load_image_safe[24mp.tif]", "utils_io.read_region[24mp.tif]"],
+    }
+    large = None
+    for ext, names in large_cases.items():
+        if not any(wanted(name) for name in names):
+            continue
+        if large is None:
+            large = cv2.resize(fixtures["landscape_small"], (6000, 4000), interpolation=cv2.INTER_CUBIC)
+        path = os.path.join(tmp_dir, f"large{ext}")
+        Image.fromarray(large).save(path)
+        yield names[0], lambda p=path: utils_io.load_image_safe(p, max_side=Config.WORKING_MAX_SIDE)
+        if ext == ".tif":
+            yield names[1], lambda p=path: utils_io.read_region(p, (3000, 2000, 512, 512))
+
+
+def protection_cases(fixtures, tmp_dir, wanted):
+    tools = registry.get("protection")
+    content = registry.get("content")
+    for name in ("faces3_small", "faces3_large"):
+        img = fixtures[name]
+        # Only the blur and cloak cases need the detected faces
+        needs_faces = wanted(f"protect.visible_blur[{name}]") or wanted(f"protect.ai_cloak[{name}]")
+        faces = content.analyze_faces(img)[0] if needs_faces else []
+        h, w = img.shape[:2]
+        # Fixed boxes keep the cost comparable even when the detector misses
+        targets = faces or [{"type": "FACE", "box": [w // 4, h // 4, w // 6, h // 4]}]
+        data_boxes = [{"type": "PII", "box": [w // 10, h // 10, w // 3, h // 20]}]
+        stroke = [(w * t / 50, h / 2) for t in range(50)]
+        yield f"protect.visible_blur[{name}]", lambda img=img, t=targets + data_boxes: tools.visible_blur(img, t)
+        yield f"protect.ai_cloak[{name}]", lambda img=img, t=targets: tools.ai_cloak(img, t)
+        yield f"protect.apply_brush_blur[{name}]", lambda img=img, s=stroke: tools.apply_brush_blur(img, s)
+        if wanted(f"brush_session.paint_incremental[{name}]"):
+            yield f"brush_session.paint_incremental[{name}]", _incremental_brush(img)
+        yield f"stego.sign[{name}]", lambda img=img: tools.apply_steganography(img.copy(), "bench-session")
+
+        if wanted(f"stego.extract_hidden_key[{name}]"):
+            signed = tools.apply_steganography(img.copy(), "bench-session")
+            path = os.path.join(tmp_dir, f"signed_{name}.png")
+            cv2.imwrite(path, cv2.cvtColor(signed, cv2.COLOR_RGB2BGR))
+            from stega_verify import extract_hidden_key
+            yield f"stego.extract_hidden_key[{name}]", lambda p=path: extract_hidden_key(p)
+
+
+def _incremental_brush(img):
+    """Each call adds one point to a growing stroke, like a user painting."""
+    from brush_session import BrushSession
+    session = BrushSession(img)
+    h, w = img.shape[:2]
+    stroke = []
+
+    def paint():
+        i = len(stroke)
+        stroke.append(((i * 13) % w, h / 2 + (i * 7) % (h // 4)))
+        return session.paint(stroke, tile=True)
+    return paint
+
+
+def endpoint_cases(fixtures, tmp_dir, wanted):
+    names = ("faces1_small", "qr_small", "pii_small", "landscape_small", "faces3_large")
+    endpoints = ("scan", "protect", "verify")
+    if not any(wanted(f"POST /api/{ep}[{name}]") for name in names for ep in endpoints):
+        return
+
+    from fastapi.testclient import TestClient
+    import server
+
+    client = TestClient(server.app)
+    client.get("/health/ready")
+
+    for name in names:
+        upload = bench_fixtures.to_jpeg_bytes(fixtures[name])
+        yield f"POST /api/scan[{name}]", lambda data=upload: _check(
+            client.post("/api/scan", files={"file": ("bench.jpg", data, "image/jpeg")}))
+        if not (wanted(f"POST /api/protect[{name}]") or wanted(f"POST /api/verify[{name}]")):
+            continue
+
+        session_id = client.post("/api/scan", files={"file": ("bench.jpg", upload, "image/jpeg")}).json()["session_id"]
+        form = {"action": "visible_blur,redact_data", "indices": "0,1,2", "session_id": session_id}
+        yield f"POST /api/protect[{name}]", lambda f=form: _check(client.post("/api/protect", data=f))
+
+        if wanted(f"POST /api/verify[{name}]"):
+            signed = _check(client.post("/api/protect", data={"action": "secure_sign", "session_id": session_id})).content
+            yield f"POST /api/verify[{name}]", lambda data=signed: _check(
+                client.post("/api/verify", files={"file": ("signed.png", data, "image/png")}))
+
+
+def video_cases(fixtures, tmp_dir, wanted):
+    if not wanted("video.scan[clip_720p_90f]"):
+        return
+    from video_scanner import VideoScanner
+
+    clip = bench_fixtures.write_clip(os.path.join(tmp_dir, "clip.mp4"))
+    scanner = VideoScanner()
+    out = os.path.join(tmp_dir, "clip_safe.mp4")
+    yield "video.scan[clip_720p_90f]", lambda: scanner.scan(clip, out)
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.url} -> {response.status_code}: {response.text[:200]}")
+    return response
+
+
+def isolated_settings(tmp_dir):
+    """
+    Config overrides that keep benchmark traffic out of the real server
+    state: no near-duplicate reuse (a repeated fixture would become a dedup
+    hit), no detection records, and sessions plus the pHash index in tmp_dir.
+    """
+    return {
+        "PHASH_ENABLED": False,
+        "RISK_RECORDS_PATH": None,
+        "SESSION_BACKEND": "local",
+        "SESSION_DIR": os.path.join(tmp_dir, "sessions"),
+        "PHASH_INDEX_PATH": os.path.join(tmp_dir, "phash_index.sqlite"),
+    }
+
+
+def apply_settings(settings):
+    """Sets Config overrides. Must run before the registry builds the session store or index."""
+    for key, value in settings.items():
+        setattr(Config, key, value)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "metrics_enabled": Config.METRICS_ENABLED,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns the list of cases whose p50 regressed beyond the tolerance."""
+    regressions = []
+    for name, res in results["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base or "p50_ms" not in res or "p50_ms" not in base:
+            continue
+        ratio = res["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        res["vs_baseline"] = round(ratio, 3)
+        if ratio > 1.0 + tolerance:
+            regressions.append((name, base["p50_ms"], res["p50_ms"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TrustLens benchmark suite")
+    parser.add_argument("--runs", type=int, default=10, help="Timed runs per case")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--groups", default="analyzers,protection,endpoints,video",
+                        help="Comma-separated case groups to run")
+    parser.add_argument("--out", help="Write machine-readable results (JSON) here")
+    parser.add_argument("--baseline", help="Compare p50 latencies against a saved results file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed p50 slowdown vs. baseline")
+    args = parser.parse_args()
+
+    groups = {
+        "analyzers": analyzer_cases,
+        "protection": protection_cases,
+        "endpoints": endpoint_cases,
+        "video": video_cases,
+    }
+
+    def wanted(name):
+        # Case generators check this before their (sometimes costly) setup
+        return not args.filter or args.filter in name
+
+    results = {"environment": environment(), "cases": {}}
+    with tempfile.TemporaryDirectory(prefix="trustlens_bench_", ignore_cleanup_errors=True) as tmp_dir:
+        apply_settings(isolated_settings(tmp_dir))
+        fixtures = bench_fixtures.generate_fixtures()
+        registry.warm_up()
+        for group in args.groups.split(","):
+            for name, fn in groups[group.strip()](fixtures, tmp_dir, wanted):
+                if not wanted(name):
+                    continue
+                try:
+                    res = run_case(fn, args.runs)
+                except Exception as e:
+                    res = {"error": str(e)}
+                results["cases"][name] = res
+                if "error" in res:
+                    print(f"{name:<58} ERROR {res['error']}")
+                else:
+                    print(f"{name:<58} p50 {res['p50_ms']:>9.2f} ms  p95 {res['p95_ms']:>9.2f} ms"
+                          f"  {res['throughput_per_s']:>8.2f}/s  {res['peak_traced_mb']:>7.1f} MB")
+
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["peak_rss_mb"] = round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+    print(f"Peak RSS: {results['peak_rss_mb']} MB")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, before, after, ratio in regressions:
+            print(f"[REGRESSION] {name}: {before:.2f} ms -> {after:.2f} ms ({ratio:.2f}x)")
+        exit_code = 1 if regressions else 0
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Incremental brush redaction.
+
+ProtectionTools.apply_brush_blur redoes a 99x99 blur of the whole image on
+every call. A BrushSession computes that blurred layer once, accumulates the
+brush mask across calls and only re-blends the rectangle touched by new
+strokes. The result is pixel-identical to apply_brush_blur on the same
+stroke list.
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import instrumentation
+from config import Config
+
+FEATHER = 25  # Radius of the 51x51 mask feathering kernel
+
+
+class BrushSession:
+    def __init__(self, image_rgb: np.ndarray, radius=None):
+        self.radius = radius or Config.BRUSH_RADIUS
+        self.original = image_rgb
+        with instrumentation.stage("brush_blur_layer"):
+            self.blurred = cv2.GaussianBlur(image_rgb, (99, 99), 30)
+        self.mask = np.zeros(image_rgb.shape[:2], dtype=np.uint8)
+        self.composite = image_rgb.copy()
+        self.points = []
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        h, w = self.original.shape[:2]
+        return w, h
+
+    def _reset(self):
+        self.mask[:] = 0
+        self.composite = self.original.copy()
+        self.points = []
+
+    def _blend(self, x0, y0, x1, y1):
+        """Re-blends one rectangle of the composite from the accumulated mask."""
+        w, h = self.size
+        # The feathered mask at the edge of the rectangle depends on brush
+        # pixels up to FEATHER px outside it, so blur a slightly larger window
+        wx0, wy0 = max(0, x0 - FEATHER), max(0, y0 - FEATHER)
+        wx1, wy1 = min(w, x1 + FEATHER), min(h, y1 + FEATHER)
+        feathered = cv2.GaussianBlur(self.mask[wy0:wy1, wx0:wx1], (51, 51), 0)
+        feathered = feathered[y0 - wy0:y1 - wy0, x0 - wx0:x1 - wx0]
+
+        alpha = np.stack([feathered] * 3, axis=-1).astype(np.float32) / 255.0
+        original = self.original[y0:y1, x0:x1].astype(np.float32)
+        blurred = self.blurred[y0:y1, x0:x1].astype(np.float32)
+        blended = original * (1.0 - alpha) + blurred * alpha
+        self.composite[y0:y1, x0:x1] = np.clip(blended, 0, 255).astype(np.uint8)
+
+    @instrumentation.timed("brush_apply")
+    def apply(self, points):
+        """
+        Applies a full stroke list (pixel coordinates). Points already applied
+        by an earlier call are skipped; if the list no longer starts with them
+        (undo / clear), the session starts over from the original.
+
+        Returns:
+            tuple: The dirty rectangle (x, y, w, h) that changed, or None.
+        """
+        points = [(float(x), float(y)) for x, y in points]
+        dirty = None
+        if points[:len(self.points)] != self.points:
+            had_strokes = bool(self.points)
+            old_mask = self.mask.copy() if had_strokes else None
+            self._reset()
+            if had_strokes:
+                # Everything the old strokes touched has to be restored
+                # (nothing, if they all fell outside the image)
+                ys, xs = np.nonzero(old_mask)
+                if xs.size:
+                    dirty = [int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1]
+
+        new_points = points[len(self.points):]
+        for (x, y) in new_points:
+            cx, cy = int(x), int(y)
+            cv2.circle(self.mask, (cx, cy), self.radius, 255, -1)
+            box = [cx - self.radius, cy - self.radius, cx + self.radius + 1, cy + self.radius + 1]
+            dirty = box if dirty is None else [min(dirty[0], box[0]), min(dirty[1], box[1]),
+                                               max(dirty[2], box[2]), max(dirty[3], box[3])]
+        self.points = points
+        if dirty is None:
+            return None
+
+        # Feathering spreads every stroke by FEATHER px
+        w, h = self.size
+        x0, y0 = max(0, dirty[0] - FEATHER), max(0, dirty[1] - FEATHER)
+        x1, y1 = min(w, dirty[2] + FEATHER), min(h, dirty[3] + FEATHER)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        self._blend(x0, y0, x1, y1)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def paint(self, points, tile=False):
+        """
+        Thread-safe apply() plus a snapshot of the result: the changed tile
+        when `tile` is True (None if nothing changed), else the full image.
+        """
+        with self.lock:
+            dirty = self.apply(points)
+            if not tile:
+                return dirty, self.composite.copy()
+            if dirty is None:
+                return None, None
+            x, y, w, h = dirty
+            return dirty, self.composite[y:y + h, x:x + w].copy()
+
+
+class BrushSessionCache:
+    """Keeps the most recently used brush sessions of this worker in memory."""
+
+    def __init__(self, limit=None):
+        self.limit = limit or Config.BRUSH_SESSION_LIMIT
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+        if session is None:
+            instrumentation.cache_miss("brush")
+        else:
+            instrumentation.cache_hit("brush")
+        return session
+
+    def create(self, session_id, image_rgb):
+        session = BrushSession(image_rgb)
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.limit:
+                self._sessions.popitem(last=False)
+        return session
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
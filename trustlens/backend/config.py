@@ -11,6 +11,24 @@ class Config:
     WEIGHT_CHILD = 30          # Medium penalty: Sharing kids photos is risky ("Sharenting").
     WEIGHT_BARCODE = 20        # Low penalty: Might reveal tickets or receipts.
     WEIGHT_PII = 15            # Low penalty: Email addresses or phone numbers.
+    WEIGHT_FACES = 5           # Small penalty: Adults only, a privacy note.
+
+    # Status bands: RED below RISK_RED_BELOW, GREEN from RISK_GREEN_FROM, AMBER in between.
+    RISK_RED_BELOW = 50
+    RISK_GREEN_FROM = 85
+
+    # Versioned policy file (JSON) that overrides the weights above, see risk_engine.RiskPolicy.
+    RISK_POLICY_PATH = None
+    # Set a path to append a detection record of every /api/scan (JSON Lines),
+    # so scores can be recomputed offline with rescore.py when the policy
+    # changes. Off (None) by default: records keep the session id and what was
+    # found in it, so only turn it on where that may be retained.
+    RISK_RECORDS_PATH = None
+    # Retention: at RISK_RECORDS_MAX_BYTES the file is renamed to <path>.1
+    # (older ones move to .2, .3, ...) and only RISK_RECORDS_BACKUPS old
+    # files are kept; the oldest records are deleted. None never rotates.
+    RISK_RECORDS_MAX_BYTES = 50 * 1024 * 1024
+    RISK_RECORDS_BACKUPS = 5
 
     # --- SENSITIVITY THRESHOLDS (How strict the detectors are) ---
     
@@ -27,4 +45,115 @@ class Config:
     FACE_SIZE_RATIO = 0.20     
     
     # File Paths (For saving safe versions)
-    SAFE_SUFFIX = "_trustlens_safe"
\ No newline at end of file
+    SAFE_SUFFIX = "_trustlens_safe"
+
+    # --- IMAGE LOADING (memory bounds, see utils_io.py) ---
+    # The header is read first: anything above LOAD_MAX_PIXELS is refused
+    # before a single pixel is decoded (decompression bombs, 300MP scans).
+    LOAD_MAX_PIXELS = 150_000_000
+    # Most pixels decoded into memory at once. Larger images are decoded at a
+    # reduced size (JPEG inside the codec, raw TIFF strip by strip); PNG, WebP
+    # and compressed TIFF can only be decoded whole and are refused above it.
+    LOAD_PIXEL_BUDGET = 40_000_000
+    # Longest side the server analyses uploads at.
+    WORKING_MAX_SIDE = 2000
+
+    # --- MULTI-PAGE DOCUMENTS (multi-page TIFF) ---
+    PAGE_WORKERS = 4                  # Pages analysed in parallel (and held in memory) at once.
+    MAX_PAGES = 200                   # Longer documents are refused.
+
+    # --- TRIAGE (Cheap pre-checks before the expensive detectors) ---
+    # A small thumbnail is inspected first. If it clearly cannot contain text,
+    # codes or people, we skip OCR / barcode / face detection entirely.
+    # Every check looks for *local* evidence (a few cells), so a small face or
+    # a single line of text in a large photo still counts.
+    TRIAGE_ENABLED = True
+    TRIAGE_THUMB_SIZE = 512           # Longest side of the triage thumbnail (px).
+    TRIAGE_BLOCK_SIZE = 16            # Cell size (px) used for the barcode statistics.
+    TRIAGE_FINE_BLOCK_SIZE = 8        # Smaller cells for text and skin: a face can be 25px in the thumbnail.
+
+    # Text: fraction of edge pixels inside a fine cell (strokes are dense).
+    TRIAGE_TEXT_EDGE_DENSITY = 0.2
+    TRIAGE_TEXT_MIN_CELLS = 6         # How many dense cells before we call it "text".
+
+    # Barcodes: how aligned the gradients are inside a cell (0 = random, 1 = perfect stripes).
+    TRIAGE_BARCODE_COHERENCE = 0.65
+    TRIAGE_BARCODE_MIN_ENERGY = 400.0 # Ignore flat cells (sky, walls).
+    TRIAGE_BARCODE_EDGE_DENSITY = 0.15 # Stripes mean many edges, a lone horizon does not.
+    TRIAGE_BARCODE_MIN_CELLS = 2
+
+    # Faces: fine cells that are mostly skin (YCrCb range) *and* have edges
+    # around them (eyes, mouth, hairline). A sand-coloured wall has none.
+    TRIAGE_SKIN_CELL_RATIO = 0.5
+    TRIAGE_SKIN_EDGE_DENSITY = 0.05   # Mean edge density of the 3x3 cells around a skin cell.
+    TRIAGE_FACE_MIN_CELLS = 3
+
+    # A stage whose count reaches this share of its minimum (but not the
+    # minimum) is not skipped: it runs after the others, at lower priority.
+    TRIAGE_NEAR_RATIO = 0.5
+    TRIAGE_DEFERRED_SLOTS = 2         # Deferred stages running at once per worker (/api/scan).
+
+    # --- OUTPUT ENCODING (/api/protect) ---
+    # Which encoder preset to use when the client does not ask for one.
+    # See output_encoders.PRESETS for the options.
+    OUTPUT_PRESET = "png"
+    # Signed images must stay lossless, or the hidden signature is destroyed.
+    OUTPUT_SIGNED_PRESET = "png"
+    OUTPUT_CHUNK_SIZE = 64 * 1024     # Bytes per streamed response chunk.
+
+    # --- REDACTION CHECK (re-scan of the redacted areas, see redaction_check.py) ---
+    # Clients can turn it off per request with verify=false.
+    VERIFY_REDACTIONS = True
+    VERIFY_PAD_RATIO = 0.5            # Context around each target, as a share of its longest side.
+    VERIFY_MIN_PAD = 16               # ...but at least this many pixels.
+    VERIFY_MIN_OVERLAP = 0.3          # Overlap (IoU, or share of a text box) that makes a detection a residual.
+    VERIFY_STRIP_GAP = 24             # White rows between stacked PII crops (px).
+    VERIFY_HEADER_MAX_IDS = 20        # Residual ids listed in X-TrustLens-Residual; the rest are counted.
+
+    # --- INSTRUMENTATION ---
+    # Per-stage timers, exported at /metrics and in the Server-Timing header.
+    # When disabled every timer becomes a no-op.
+    METRICS_ENABLED = True
+    # Histogram buckets (seconds) for stage and request latencies.
+    METRICS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    # --- VIDEO SCANNING ---
+    # Full detection only runs on keyframes; boxes are tracked in between.
+    VIDEO_KEYFRAME_INTERVAL = 15      # Force a full detection every N frames.
+    VIDEO_SCENE_THRESHOLD = 25.0      # Mean grey-level change (0-255) that counts as a cut.
+    VIDEO_TRACK_SCALE = 0.5           # Optical flow runs on a downscaled frame.
+    VIDEO_TRACK_POINTS = 20           # Feature points tracked per box.
+    VIDEO_QUEUE_SIZE = 8              # Frames buffered between stages (bounds memory).
+
+    # --- NEAR-DUPLICATE INDEX (perceptual hashing) ---
+    # Bursts, resized copies and re-compressed shares reuse earlier face
+    # results. Barcodes and text are always scanned again and never stored.
+    # Off for /api/scan: turn it on only when every upload comes from the
+    # same owner. Batch runs (main.py --batch) always use it, per directory.
+    PHASH_ENABLED = False
+    PHASH_NAMESPACE = "server"        # Index namespace of /api/scan lookups.
+    PHASH_INDEX_PATH = "phash_index.sqlite"
+    # Hamming distance (out of 64 bits) that still counts as the same picture.
+    # Must stay below 8: the index finds matches by exact 8-bit chunks.
+    PHASH_MAX_DISTANCE = 6
+    # Only reuse detections when the match is at least this confident (1 - distance/64).
+    PHASH_MIN_CONFIDENCE = 0.9
+    # Resized copies keep their shape; crops don't. Max aspect-ratio difference.
+    PHASH_ASPECT_TOLERANCE = 0.02
+
+    # --- BRUSH SESSIONS (interactive manual redaction) ---
+    BRUSH_RADIUS = 30                 # Brush circle radius (px).
+    BRUSH_SESSION_LIMIT = 8           # Sessions kept in memory per worker (LRU).
+
+    # --- SESSION STORAGE (shared between workers / nodes) ---
+    # "local"  : files in SESSION_DIR (single worker, the original layout)
+    # "shared" : NFS-safe layout in SESSION_DIR with atomic writes (many workers/nodes)
+    # "redis"  : any Redis-protocol server at SESSION_REDIS_URL
+    SESSION_BACKEND = "local"
+    SESSION_DIR = "temp_uploads"
+    SESSION_REDIS_URL = "redis://localhost:6379/0"
+    SESSION_TTL = 3600                # Seconds a session stays available.
+    # How often each server worker deletes expired sessions ("local" and
+    # "shared" keep them on disk until then). None turns the loop off, e.g. when a cron job
+    # on one node runs SharedDirSessionStore.purge_expired instead.
+    SESSION_PURGE_INTERVAL = 600
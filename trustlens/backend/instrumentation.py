@@ -0,0 +1,205 @@
+"""
+Lightweight performance instrumentation.
+
+Stage timers feed latency histograms and the per-request Server-Timing
+header. Counters and gauges track errors, in-flight requests, cache hit
+rates and queue depths. Everything is exported in the Prometheus text
+format by render_prometheus().
+
+When Config.METRICS_ENABLED is False, stage() hands back a shared no-op
+context manager and the helpers return immediately.
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+from config import Config
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_help = {}
+
+# Stage timings of the request being served (None outside a request)
+_request_timings = contextvars.ContextVar("trustlens_request_timings", default=None)
+
+_NULL_STAGE = contextlib.nullcontext()
+
+
+def enabled() -> bool:
+    return Config.METRICS_ENABLED
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def describe(name, text):
+    """Registers the # HELP line for a metric."""
+    _help[name] = text
+
+
+def inc(name, labels=None, value=1.0):
+    if not Config.METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def gauge_add(name, delta, labels=None):
+    if not Config.METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0.0) + delta
+
+
+def gauge_set(name, value, labels=None):
+    if not Config.METRICS_ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def observe(name, seconds, labels=None):
+    if not Config.METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    buckets = Config.METRICS_BUCKETS
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"counts": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+        hist["counts"][bisect.bisect_left(buckets, seconds)] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+
+def cache_hit(cache):
+    inc("trustlens_cache_requests_total", {"cache": cache, "result": "hit"})
+
+
+def cache_miss(cache):
+    inc("trustlens_cache_requests_total", {"cache": cache, "result": "miss"})
+
+
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        observe("trustlens_stage_seconds", elapsed, {"stage": self.name})
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.name, elapsed))
+        return False
+
+
+def stage(name):
+    """Context manager timing one pipeline stage: `with stage("decode"): ...`"""
+    if not Config.METRICS_ENABLED:
+        return _NULL_STAGE
+    return _StageTimer(name)
+
+
+def timed(name):
+    """Decorator form of stage() for analyzer and tool methods."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not Config.METRICS_ENABLED:
+                return fn(*args, **kwargs)
+            with _StageTimer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_request():
+    """Starts collecting stage timings for the current request."""
+    if not Config.METRICS_ENABLED:
+        return None
+    return _request_timings.set([])
+
+
+def end_request(token):
+    """
+    Stops collecting and returns the Server-Timing header value
+    (e.g. 'decode;dur=12.1, faces;dur=85.0'), or None when disabled.
+    """
+    if token is None:
+        return None
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings) or None
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Exports every metric in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {k: {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _histograms.items()}
+
+    def header(name, kind, seen):
+        if (name, kind) in seen:
+            return
+        seen.add((name, kind))
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter", seen)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), value in sorted(gauges.items()):
+        header(name, "gauge", seen)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), hist in sorted(histograms.items()):
+        header(name, "histogram", seen)
+        cumulative = 0
+        for bound, count in zip(Config.METRICS_BUCKETS, hist["counts"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Clears every metric (used by the benchmarks between runs)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+describe("trustlens_stage_seconds", "Time spent in each pipeline stage.")
+describe("trustlens_http_request_seconds", "End-to-end HTTP request latency.")
+describe("trustlens_http_in_flight", "Requests currently being served.")
+describe("trustlens_worker_queue_depth", "Jobs waiting for a worker thread.")
+describe("trustlens_cache_requests_total", "Cache lookups by cache and result.")
+describe("trustlens_errors_total", "Handled failures by kind.")
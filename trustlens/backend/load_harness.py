@@ -0,0 +1,498 @@
+"""
+Load harness for the HTTP API: concurrency sweeps over /api/scan,
+/api/protect and /api/verify.
+
+The app runs either in this process (httpx ASGI transport, no sockets) or
+as a local uvicorn with --workers N. At every concurrency level, that many
+virtual users send requests back to back for --duration seconds (a closed
+loop), built from the synthetic fixtures of bench_fixtures.py. Each level
+reports throughput, p50/p95/p99 latency and error rate per endpoint, plus
+CPU and RSS of every server process read from /proc.
+
+The saturation knee of an endpoint is the level with the highest power
+(throughput / mean latency): below it extra clients buy throughput, past
+it they mostly wait in the queue.
+
+In-process numbers include the client's own CPU; use --server uvicorn for
+per-worker figures.
+
+Both servers run with bench_suite.isolated_settings(): the fixtures repeat,
+so the near-duplicate index would turn them into dedup hits, and nothing a
+sweep does should land in the real records, sessions or index.
+
+Usage:
+    python load_harness.py --levels 1,2,4,8,16 --duration 10 --out load.json
+    python load_harness.py --server uvicorn --workers 4 --baseline load.json   # exit 1 on regression
+    python load_harness.py --workloads scan --levels 1,4,16 --duration 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+import bench_fixtures
+from bench_suite import _check, apply_settings, environment, isolated_settings
+
+# Request mix of each workload, endpoint -> weight
+WORKLOADS = {
+    "scan": {"scan": 1},
+    "protect": {"protect": 1},
+    "verify": {"verify": 1},
+    "mixed": {"scan": 5, "protect": 3, "verify": 2},
+}
+
+FIXTURES = ("faces1_small", "faces3_small", "qr_small", "pii_small", "landscape_small")
+
+# Seconds between two /proc samples of the server processes
+SAMPLE_INTERVAL = 0.5
+
+
+def parse_mix(text):
+    """"scan=5,protect=3,verify=2" -> {"scan": 5, ...}"""
+    mix = {}
+    for part in text.split(","):
+        endpoint, _, weight = part.partition("=")
+        if endpoint.strip() not in WORKLOADS["mixed"]:
+            raise ValueError(f"Unknown endpoint in mix: {endpoint}")
+        mix[endpoint.strip()] = float(weight or 1)
+    return mix
+
+
+# --- Server processes -------------------------------------------------------
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 2**20 if hasattr(os, "sysconf") else 0
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _stat_fields(pid):
+    # The command name may contain spaces, everything after its ")" is fixed
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().rsplit(")", 1)[1].split()
+
+
+def read_proc(pid):
+    """(cpu seconds, RSS in MB) of a process, or None off Linux or once it has exited."""
+    try:
+        fields = _stat_fields(pid)
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    # utime and stime are fields 14 and 15 of stat, 11 and 12 after the split
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS, rss_pages * _PAGE_MB
+
+
+def server_pids(root_pid):
+    """{pid: role} for a uvicorn master and the worker processes it spawned."""
+    pids = {root_pid: "master"}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return pids
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            if int(_stat_fields(entry)[1]) != root_pid:
+                continue
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (OSError, IndexError, ValueError):
+            continue
+        # multiprocessing also starts a resource tracker next to the workers
+        pids[int(entry)] = "helper" if b"resource_tracker" in cmdline else "worker"
+    return pids
+
+
+class ProcessSampler:
+    """Tracks CPU use and peak RSS of the server processes over one level."""
+
+    def __init__(self, pids):
+        self.pids = pids
+        self.start_cpu = {}
+        self.peak_rss = {}
+        self._task = None
+
+    async def _sample(self):
+        while True:
+            for pid in self.pids:
+                usage = read_proc(pid)
+                if usage:
+                    self.peak_rss[pid] = max(self.peak_rss.get(pid, 0.0), usage[1])
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    def start(self):
+        self.started = time.perf_counter()
+        for pid in self.pids:
+            usage = read_proc(pid)
+            if usage:
+                self.start_cpu[pid] = usage[0]
+        self._task = asyncio.create_task(self._sample())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        wall = time.perf_counter() - self.started
+        processes = []
+        for pid, role in self.pids.items():
+            usage = read_proc(pid)
+            if not usage or pid not in self.start_cpu:
+                continue
+            processes.append({
+                "pid": pid,
+                "role": role,
+                "cpu_pct": round((usage[0] - self.start_cpu[pid]) / wall * 100, 1),
+                "rss_mb": round(usage[1], 1),
+                "peak_rss_mb": round(max(self.peak_rss.get(pid, 0.0), usage[1]), 1),
+            })
+        return processes
+
+
+# --- Servers ----------------------------------------------------------------
+
+class InProcessServer:
+    """The app in this process, reached through httpx's ASGI transport."""
+
+    def __init__(self, settings):
+        apply_settings(settings)
+        import server
+        self.app = server.app
+        self.pids = {os.getpid(): "in-process"}
+
+    def client(self, timeout, connections):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://trustlens",
+                                 timeout=timeout)
+
+    def stop(self):
+        pass
+
+
+# Imported by every uvicorn worker: Config overrides first, then the app
+APP_MODULE = """# Generated by load_harness.py
+from config import Config
+for key, value in {settings!r}.items():
+    setattr(Config, key, value)
+from server import app
+"""
+
+
+class UvicornServer:
+    """
+    `uvicorn --workers N` on a local port, started from the backend directory.
+    The app is imported through a module written to app_dir that applies
+    `settings` in each worker before server.py is loaded.
+    """
+
+    def __init__(self, workers, port, settings, app_dir, startup_timeout=60.0):
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.workers = workers
+        with open(os.path.join(app_dir, "trustlens_load_app.py"), "w") as f:
+            f.write(APP_MODULE.format(settings=settings))
+        backend = os.path.dirname(os.path.abspath(__file__))
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [app_dir, backend, os.environ.get("PYTHONPATH")]))}
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "trustlens_load_app:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(workers), "--log-level", "warning"],
+            cwd=backend, env=env,
+        )
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {self.proc.returncode}")
+            try:
+                if httpx.get(f"{self.base_url}/health", timeout=1.0).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError("uvicorn did not come up in time")
+            time.sleep(0.2)
+        # Workers register with the master one by one, wait until all are there
+        while (workers > 1 and list(server_pids(self.proc.pid).values()).count("worker") < workers
+               and time.monotonic() < deadline):
+            time.sleep(0.2)
+        self.pids = server_pids(self.proc.pid)
+
+    def client(self, timeout, connections):
+        return httpx.AsyncClient(base_url=self.base_url, timeout=timeout,
+                                 limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections))
+
+    def stop(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+# --- Workload ---------------------------------------------------------------
+
+async def prepare(client, workers):
+    """
+    Uploads for /api/scan, scanned sessions for /api/protect and signed
+    images for /api/verify, one of each per fixture. Also warms the models
+    (once per worker, as far as the load balancer spreads the calls).
+    """
+    for _ in range(max(1, workers) * 2):
+        response = await client.get("/health/ready")
+        if response.status_code != 200:
+            print(f"[!] /health/ready -> {response.status_code}, models will load during the first level")
+            break
+
+    fixtures = bench_fixtures.generate_fixtures()
+    data = {"uploads": {}, "sessions": {}, "signed": {}}
+    for name in FIXTURES:
+        upload = bench_fixtures.to_jpeg_bytes(fixtures[name])
+        scan = _check(await client.post("/api/scan", files={"file": ("load.jpg", upload, "image/jpeg")}))
+        session_id = scan.json()["session_id"]
+        signed = _check(await client.post("/api/protect", data={"action": "secure_sign", "session_id": session_id}))
+        data["uploads"][name] = upload
+        data["sessions"][name] = session_id
+        data["signed"][name] = signed.content
+    return data
+
+
+def request_args(endpoint, fixture, data):
+    """(path, httpx keyword arguments) of one request."""
+    if endpoint == "scan":
+        return "/api/scan", {"files": {"file": ("load.jpg", data["uploads"][fixture], "image/jpeg")}}
+    if endpoint == "protect":
+        form = {"action": "visible_blur,redact_data", "indices": "0,1,2", "session_id": data["sessions"][fixture]}
+        return "/api/protect", {"data": form}
+    return "/api/verify", {"files": {"file": ("signed.png", data["signed"][fixture], "image/png")}}
+
+
+async def virtual_user(client, mix, data, rng, stop_at, samples):
+    endpoints, weights = list(mix), list(mix.values())
+    while time.perf_counter() < stop_at:
+        endpoint = rng.choices(endpoints, weights)[0]
+        path, kwargs = request_args(endpoint, rng.choice(FIXTURES), data)
+        start = time.perf_counter()
+        try:
+            response = await client.post(path, **kwargs)
+            error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        samples.append((endpoint, (time.perf_counter() - start) * 1000, error))
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint (and overall) throughput, latency percentiles and errors."""
+    groups = {}
+    for endpoint, ms, error in samples:
+        groups.setdefault(endpoint, []).append((ms, error))
+    groups["all"] = [(ms, error) for _, ms, error in samples]
+
+    stats = {}
+    for endpoint, rows in groups.items():
+        ok = [ms for ms, error in rows if error is None]
+        errors = Counter(error for _, error in rows if error is not None)
+        entry = {
+            "requests": len(rows),
+            "errors": sum(errors.values()),
+            "error_rate": round(sum(errors.values()) / len(rows), 4) if rows else 0.0,
+            "throughput_per_s": round(len(ok) / elapsed, 2),
+        }
+        if ok:
+            entry.update({
+                "mean_ms": round(float(np.mean(ok)), 2),
+                "p50_ms": round(float(np.percentile(ok, 50)), 2),
+                "p95_ms": round(float(np.percentile(ok, 95)), 2),
+                "p99_ms": round(float(np.percentile(ok, 99)), 2),
+                "max_ms": round(max(ok), 2),
+            })
+        if errors:
+            entry["error_kinds"] = dict(errors.most_common(5))
+        stats[endpoint] = entry
+    return stats
+
+
+async def run_level(client, pids, mix, data, concurrency, duration, seed):
+    samples = []
+    sampler = ProcessSampler(pids)
+    sampler.start()
+    start = time.perf_counter()
+    stop_at = start + duration
+    users = [virtual_user(client, mix, data, random.Random(seed * 1000 + i), stop_at, samples)
+             for i in range(concurrency)]
+    await asyncio.gather(*users)
+    # Requests still in flight at the deadline are finished and counted
+    elapsed = time.perf_counter() - start
+    processes = await sampler.stop()
+    return {"concurrency": concurrency, "elapsed_s": round(elapsed, 2),
+            "endpoints": summarize(samples, elapsed), "processes": processes}
+
+
+def find_knee(levels, endpoint):
+    """
+    The level with the highest power (throughput / mean latency) for an
+    endpoint, and the level with the highest throughput for comparison.
+    """
+    best = peak = None
+    for level in levels:
+        stats = level["endpoints"].get(endpoint)
+        if not stats or not stats.get("mean_ms") or not stats["throughput_per_s"]:
+            continue
+        power = stats["throughput_per_s"] / stats["mean_ms"]
+        if best is None or power > best[0]:
+            best = (power, level["concurrency"], stats)
+        if peak is None or stats["throughput_per_s"] > peak[1]["throughput_per_s"]:
+            peak = (level["concurrency"], stats)
+    if best is None:
+        return None
+    _, concurrency, stats = best
+    return {"concurrency": concurrency, "throughput_per_s": stats["throughput_per_s"], "p95_ms": stats["p95_ms"],
+            "peak_concurrency": peak[0], "peak_throughput_per_s": peak[1]["throughput_per_s"]}
+
+
+def print_level(workload, level):
+    for endpoint, stats in level["endpoints"].items():
+        if endpoint == "all" and len(level["endpoints"]) == 2:
+            continue
+        latency = (f"p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  p99 {stats['p99_ms']:>8.1f} ms"
+                   if "p50_ms" in stats else f"{'no successful requests':<44}")
+        print(f"{workload:<8} c={level['concurrency']:<4} {endpoint:<8} {stats['throughput_per_s']:>8.2f}/s  "
+              f"{latency}  err {stats['error_rate'] * 100:5.1f}%")
+    for proc in level["processes"]:
+        print(f"{'':<15} pid {proc['pid']:<7} {proc['role']:<10} CPU {proc['cpu_pct']:>6.1f}%  "
+              f"RSS {proc['rss_mb']:>7.1f} MB (peak {proc['peak_rss_mb']:.1f})")
+
+
+def compare(results, baseline, tolerance):
+    """
+    Levels where throughput fell or p95 latency rose by more than the
+    tolerance, or the error rate went up, compared with a saved run.
+    """
+    regressions = []
+    for workload, current in results["workloads"].items():
+        base = baseline.get("workloads", {}).get(workload)
+        if not base:
+            continue
+        base_levels = {level["concurrency"]: level for level in base["levels"]}
+        for level in current["levels"]:
+            before = base_levels.get(level["concurrency"])
+            if not before:
+                continue
+            for endpoint, stats in level["endpoints"].items():
+                old = before["endpoints"].get(endpoint)
+                if not old:
+                    continue
+                label = f"{workload} c={level['concurrency']} {endpoint}"
+                if old["throughput_per_s"] and stats["throughput_per_s"] < old["throughput_per_s"] * (1 - tolerance):
+                    regressions.append(f"{label}: throughput {old['throughput_per_s']:.2f}/s -> {stats['throughput_per_s']:.2f}/s")
+                if old.get("p95_ms") and stats.get("p95_ms") and stats["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                    regressions.append(f"{label}: p95 {old['p95_ms']:.1f} ms -> {stats['p95_ms']:.1f} ms")
+                if stats["error_rate"] > old["error_rate"] + 0.01:
+                    regressions.append(f"{label}: errors {old['error_rate'] * 100:.1f}% -> {stats['error_rate'] * 100:.1f}%")
+        for endpoint, knee in current["knees"].items():
+            old_knee = base.get("knees", {}).get(endpoint)
+            if knee and old_knee and knee["concurrency"] != old_knee["concurrency"]:
+                print(f"[*] {workload} {endpoint}: knee moved from c={old_knee['concurrency']} to c={knee['concurrency']}")
+    return regressions
+
+
+async def sweep(args):
+    """Runs every workload at every level, with sessions in a temporary directory removed afterwards."""
+    with tempfile.TemporaryDirectory(prefix="trustlens_load_", ignore_cleanup_errors=True) as tmp_dir:
+        return await run_sweep(args, tmp_dir)
+
+
+async def run_sweep(args, tmp_dir):
+    settings = isolated_settings(tmp_dir)
+    if args.server == "uvicorn":
+        server = UvicornServer(args.workers, args.port, settings, tmp_dir)
+    else:
+        server = InProcessServer(settings)
+    levels = [int(c) for c in args.levels.split(",")]
+    workloads = {name: (parse_mix(args.mix) if name == "mixed" and args.mix else WORKLOADS[name])
+                 for name in args.workloads.split(",")}
+
+    results = {
+        "environment": {**environment(), "server": args.server,
+                        "workers": args.workers if args.server == "uvicorn" else 1},
+        "settings": {"levels": levels, "duration_s": args.duration, "seed": args.seed,
+                     "mixes": workloads, "fixtures": list(FIXTURES)},
+        "workloads": {},
+    }
+    try:
+        async with server.client(args.timeout, max(levels)) as client:
+            data = await prepare(client, args.workers if args.server == "uvicorn" else 1)
+            for name, mix in workloads.items():
+                runs = []
+                for concurrency in levels:
+                    level = await run_level(client, server.pids, mix, data, concurrency, args.duration, args.seed)
+                    print_level(name, level)
+                    runs.append(level)
+                knees = {endpoint: find_knee(runs, endpoint) for endpoint in list(mix) + ["all"]}
+                for endpoint, knee in knees.items():
+                    if knee:
+                        print(f"[*] {name} {endpoint}: knee at c={knee['concurrency']} "
+                              f"({knee['throughput_per_s']:.2f}/s, p95 {knee['p95_ms']:.1f} ms), "
+                              f"peak {knee['peak_throughput_per_s']:.2f}/s at c={knee['peak_concurrency']}")
+                print("-" * 40)
+                results["workloads"][name] = {"mix": mix, "levels": runs, "knees": knees}
+    finally:
+        server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TrustLens load harness")
+    parser.add_argument("--server", choices=("inprocess", "uvicorn"), default="inprocess",
+                        help="Run the app in this process or as a local uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --server uvicorn")
+    parser.add_argument("--workloads", default="scan,protect,verify,mixed",
+                        help=f"Comma-separated workloads: {', '.join(WORKLOADS)}")
+    parser.add_argument("--mix", default="", help='Weights of the mixed workload, e.g. "scan=5,protect=3,verify=2"')
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="Concurrency levels (virtual users) to sweep")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per level")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (s); timeouts count as errors")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the request mix")
+    parser.add_argument("--out", help="Write machine-readable results (JSON) here")
+    parser.add_argument("--baseline", help="Compare against a saved results file")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed throughput drop / p95 rise vs. baseline")
+    args = parser.parse_args()
+
+    for name in args.workloads.split(","):
+        if name not in WORKLOADS:
+            parser.error(f"Unknown workload: {name}")
+    if args.mix:
+        try:
+            parse_mix(args.mix)
+        except ValueError as e:
+            parser.error(str(e))
+
+    results = asyncio.run(sweep(args))
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[REGRESSION] {line}")
+        exit_code = 1 if regressions else 0
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,37 +2,203 @@
 import argparse
 import os
 from config import Config
-from utils_io import load_image_safe, save_image_safe
-from analyzer_forensics import AnalyzerForensics
-from analyzer_content import AnalyzerContent
-from analyzer_metadata import AnalyzerMetadata
-from risk_engine import RiskEngine
-from protection_tools import ProtectionTools
+import registry
+
+def print_metadata_report(meta_report):
+    print("\n" + "="*40)
+    print("TRUSTLENS METADATA AUDIT")
+    print("="*40)
+    for row in meta_report['audit']:
+        print(f"[{row['risk']}] {row['tag']}: {row['value']}")
+    print(meta_report['summary'])
+    print("="*40 + "\n")
+
+def audit_directory(directory):
+    flagged = total = 0
+    for path, meta_report in registry.get("metadata").audit_directory(directory):
+        total += 1
+        if meta_report['audit']:
+            flagged += 1
+            tags = ", ".join(row['tag'] for row in meta_report['audit'])
+            gps = " [GPS]" if meta_report['gps_found'] else ""
+            print(f"[!] {path}{gps}: {tags}")
+    print(f"[*] Audited {total} images, {flagged} with sensitive EXIF headers.")
+
+def run_detectors(image, reuse=None):
+    """
+    Triage, then only the content detectors worth running. Boxes are in pixels.
+    reuse: face results of a near-duplicate (see phash_index), used instead
+    of running the face detector. Barcodes and text are always scanned.
+    """
+    from analyzer_triage import STAGE_FACES, STAGE_BARCODES, STAGE_TEXT
+    content = registry.get("content")
+    triage = registry.get("triage")
+
+    # Cheap triage decides which expensive detectors are worth running.
+    # Near-threshold (deferred) stages only matter for scheduling: run them too.
+    run, deferred, skipped = triage.plan(triage.classify(image))
+    run = run + deferred
+    if reuse is not None:
+        faces, is_child = reuse["faces"], reuse["is_child"]
+    else:
+        faces, is_child = content.analyze_faces(image) if STAGE_FACES in run else ([], False)
+    return {
+        "faces": faces,
+        "is_child": is_child,
+        "barcodes": content.scan_barcodes(image) if STAGE_BARCODES in run else [],
+        "pii": content.scan_text_pii(image) if STAGE_TEXT in run else [],
+        "skipped": skipped,
+    }
+
+def score_record(path, ela_manipulated, result):
+    """Builds and scores the detection record of one batch image or document."""
+    from risk_engine import make_record
+
+    record = make_record(
+        {"ela_manipulated": ela_manipulated},
+        result["faces"] + result["barcodes"], result["is_child"], result["pii"], result["barcodes"],
+        registry.get("metadata").get_metadata_risk(path), source=path,
+    )
+    registry.get("risk").assess(record, with_report=False)
+    return record
+
+def scan_document(index, path, groups, namespace):
+    """
+    Runs the detectors page by page over a multi-page TIFF, a few pages at a
+    time. Prints one line per page, adds the pages to the duplicate groups
+    and returns (merged result, ela flag).
+    """
+    from multipage import iter_pages, map_pages, merge_page_results
+    from phash_index import analyze_with_index
+
+    forensics = registry.get("forensics")
+
+    def analyze_page(page):
+        result, info = analyze_with_index(index, page, run_detectors, namespace)
+        return result, info, forensics.analyze_ela(page)
+
+    pages, ela = [], False
+    for number, (result, info, page_ela) in enumerate(map_pages(iter_pages(path), analyze_page), 1):
+        groups[info["group_id"]].append(f"{path}#p{number}")
+        tag = "DUP" if info["hit"] else "NEW"
+        print(f"[{tag}] {path}#p{number}: {len(result['faces'])} faces, "
+              f"{len(result['barcodes'])} barcodes, {len(result['pii'])} PII")
+        pages.append(result)
+        ela = ela or page_ela
+    return merge_page_results(pages), ela
+
+def batch_scan(directory, records_path=None):
+    """
+    Scans every image in a directory. Near-duplicates (bursts, resized or
+    re-compressed copies) reuse earlier face results through the pHash
+    index, within this directory only; barcodes and text are always read.
+    With records_path, a scored detection record per image is appended
+    there for offline re-scoring (rescore.py).
+    """
+    from collections import defaultdict
+    from utils_io import load_image_safe, probe_image
+    from multipage import is_multipage
+    from analyzer_metadata import IMAGE_EXTENSIONS
+    from phash_index import analyze_with_index
+
+    from risk_engine import append_records
+
+    index = registry.get("phash")
+    namespace = f"batch:{os.path.abspath(directory)}"
+    groups = defaultdict(list)
+    records = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            try:
+                document = is_multipage(probe_image(path))
+                if document:
+                    # Pages are decoded lazily, so a bad page shows up here too
+                    result, ela = scan_document(index, path, groups, namespace)
+                else:
+                    image = load_image_safe(path)
+            except Exception as e:
+                print(f"[!] {path}: {e}")
+                continue
+            if not document:
+                result, info = analyze_with_index(index, image, run_detectors, namespace)
+                groups[info["group_id"]].append(path)
+                tag = "DUP" if info["hit"] else "NEW"
+                print(f"[{tag}] {path}: {len(result['faces'])} faces, "
+                      f"{len(result['barcodes'])} barcodes, {len(result['pii'])} PII")
+                ela = registry.get("forensics").analyze_ela(image) if records_path else False
+            if records_path:
+                records.append(score_record(path, ela, result))
+                if len(records) >= 500:
+                    append_records(records_path, records)
+                    records = []
+
+    if records_path:
+        append_records(records_path, records)
+
+    print("-" * 40)
+    for members in groups.values():
+        if len(members) > 1:
+            print(f"[*] Duplicate group: {', '.join(members)}")
+    report = index.report()
+    print(f"[*] {report['lookups']} images, {len(groups)} unique, "
+          f"hit rate {report['hit_rate'] * 100:.1f}%, detector time saved {report['detector_ms_saved'] / 1000:.1f}s")
 
 def main():
     parser = argparse.ArgumentParser(description="TrustLens - Universal Safety Suite")
-    parser.add_argument("--image", required=True, help="Path to image file")
+    parser.add_argument("--image", help="Path to image file")
+    parser.add_argument("--metadata-only", action="store_true",
+                        help="Only audit EXIF headers (skips loading the vision engines)")
+    parser.add_argument("--audit-dir", help="Batch EXIF audit of every image in a directory (header reads only)")
+    parser.add_argument("--batch", help="Scan every image in a directory, reusing results for near-duplicates")
+    parser.add_argument("--records", help="With --batch: append a detection record per image (JSON Lines) for rescore.py")
     args = parser.parse_args()
 
+    if args.audit_dir:
+        audit_directory(args.audit_dir)
+        return
+    if args.batch:
+        batch_scan(args.batch, args.records)
+        return
+    if not args.image:
+        parser.error("--image is required unless --audit-dir or --batch is given")
+
+    if args.metadata_only:
+        # Fast path: no pixels decoded, no vision libraries imported
+        print_metadata_report(registry.get("metadata").get_metadata_risk(args.image))
+        return
+
     print(f"[*] Loading {args.image}...")
     
     try:
+        # Imported here so the metadata-only path stays lightweight
+        from utils_io import load_image_safe, probe_image, save_image_safe
+        from multipage import is_multipage
+
+        if is_multipage(probe_image(args.image)):
+            # The interactive flow below handles one page; loading would silently keep only the first
+            print(f"[!] {args.image} is a multi-page document. Use --batch on its directory to scan every page, "
+                  f"or /api/scan and /api/protect to redact it.")
+            return
         image = load_image_safe(args.image)
         # Initialize Tools
-        forensics = AnalyzerForensics()
-        content = AnalyzerContent()
-        metadata_tool = AnalyzerMetadata()
-        risk_engine = RiskEngine()
-        protector = ProtectionTools()
+        forensics = registry.get("forensics")
+        metadata_tool = registry.get("metadata")
+        risk_engine = registry.get("risk")
+        protector = registry.get("protection")
     except Exception as e:
         print(f"[!] Error loading system: {e}")
         return
 
     # --- ANALYSIS PHASE ---
     print("[*] Running Analysis Modules...")
-    faces, is_child = content.analyze_faces(image)
-    barcodes = content.scan_barcodes(image)
-    pii = content.scan_text_pii(image)
+    detected = run_detectors(image)
+    faces, is_child = detected["faces"], detected["is_child"]
+    barcodes, pii = detected["barcodes"], detected["pii"]
+    if detected["skipped"]:
+        print(f"[*] Triage skipped: {', '.join(detected['skipped'])}")
     meta_report = metadata_tool.get_metadata_risk(args.image)
     ela_status = forensics.analyze_ela(image)
 
@@ -42,8 +208,8 @@ def main():
 
     # Calculate Score
     forensics_report = {'ela_manipulated': ela_status}
-    score, threats = risk_engine.calculate_trust_score(
-        forensics_report, all_detections, is_child, pii, barcodes, meta_report
+    score, threats, _ = risk_engine.calculate_trust_score(
+        forensics_report, all_detections, is_child, pii, barcodes, meta_report, with_report=False
     )
 
     # --- REPORTING PHASE ---
@@ -0,0 +1,306 @@
+"""
+Lossless metadata stripping.
+
+Removes EXIF, XMP, IPTC and GPS data by rewriting the container byte stream
+(JPEG marker segments, PNG chunks, WebP RIFF chunks). Pixel data is copied
+as-is, never decoded or re-encoded, and large files are streamed in blocks.
+A JPEG whose EXIF rotates it keeps a minimal EXIF block with only the
+Orientation tag, so it still displays the way it was scanned.
+
+Usage:
+    python metadata_stripper.py photo.jpg
+    python metadata_stripper.py ./library --out-dir ./clean
+"""
+import argparse
+import io
+import os
+import struct
+from config import Config
+
+CHUNK_SIZE = 1 << 20  # Copy pixel data in 1 MB blocks
+
+# JPEG APPn segments we keep: JFIF (APP0), Adobe colour transform (APP14).
+# APP2 is kept only when it carries an ICC profile, so colours stay correct.
+JPEG_KEEP_APP = {0xE0, 0xEE}
+# PNG ancillary chunks that carry metadata (text, timestamps, EXIF)
+PNG_DROP = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+# WebP chunks that carry metadata
+WEBP_DROP = {b'EXIF', b'XMP '}
+
+EXIF_ORIENTATION = 0x0112
+
+MEDIA_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+
+def detect_format(head: bytes):
+    if head.startswith(b'\xff\xd8'):
+        return "jpeg"
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "png"
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return "webp"
+    return None
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("Truncated image file")
+    return data
+
+
+def _copy(f, n):
+    """Yields exactly n bytes from f in CHUNK_SIZE blocks."""
+    while n > 0:
+        block = _read_exact(f, min(n, CHUNK_SIZE))
+        n -= len(block)
+        yield block
+
+
+def _exif_orientation(payload):
+    """The Orientation (1-8) in an APP1 Exif payload, or None if absent or unreadable."""
+    tiff = payload[6:]
+    if tiff[:2] not in (b'II', b'MM'):
+        return None
+    endian = '<' if tiff[:2] == b'II' else '>'
+    try:
+        offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        count = struct.unpack(endian + 'H', tiff[offset:offset + 2])[0]
+        for i in range(count):
+            entry = tiff[offset + 2 + i * 12:offset + 14 + i * 12]
+            tag, ftype, n = struct.unpack(endian + 'HHI', entry[:8])
+            if tag == EXIF_ORIENTATION and ftype == 3 and n == 1:
+                value = struct.unpack(endian + 'H', entry[8:10])[0]
+                return value if 1 <= value <= 8 else None
+    except struct.error:
+        return None
+    return None
+
+
+def _orientation_segment(orientation):
+    """APP1 segment holding an EXIF block with nothing but the Orientation tag."""
+    tiff = (b'II' + struct.pack('<HI', 42, 8) + struct.pack('<H', 1)
+            + struct.pack('<HHIHH', EXIF_ORIENTATION, 3, 1, orientation, 0) + struct.pack('<I', 0))
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _iter_jpeg(f, removed):
+    yield _read_exact(f, 2)  # SOI
+    kept_orientation = False
+    while True:
+        marker = _read_exact(f, 2)
+        while marker[1] == 0xFF:  # fill bytes before a marker
+            marker = marker[1:] + _read_exact(f, 1)
+        code = marker[1]
+        if marker[0] != 0xFF:
+            raise ValueError("Corrupt JPEG marker stream")
+        if code == 0xD9:
+            yield marker
+            return
+        if code == 0x01 or 0xD0 <= code <= 0xD7:
+            yield marker
+            continue
+        length_bytes = _read_exact(f, 2)
+        length = struct.unpack('>H', length_bytes)[0]
+        if code == 0xDA:
+            # Start of scan: everything up to EOI is image data. Copy it
+            # untouched and drop any trailer appended after EOI.
+            yield marker + length_bytes
+            yield from _copy(f, length - 2)
+            yield from _iter_jpeg_scan(f, removed)
+            return
+
+        drop = (0xE0 <= code <= 0xEF and code not in JPEG_KEEP_APP) or code == 0xFE
+        if code == 0xE1:
+            # Decoders apply the EXIF rotation: keep it, or the photo turns sideways
+            payload = _read_exact(f, length - 2)
+            removed.append(f"APP1:{length}")
+            orientation = _exif_orientation(payload) if payload.startswith(b'Exif\x00\x00') else None
+            if orientation not in (None, 1) and not kept_orientation:
+                kept_orientation = True
+                yield _orientation_segment(orientation)
+            continue
+        if code == 0xE2:
+            payload = _read_exact(f, length - 2)
+            if payload.startswith(b'ICC_PROFILE\x00'):
+                yield marker + length_bytes + payload
+            else:
+                removed.append(f"APP2:{length}")
+            continue
+        if drop:
+            removed.append(("COM" if code == 0xFE else f"APP{code - 0xE0}") + f":{length}")
+            f.seek(length - 2, os.SEEK_CUR)
+        else:
+            yield marker + length_bytes
+            yield from _copy(f, length - 2)
+
+
+def _iter_jpeg_scan(f, removed):
+    """Streams entropy-coded data up to and including EOI (FF D9)."""
+    carry = b''
+    while True:
+        block = f.read(CHUNK_SIZE)
+        if not block:
+            yield carry
+            return
+        data = carry + block
+        end = data.find(b'\xff\xd9')
+        if end >= 0:
+            yield data[:end + 2]
+            # Anything after EOI (vendor trailers, MPF previews) is dropped
+            position = f.tell()
+            f.seek(0, os.SEEK_END)
+            trailer = len(data) - end - 2 + f.tell() - position
+            if trailer:
+                removed.append(f"TRAILER:{trailer}")
+            return
+        # Keep a dangling FF so a marker split across blocks is still found
+        if data.endswith(b'\xff'):
+            yield data[:-1]
+            carry = b'\xff'
+        else:
+            yield data
+            carry = b''
+
+
+def _iter_png(f, removed):
+    yield _read_exact(f, 8)
+    while True:
+        header = _read_exact(f, 8)
+        length, ctype = struct.unpack('>I4s', header)
+        if ctype in PNG_DROP:
+            removed.append(f"{ctype.decode()}:{length}")
+            f.seek(length + 4, os.SEEK_CUR)
+            continue
+        yield header
+        yield from _copy(f, length + 4)  # payload + CRC
+        if ctype == b'IEND':
+            return
+
+
+def _iter_webp(f, removed):
+    # RIFF size must be known up front, so index the chunks first (seeks only)
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    f.seek(12)
+    chunks = []
+    while f.tell() + 8 <= file_size:
+        fourcc, size = struct.unpack('<4sI', _read_exact(f, 8))
+        padded = size + (size & 1)
+        chunks.append((fourcc, f.tell(), size, padded))
+        f.seek(padded, os.SEEK_CUR)
+
+    kept = []
+    for chunk in chunks:
+        if chunk[0] in WEBP_DROP:
+            removed.append(f"{chunk[0].decode().strip()}:{chunk[2]}")
+        else:
+            kept.append(chunk)
+
+    riff_size = 4 + sum(8 + padded for _, _, _, padded in kept)
+    yield b'RIFF' + struct.pack('<I', riff_size) + b'WEBP'
+    for fourcc, offset, size, padded in kept:
+        f.seek(offset)
+        yield fourcc + struct.pack('<I', size)
+        if fourcc == b'VP8X':
+            payload = bytearray(_read_exact(f, padded))
+            payload[0] &= ~0x0C & 0xFF  # clear the EXIF (0x08) and XMP (0x04) flags
+            yield bytes(payload)
+        else:
+            yield from _copy(f, padded)
+
+
+def iter_stripped(src, stats=None):
+    """
+    Yields the bytes of `src` (a seekable binary file) with metadata removed.
+    If `stats` is a dict it receives the detected format and removed segments.
+    Raises ValueError for formats that can't be rewritten losslessly.
+    """
+    src.seek(0)
+    fmt = detect_format(src.read(16))
+    src.seek(0)
+    if fmt is None:
+        raise ValueError("Unsupported format for lossless metadata stripping")
+    removed = []
+    if stats is not None:
+        stats["format"] = fmt
+        stats["removed"] = removed
+    walker = {"jpeg": _iter_jpeg, "png": _iter_png, "webp": _iter_webp}[fmt]
+    for piece in walker(src, removed):
+        if piece:
+            yield piece
+
+
+def strip_stream(src, dst):
+    """Writes a metadata-free copy of `src` into `dst`. Returns the stats dict."""
+    stats = {}
+    written = 0
+    for piece in iter_stripped(src, stats):
+        dst.write(piece)
+        written += len(piece)
+    stats["bytes_out"] = written
+    return stats
+
+
+def strip_bytes(data: bytes) -> bytes:
+    out = io.BytesIO()
+    strip_stream(io.BytesIO(data), out)
+    return out.getvalue()
+
+
+def strip_file(in_path, out_path):
+    # Write to a temp name first so a failure never leaves a half file behind
+    tmp_path = out_path + ".part"
+    try:
+        with open(in_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            stats = strip_stream(src, dst)
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    stats["bytes_in"] = os.path.getsize(in_path)
+    return stats
+
+
+def _iter_inputs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TrustLens lossless metadata stripper")
+    parser.add_argument("inputs", nargs="+", help="Image files or directories")
+    parser.add_argument("--out-dir", help="Write clean copies here (default: next to the original)")
+    parser.add_argument("--suffix", default=Config.SAFE_SUFFIX, help="Suffix for clean copies")
+    args = parser.parse_args()
+
+    done = skipped = 0
+    for path in _iter_inputs(args.inputs):
+        with open(path, 'rb') as f:
+            if detect_format(f.read(16)) is None:
+                skipped += 1
+                continue
+        base, ext = os.path.splitext(os.path.basename(path))
+        out_dir = args.out_dir or os.path.dirname(path)
+        os.makedirs(out_dir, exist_ok=True)
+        out_path = os.path.join(out_dir, f"{base}{args.suffix}{ext}")
+        try:
+            stats = strip_file(path, out_path)
+        except ValueError as e:
+            print(f"[!] {path}: {e}")
+            skipped += 1
+            continue
+        done += 1
+        removed = ", ".join(stats["removed"]) or "nothing"
+        print(f"[*] {path} -> {out_path} (removed {removed})")
+    print(f"[*] Stripped {done} files, skipped {skipped}.")
+
+
+if __name__ == "__main__":
+    main()
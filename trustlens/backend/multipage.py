@@ -0,0 +1,112 @@
+"""
+Multi-page documents: multi-page TIFFs, e.g. scans or PDF exports.
+
+Pages are decoded one at a time with PIL's ImageSequence and handed to a
+small worker pool, so at most Config.PAGE_WORKERS pages are in memory at
+once, however long the document is. Redacted output is written page by
+page into a new multi-page TIFF.
+"""
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image, ImageSequence, TiffImagePlugin
+
+from config import Config
+from utils_io import ImageTooLarge
+
+# Containers whose extra frames are pages (not animation frames)
+MULTIPAGE_FORMATS = ("TIFF",)
+MEDIA_TYPE = "image/tiff"
+
+def is_multipage(info) -> bool:
+    """Takes utils_io.probe_image output."""
+    return info["format"] in MULTIPAGE_FORMATS and info["frames"] > 1
+
+def _open(source):
+    return Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+def iter_pages(source, max_side=None):
+    """
+    Yields every page of a document as an RGB array, decoding lazily.
+    Pages larger than max_side are downscaled before the next one is read.
+    """
+    with _open(source) as img:
+        for index, frame in enumerate(ImageSequence.Iterator(img)):
+            if index >= Config.MAX_PAGES:
+                raise ImageTooLarge(f"Document has more than {Config.MAX_PAGES} pages.")
+            w, h = frame.size
+            if w * h > Config.LOAD_MAX_PIXELS:
+                raise ImageTooLarge(f"Page {index + 1} is {w}x{h}, above the {Config.LOAD_MAX_PIXELS} pixel limit.")
+            page = np.asarray(frame.convert("RGB"))
+            if max_side and max(w, h) > max_side:
+                scale = max_side / max(w, h)
+                page = cv2.resize(page, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            yield page
+
+def map_pages(pages, fn, workers=None):
+    """
+    Applies fn to every page on a thread pool and yields the results in page
+    order. No more than `workers` pages are decoded and waiting at a time.
+    """
+    workers = workers or Config.PAGE_WORKERS
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for page in pages:
+            pending.append(pool.submit(fn, page))
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+class PageWriter:
+    """Writes RGB pages one by one into a multi-page TIFF (lossless, deflate)."""
+    def __init__(self, fp):
+        self._writer = TiffImagePlugin.AppendingTiffWriter(fp, True)
+        self.pages = 0
+
+    def add(self, page_rgb):
+        Image.fromarray(page_rgb).save(self._writer, format="TIFF", compression="tiff_deflate")
+        self._writer.newFrame()
+        self.pages += 1
+
+    def close(self):
+        if self._writer.closed:
+            return
+        self._writer.close()
+        # The writer is an io.BytesIO subclass: unless it is marked closed, its
+        # finalizer runs close() again later and moves the target file's position
+        io.BytesIO.close(self._writer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_pages(pages) -> bytes:
+    """Encodes an iterable of RGB pages as one multi-page TIFF."""
+    buffer = io.BytesIO()
+    with PageWriter(buffer) as writer:
+        for page in pages:
+            writer.add(page)
+    return buffer.getvalue()
+
+def merge_page_results(pages):
+    """
+    Flattens per-page detections (dicts with faces/is_child/barcodes/pii) into
+    one set for the RiskEngine. Every detection is tagged with its page.
+    """
+    faces, barcodes, pii = [], [], []
+    for index, page in enumerate(pages):
+        faces += [{**d, "page": index} for d in page["faces"]]
+        barcodes += [{**d, "page": index} for d in page["barcodes"]]
+        pii += [{**d, "page": index} for d in page["pii"]]
+    return {
+        "faces": faces,
+        "is_child": any(page["is_child"] for page in pages),
+        "barcodes": barcodes,
+        "pii": pii,
+    }
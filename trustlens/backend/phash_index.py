@@ -0,0 +1,213 @@
+"""
+Perceptual-hash index for near-duplicate detection and result reuse.
+
+Images are reduced to a 64-bit pHash (DCT of a 32x32 grey thumbnail) or
+dHash. Hashes live in an on-disk SQLite multi-index table: the hash is split
+into eight 8-bit chunks, each indexed. Any two hashes within Hamming distance
+7 share at least one chunk exactly, so a lookup only compares the rows that
+match a chunk instead of the whole archive.
+
+Only the face stage is reused. Barcode payloads and OCR text can change
+without moving a 32x32 hash (same photo, different QR code), and decoded
+content must never be served to another upload, so those stages always
+run again and nothing they find is stored. Every row belongs to a
+namespace (a batch run, one tenant); lookups never cross namespaces.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import instrumentation
+from config import Config
+
+CHUNKS = 8
+
+# The parts of a result that may be stored and reused on a hit
+REUSED_KEYS = ("faces", "is_child")
+# Face fields worth keeping: anything else a detector adds stays out of the index
+_FACE_FIELDS = ("type", "box", "confidence")
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2.0)
+    return m.astype(np.float32)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _gray(image_rgb):
+    return image_rgb if image_rgb.ndim == 2 else cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+
+
+def phash(image_rgb: np.ndarray) -> int:
+    """64-bit DCT hash: robust to resizing and JPEG re-compression."""
+    small = cv2.resize(_gray(image_rgb), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = (_DCT32 @ small @ _DCT32.T)[:8, :8]
+    # Median without the DC term, which only carries overall brightness
+    median = np.median(low.ravel()[1:])
+    return _bits_to_int(low > median)
+
+
+def dhash(image_rgb: np.ndarray) -> int:
+    """64-bit gradient hash: cheaper than pHash, a bit less robust."""
+    small = cv2.resize(_gray(image_rgb), (9, 8), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _chunks(value: int):
+    return [(value >> (8 * (CHUNKS - 1 - i))) & 0xFF for i in range(CHUNKS)]
+
+
+def reusable_part(result):
+    """What of a result goes into the index: face boxes and the child flag only."""
+    return {
+        "faces": [{k: f[k] for k in _FACE_FIELDS if k in f} for f in result["faces"]],
+        "is_child": bool(result["is_child"]),
+    }
+
+
+def rescale_result(result, from_size, to_size):
+    """Rescales every face box in a stored result to a new image size."""
+    sx = to_size[0] / from_size[0]
+    sy = to_size[1] / from_size[1]
+    faces = [{**d, "box": [d["box"][0] * sx, d["box"][1] * sy, d["box"][2] * sx, d["box"][3] * sy]}
+             for d in result["faces"]]
+    return {**result, "faces": faces}
+
+
+class PHashIndex:
+    def __init__(self, path=None):
+        if Config.PHASH_MAX_DISTANCE >= CHUNKS:
+            raise ValueError("PHASH_MAX_DISTANCE must be below 8 for the multi-index lookup")
+        self.path = path or Config.PHASH_INDEX_PATH
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        existing = [row[1] for row in self._db.execute("PRAGMA table_info(images)")]
+        if existing and "namespace" not in existing:
+            # Indexes from before namespaces stored full results, barcode payloads included
+            self._db.execute("DROP TABLE images")
+        columns = ", ".join(f"b{i} INTEGER" for i in range(CHUNKS))
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS images (id INTEGER PRIMARY KEY, namespace TEXT, hash TEXT, {columns}, "
+            "width INTEGER, height INTEGER, group_id INTEGER, analysis_ms REAL, result TEXT)"
+        )
+        for i in range(CHUNKS):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS idx_b{i} ON images (b{i})")
+        self._db.commit()
+        self.stats = {"lookups": 0, "hits": 0, "ms_saved": 0.0}
+
+    def hash_image(self, image_rgb):
+        return phash(image_rgb)
+
+    def lookup(self, value: int, width: int, height: int, namespace: str):
+        """
+        Finds the closest image of the same namespace within PHASH_MAX_DISTANCE.
+        Returns a match dict, or None. `reusable` tells whether the match is
+        confident enough (and the same shape) to reuse its face detections.
+        """
+        chunks = _chunks(value)
+        where = " OR ".join(f"b{i} = ?" for i in range(CHUNKS))
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, hash, width, height, group_id, analysis_ms, result FROM images "
+                f"WHERE namespace = ? AND ({where})",
+                [namespace, *chunks],
+            ).fetchall()
+        self.stats["lookups"] += 1
+
+        best = None
+        for row_id, hex_hash, w, h, group_id, analysis_ms, result in rows:
+            distance = hamming(value, int(hex_hash, 16))
+            if distance <= Config.PHASH_MAX_DISTANCE and (best is None or distance < best["distance"]):
+                best = {"id": row_id, "distance": distance, "size": (w, h), "group_id": group_id,
+                        "analysis_ms": analysis_ms, "result": result}
+        if best is None:
+            instrumentation.cache_miss("phash")
+            return None
+
+        confidence = 1.0 - best["distance"] / 64.0
+        aspect_delta = abs(width / height - best["size"][0] / best["size"][1])
+        best["confidence"] = round(confidence, 4)
+        best["reusable"] = confidence >= Config.PHASH_MIN_CONFIDENCE and aspect_delta <= Config.PHASH_ASPECT_TOLERANCE
+        if best["reusable"]:
+            best["result"] = rescale_result(json.loads(best["result"]), best["size"], (width, height))
+            self.stats["hits"] += 1
+            instrumentation.cache_hit("phash")
+        else:
+            best["result"] = None
+            instrumentation.cache_miss("phash")
+        return best
+
+    def add(self, value: int, width: int, height: int, result, analysis_ms: float, namespace: str, group_id=None):
+        """
+        Stores an analysed image (its reusable part only, see reusable_part).
+        Returns its group id (its own id if it starts a group).
+        """
+        stored = json.dumps(reusable_part(result), default=float)
+        with self._lock:
+            cur = self._db.execute(
+                f"INSERT INTO images (namespace, hash, {', '.join(f'b{i}' for i in range(CHUNKS))}, width, height, "
+                f"group_id, analysis_ms, result) VALUES (?, ?, {', '.join('?' * CHUNKS)}, ?, ?, ?, ?, ?)",
+                [namespace, f"{value:016x}", *_chunks(value), width, height, group_id, analysis_ms, stored],
+            )
+            row_id = cur.lastrowid
+            if group_id is None:
+                self._db.execute("UPDATE images SET group_id = ? WHERE id = ?", (row_id, row_id))
+            self._db.commit()
+        return group_id or row_id
+
+    def report(self):
+        lookups = self.stats["lookups"]
+        return {
+            "lookups": lookups,
+            "hits": self.stats["hits"],
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "detector_ms_saved": round(self.stats["ms_saved"], 1),
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def analyze_with_index(index, image_rgb, analyze, namespace):
+    """
+    Runs `analyze(image_rgb, reuse)`, reusing the face detections of a
+    near-duplicate in the same namespace when there is one. `reuse` is None
+    or {"faces", "is_child"}; when given, analyze skips the face stage but
+    still runs barcode and text detection. analyze must return {"faces",
+    "is_child", "barcodes", "pii"} with boxes in pixels.
+    Returns (result, info) where info describes the dedup outcome.
+    """
+    h, w = image_rgb.shape[:2]
+    value = index.hash_image(image_rgb)
+    match = index.lookup(value, w, h, namespace)
+    reuse = match["result"] if match is not None and match["reusable"] else None
+
+    start = time.perf_counter()
+    result = analyze(image_rgb, reuse)
+    elapsed = (time.perf_counter() - start) * 1000
+    if reuse is not None:
+        saved = max(0.0, (match["analysis_ms"] or 0.0) - elapsed)
+        index.stats["ms_saved"] += saved
+        return result, {"hit": True, "distance": match["distance"], "group_id": match["group_id"],
+                        "ms_saved": saved}
+
+    group_id = index.add(value, w, h, result, elapsed, namespace, group_id=match["group_id"] if match else None)
+    return result, {"hit": False, "group_id": group_id, "ms_saved": 0.0}
@@ -0,0 +1,187 @@
+"""
+PII matching over Tesseract's word table.
+
+Each kind has its own pattern, compiled once at import and run on its own,
+so a span one kind rejects is still searched by the others (a phone number
+followed by a zip code is not lost to a failed card match). The OCR words
+are joined into one page string (lines separated by newlines, which no
+pattern crosses) with an offset table, so every match maps straight back to
+the words it covers. Candidates are validated before they count: Luhn for
+cards, the SSA rules for SSNs, NANP / E.164 shape for phone numbers. Overlapping
+matches are merged only after that.
+"""
+import re
+from bisect import bisect_right
+
+# Words Tesseract is less sure about than this are ignored
+MIN_OCR_CONF = 30
+
+# One pattern per kind; the order breaks ties when overlapping matches are merged
+PII_PATTERNS = {
+    "email": re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b"),
+    "ssn": re.compile(r"\b\d{3}-\d{2}-\d{4}\b"),
+    # A run of digit groups; card numbers are searched inside it, see _card_spans
+    "card": re.compile(r"\b\d+(?:[ -]\d+)*\b"),
+    "phone": re.compile(r"(?<![\w+])(?:\+\d{1,3}(?:[-. ]?\(?\d{1,4}\)?){2,5}|(?:\(\d{3}\)|\d{3})[-. ]?\d{3}[-. ]?\d{4})\b"),
+}
+_PRIORITY = {kind: i for i, kind in enumerate(PII_PATTERNS)}
+
+_DIGIT_GROUP = re.compile(r"\d+")
+
+# Every pattern needs a digit or an "@" inside the word, anything else can be skipped
+_CANDIDATE = re.compile(r"[\d@]")
+
+_NON_DIGITS = re.compile(r"\D")
+
+def luhn_valid(digits: str) -> bool:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = ord(ch) - 48
+        if i % 2:
+            d *= 2
+            if d > 9:
+                d -= 9
+        total += d
+    return total % 10 == 0
+
+def _valid_card(text):
+    digits = _NON_DIGITS.sub("", text)
+    # A run of one repeated digit passes Luhn for some lengths but is never a card
+    return 13 <= len(digits) <= 19 and len(set(digits)) > 1 and luhn_valid(digits)
+
+def _valid_ssn(text):
+    area, group, serial = text.split("-")
+    return area not in ("000", "666") and area[0] != "9" and group != "00" and serial != "0000"
+
+def _valid_phone(text):
+    digits = _NON_DIGITS.sub("", text)
+    if text.startswith("+"):
+        return 8 <= len(digits) <= 15
+    if len(digits) == 11 and digits[0] == "1":
+        digits = digits[1:]
+    # NANP: area code and exchange never start with 0 or 1
+    return len(digits) == 10 and digits[0] > "1" and digits[3] > "1" and len(set(digits)) > 2
+
+def _valid_email(text):
+    local, _, domain = text.rpartition("@")
+    return ".." not in text and not local.startswith(".") and not domain.startswith(".")
+
+VALIDATORS = {
+    "email": _valid_email,
+    "ssn": _valid_ssn,
+    "card": _valid_card,
+    "phone": _valid_phone,
+}
+
+def _card_spans(run, offset):
+    """
+    Card numbers inside a run of digit groups ("Ref 12 4111 1111 1111 1111").
+    Tries every sequence of whole groups with 13 to 19 digits, longest first,
+    and moves on past each valid one, so a failed long span does not hide a
+    card inside it.
+    """
+    groups = [(m.start(), m.end()) for m in _DIGIT_GROUP.finditer(run)]
+    i = 0
+    while i < len(groups):
+        found = None
+        digits = 0
+        ends = []
+        for j in range(i, len(groups)):
+            digits += groups[j][1] - groups[j][0]
+            if digits > 19:
+                break
+            if digits >= 13:
+                ends.append(j)
+        for j in reversed(ends):
+            if _valid_card(run[groups[i][0]:groups[j][1]]):
+                found = j
+                break
+        if found is None:
+            i += 1
+            continue
+        yield offset + groups[i][0], offset + groups[found][1]
+        i = found + 1
+
+def find_pii(text: str):
+    """
+    Yields (kind, start, end) for every validated match in a string, in
+    order. Overlapping matches are merged into one span, so whatever any
+    validator accepted stays covered; the span takes the kind of its
+    longest match (ties: the kind listed first in PII_PATTERNS).
+    """
+    matches = []
+    for kind, pattern in PII_PATTERNS.items():
+        for match in pattern.finditer(text):
+            if kind == "card":
+                matches += [("card", start, end) for start, end in _card_spans(match.group(), match.start())]
+            elif VALIDATORS[kind](match.group()):
+                matches.append((kind, match.start(), match.end()))
+    if not matches:
+        return
+
+    matches.sort(key=lambda m: (m[1], m[1] - m[2], _PRIORITY[m[0]]))
+    kind, start, end = matches[0]
+    longest = end - start
+    for other, other_start, other_end in matches[1:]:
+        if other_start < end:
+            if other_end - other_start > longest:
+                kind, longest = other, other_end - other_start
+            end = max(end, other_end)
+            continue
+        yield kind, start, end
+        kind, start, end = other, other_start, other_end
+        longest = end - start
+    yield kind, start, end
+
+def join_words(data, min_conf=MIN_OCR_CONF):
+    """
+    Joins the confident words of a Tesseract image_to_data dict into one page
+    string. Returns (text, starts, words): starts[k] is where the k-th kept
+    word begins in text, words[k] its index in the word table.
+    Words that cannot be part of any match (no digit, no "@") are left out
+    and break the run like a new line does, so prose costs almost nothing.
+    """
+    parts, starts, words = [], [], []
+    pos = 0
+    line_key = None
+    candidate = _CANDIDATE.search
+    texts, confs = data['text'], data['conf']
+    blocks, pars, line_nums = data['block_num'], data['par_num'], data['line_num']
+    for i in range(len(texts)):
+        word = texts[i]
+        if not candidate(word):
+            line_key = None
+            continue
+        word = word.strip()
+        if float(confs[i]) <= min_conf:
+            line_key = None
+            continue
+        key = (blocks[i], pars[i], line_nums[i])
+        if parts:
+            parts.append(" " if key == line_key else "\n")
+            pos += 1
+        line_key = key
+        starts.append(pos)
+        words.append(i)
+        parts.append(word)
+        pos += len(word)
+    return "".join(parts), starts, words
+
+def match_words(data, min_conf=MIN_OCR_CONF):
+    """
+    Finds validated PII in a Tesseract word table.
+    Returns one {"kind", "words", "box"} per match, where words are the
+    indices of the OCR words the match touches and box is their union.
+    """
+    text, starts, words = join_words(data, min_conf)
+    matches = []
+    for kind, start, end in find_pii(text):
+        first = bisect_right(starts, start) - 1
+        last = bisect_right(starts, end - 1) - 1
+        indices = words[first:last + 1]
+        min_x = min(data['left'][i] for i in indices)
+        min_y = min(data['top'][i] for i in indices)
+        max_x = max(data['left'][i] + data['width'][i] for i in indices)
+        max_y = max(data['top'][i] + data['height'][i] for i in indices)
+        matches.append({"kind": kind, "words": indices, "box": [min_x, min_y, max_x - min_x, max_y - min_y]})
+    return matches
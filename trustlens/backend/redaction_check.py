@@ -0,0 +1,148 @@
+"""
+Post-redaction verification.
+
+After /api/protect has blurred, blacked out or cloaked its targets, the
+detector that found each target runs again, but only on a padded crop
+around it in the protected image. The cost follows the redacted area,
+not the image size. A target whose detector still fires on its own box
+is reported as a residual (e.g. a face still found after cloaking).
+
+Faces and barcodes are checked crop by crop: MediaPipe rescales its whole
+input, so a crop is also what it sees best. PII crops are stacked into
+one strip and read by a single Tesseract call, whose start-up would
+otherwise dominate.
+"""
+from bisect import bisect_right
+
+import numpy as np
+
+from config import Config
+from instrumentation import timed
+
+def collect_targets(requested_actions, faces, face_indices, data_boxes, first=None):
+    """
+    Lists what the requested actions changed as (id, detection, actions).
+    Ids follow the /api/scan numbering; `first` gives the number of faces,
+    barcodes and PII of the pages before this one, for documents.
+    """
+    first = first or {"FACE": 0, "BARCODE": 0, "PII": 0}
+    blur = "visible_blur" in requested_actions or "blur_selected" in requested_actions
+    cloak = "ai_cloak" in requested_actions
+    targets = []
+    for i, face in enumerate(faces):
+        actions = [a for a, on in (("visible_blur", blur and i in face_indices), ("ai_cloak", cloak)) if on]
+        if actions:
+            targets.append((f"FACE_{first['FACE'] + i + 1:02d}", face, actions))
+    if "redact_data" in requested_actions:
+        seen = {"BARCODE": 0, "PII": 0}
+        for det in data_boxes:
+            kind = det["type"]
+            seen[kind] += 1
+            targets.append((f"{kind}_{first[kind] + seen[kind]:02d}", det, ["redact_data"]))
+    return targets
+
+def _crop_bounds(box, shape):
+    x, y, w, h = box
+    pad = max(Config.VERIFY_MIN_PAD, int(max(w, h) * Config.VERIFY_PAD_RATIO))
+    img_h, img_w = shape[:2]
+    return (max(0, int(x - pad)), max(0, int(y - pad)),
+            min(img_w, int(x + w + pad)), min(img_h, int(y + h + pad)))
+
+def _overlap(target, found, partial):
+    """
+    IoU: the detector found the same face / code again. With partial, the
+    share of the found box inside the target, so a still legible part of a
+    redacted text line counts too.
+    """
+    ix = min(target[0] + target[2], found[0] + found[2]) - max(target[0], found[0])
+    iy = min(target[1] + target[3], found[1] + found[3]) - max(target[1], found[1])
+    if ix <= 0 or iy <= 0:
+        return 0.0
+    inter = ix * iy
+    if partial:
+        return inter / max(1.0, found[2] * found[3])
+    return inter / max(1.0, target[2] * target[3] + found[2] * found[3] - inter)
+
+def _residual(target_box, found, offset, partial=False):
+    """The first detection (crop coordinates) that matches the target, in image coordinates."""
+    ox, oy = offset
+    for det in found:
+        x, y, w, h = det["box"]
+        box = [x + ox, y + oy, w, h]
+        if _overlap(target_box, box, partial) >= Config.VERIFY_MIN_OVERLAP:
+            return {"box": [int(v) for v in box], "confidence": float(det.get("confidence", 1.0))}
+    return None
+
+def _scan_strip(image_rgb, items, scan):
+    """
+    Stacks the crops of `items` (index, box, bounds) into one white strip,
+    with a gap so no text line runs from one crop into the next, scans it
+    once and sorts the detections back into their crops.
+    """
+    gap = Config.VERIFY_STRIP_GAP
+    width = max(x1 - x0 for _, _, (x0, _, x1, _) in items)
+    height = sum(y1 - y0 for _, _, (_, y0, _, y1) in items) + gap * (len(items) - 1)
+    strip = np.full((height, width, 3), 255, dtype=np.uint8)
+    rows, y = [], 0
+    for _, _, (x0, y0, x1, y1) in items:
+        strip[y:y + y1 - y0, :x1 - x0] = image_rgb[y0:y1, x0:x1]
+        rows.append(y)
+        y += y1 - y0 + gap
+
+    found = [[] for _ in items]
+    for det in scan(strip):
+        x, y, w, h = det["box"]
+        k = bisect_right(rows, y + h / 2) - 1
+        if k >= 0:
+            found[k].append({**det, "box": [x, y - rows[k], w, h]})
+    return found
+
+@timed("verify")
+def verify_redactions(image_rgb, targets, content):
+    """
+    Re-runs the matching detector of every target on a padded crop of the
+    protected image. Returns one {"id", "actions", "residual"} per target,
+    with the box the detector still found when residual is true.
+    """
+    results, text_items = [], []
+    for index, (target_id, det, actions) in enumerate(targets):
+        results.append({"id": target_id, "actions": actions, "residual": False})
+        bounds = _crop_bounds(det["box"], image_rgb.shape)
+        x0, y0, x1, y1 = bounds
+        if x1 <= x0 or y1 <= y0:
+            continue
+        if det["type"] == "PII":
+            text_items.append((index, det["box"], bounds))
+            continue
+        crop = np.ascontiguousarray(image_rgb[y0:y1, x0:x1])
+        if det["type"] == "FACE":
+            found, _ = content.analyze_faces(crop)
+        else:
+            found = content.scan_barcodes(crop)
+        hit = _residual(det["box"], found, (x0, y0))
+        if hit:
+            results[index].update(residual=True, found=hit)
+
+    if text_items:
+        for (index, box, (x0, y0, _, _)), found in zip(text_items, _scan_strip(image_rgb, text_items, content.scan_text_pii)):
+            hit = _residual(box, found, (x0, y0), partial=True)
+            if hit:
+                results[index].update(residual=True, found=hit)
+    return results
+
+def summary_headers(results, max_ids=None):
+    """
+    Response headers for /api/protect: counts plus the first residual ids.
+    A document can have thousands of targets, so the per-target results are
+    not sent here (they are kept with the session, see /api/verification).
+    """
+    max_ids = Config.VERIFY_HEADER_MAX_IDS if max_ids is None else max_ids
+    residual = [r["id"] for r in results if r["residual"]]
+    listed = ",".join(residual[:max_ids]) or "none"
+    if len(residual) > max_ids:
+        listed += f",+{len(residual) - max_ids} more"
+    return {
+        "X-TrustLens-Verified": str(len(results)),
+        "X-TrustLens-Residual-Count": str(len(residual)),
+        "X-TrustLens-Residual": listed,
+    }
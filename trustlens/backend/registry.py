@@ -0,0 +1,73 @@
+import importlib
+import threading
+import time
+import instrumentation
+
+# Every engine the backend can use, as (module, class or factory). Nothing is imported
+# until an engine is first requested, so a metadata-only job never pays for
+# MediaPipe, Tesseract or ZBar.
+ANALYZERS = {
+    "content": ("analyzer_content", "AnalyzerContent"),
+    "triage": ("analyzer_triage", "AnalyzerTriage"),
+    "forensics": ("analyzer_forensics", "AnalyzerForensics"),
+    "metadata": ("analyzer_metadata", "AnalyzerMetadata"),
+    "risk": ("risk_engine", "RiskEngine"),
+    "protection": ("protection_tools", "ProtectionTools"),
+    "phash": ("phash_index", "PHashIndex"),
+    "brush": ("brush_session", "BrushSessionCache"),
+    "sessions": ("session_store", "create_session_store"),
+}
+
+# What warm_up builds by default: the engines that load models or run
+# detectors. The index, brush cache and session store are left alone, as
+# building them creates files or opens connections.
+ENGINES = ("content", "triage", "forensics", "metadata", "risk", "protection")
+
+_instances = {}
+_warmed = {}
+_lock = threading.Lock()
+
+
+def get(name: str):
+    """
+    Returns the shared instance of an engine, building it on first use.
+    The registry cache counts a miss only for the lookup that builds the
+    engine, and a hit for every lookup that reuses it.
+    """
+    instance = _instances.get(name)
+    if instance is not None:
+        instrumentation.cache_hit("registry")
+        return instance
+    if name not in ANALYZERS:
+        raise KeyError(f"Unknown analyzer: {name}")
+    with _lock:
+        if name in _instances:
+            # Another thread built it while we waited for the lock
+            instrumentation.cache_hit("registry")
+        else:
+            instrumentation.cache_miss("registry")
+            module_name, class_name = ANALYZERS[name]
+            module = importlib.import_module(module_name)
+            _instances[name] = getattr(module, class_name)()
+        return _instances[name]
+
+
+def warm_up(names=None):
+    """
+    Builds the requested engines (ENGINES by default), preloads their models and
+    runs one dummy inference through each engine that supports it.
+    Returns the time spent per engine in milliseconds. Engines that are
+    already warm are skipped.
+    """
+    timings = {}
+    for name in names or ENGINES:
+        if name in _warmed:
+            timings[name] = 0.0
+            continue
+        start = time.perf_counter()
+        instance = get(name)
+        if hasattr(instance, "warm_up"):
+            instance.warm_up()
+        _warmed[name] = round((time.perf_counter() - start) * 1000, 1)
+        timings[name] = _warmed[name]
+    return timings
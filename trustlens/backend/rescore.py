@@ -0,0 +1,165 @@
+"""
+Offline re-scoring of stored detection records.
+
+When Config.RISK_RECORDS_PATH is set, every scan appends a small record
+to it (see risk_engine.make_record). When the risk policy changes, this script
+recomputes every score from those records, without touching any pixels,
+and lists the records whose status (RED / AMBER / GREEN) changed.
+
+    python rescore.py detection_records.jsonl --policy policy_v2.json --diff changes.jsonl
+    python rescore.py detection_records.jsonl --policy policy_v2.json --out rescored.jsonl
+    python rescore.py detection_records.jsonl --policy policy_v2.json --report <session_id>
+
+Records are read in chunks and each chunk is scored with numpy in one
+pass, so memory stays flat no matter how large the archive is.
+"""
+import argparse
+import json
+import time
+from collections import Counter
+
+import numpy as np
+
+from risk_engine import RiskEngine, RiskPolicy
+
+CHUNK_SIZE = 50_000
+STATUSES = np.array(["RED", "AMBER", "GREEN"])
+
+
+def iter_record_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields lists of records from a JSON Lines file, skipping blank lines."""
+    chunk = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def to_columns(records):
+    """Pulls the scoring inputs out of a list of records as numpy arrays."""
+    def column(key, dtype):
+        return np.fromiter((r[key] for r in records), dtype=dtype, count=len(records))
+
+    return {
+        "gps_found": column("gps_found", bool),
+        "faces": column("faces", np.int32),
+        "is_child": column("is_child", bool),
+        "ela_manipulated": column("ela_manipulated", bool),
+        "barcodes": column("barcodes", np.int32),
+        "pii": column("pii", np.int32),
+    }
+
+
+def score_columns(policy, cols):
+    """Vectorised twin of RiskEngine.score_record. Returns (scores, statuses)."""
+    w = policy.weights
+    has_faces = cols["faces"] > 0
+    penalty = (
+        cols["gps_found"] * w["gps"]
+        + (has_faces & cols["is_child"]) * w["child"]
+        + (has_faces & ~cols["is_child"]) * w["faces"]
+        + cols["ela_manipulated"] * w["deepfake"]
+        + (cols["barcodes"] > 0) * w["barcode"]
+        + (cols["pii"] > 0) * w["pii"]
+    )
+    scores = np.maximum(100 - penalty, 0)
+    bands = (scores >= policy.thresholds["red"]).astype(np.int8) + (scores >= policy.thresholds["green"])
+    return scores, STATUSES[bands]
+
+
+def rescore(records_path, policy, out_path=None, diff_path=None, chunk_size=CHUNK_SIZE):
+    """
+    Re-scores every record under a new policy.
+    Writes the re-scored records to out_path and the records whose status
+    changed to diff_path (both optional). Returns a summary.
+    """
+    start = time.perf_counter()
+    out = open(out_path, "w") if out_path else None
+    diff = open(diff_path, "w") if diff_path else None
+    total = changed = 0
+    transitions = Counter()
+    try:
+        for records in iter_record_chunks(records_path, chunk_size):
+            scores, statuses = score_columns(policy, to_columns(records))
+            lines = []
+            for record, score, status in zip(records, scores.tolist(), statuses.tolist()):
+                old_status = record.get("status")
+                if old_status != status:
+                    changed += 1
+                    transitions[f"{old_status or 'UNSCORED'}->{status}"] += 1
+                    if diff:
+                        lines.append(json.dumps({
+                            "source": record.get("source"),
+                            "old_policy": record.get("policy"), "new_policy": policy.version,
+                            "old_score": record.get("score"), "new_score": score,
+                            "old_status": old_status, "new_status": status,
+                        }) + "\n")
+                if out:
+                    record.update(policy=policy.version, score=score, status=status)
+            if diff:
+                diff.writelines(lines)
+            if out:
+                out.writelines(json.dumps(r) + "\n" for r in records)
+            total += len(records)
+    finally:
+        if out:
+            out.close()
+        if diff:
+            diff.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "records": total,
+        "changed": changed,
+        "transitions": dict(transitions),
+        "policy": policy.version,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(total / elapsed) if elapsed > 0 else None,
+    }
+
+
+def find_record(records_path, source):
+    """Returns the latest record for a source (session id or file path)."""
+    found = None
+    for records in iter_record_chunks(records_path):
+        for record in records:
+            if record.get("source") == source:
+                found = record
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored detection records under a new risk policy")
+    parser.add_argument("records", help="Detection records (JSON Lines)")
+    parser.add_argument("--policy", help="Policy file (JSON). Defaults to the weights in Config")
+    parser.add_argument("--out", help="Write the re-scored records here")
+    parser.add_argument("--diff", help="Write the records whose status changed here (JSON Lines)")
+    parser.add_argument("--report", metavar="SOURCE", help="Print the full report of one record under the new policy")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    policy = RiskPolicy.load(args.policy) if args.policy else RiskPolicy()
+
+    if args.report:
+        record = find_record(args.records, args.report)
+        if record is None:
+            parser.error(f"No record for {args.report}")
+        print(RiskEngine(policy).render_report(record))
+        return
+
+    summary = rescore(args.records, policy, args.out, args.diff, args.chunk_size)
+    print(f"[*] Policy {summary['policy']}: {summary['records']} records re-scored in "
+          f"{summary['seconds']}s ({summary['records_per_second']}/s)")
+    print(f"[*] Status changed: {summary['changed']}")
+    for transition, count in sorted(summary["transitions"].items()):
+        print(f"    {transition}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,208 @@
 from config import Config
 import datetime
+import json
+import os
+from instrumentation import timed
+
+# Bump when the layout of a detection record changes
+RECORD_SCHEMA = 1
+
+class RiskPolicy:
+    """
+    The weights and thresholds used to turn detections into a score.
+
+    A policy file is JSON:
+        {"version": "2025-06-a",
+         "weights": {"deepfake": 50, "gps": 40, "child": 30, "faces": 5, "barcode": 20, "pii": 15},
+         "thresholds": {"red": 50, "green": 85}}
+    Missing entries fall back to the values in Config.
+    """
+    WEIGHT_KEYS = ("deepfake", "gps", "child", "faces", "barcode", "pii")
+
+    def __init__(self, version="config", weights=None, thresholds=None):
+        self.version = str(version)
+        self.weights = {
+            "deepfake": Config.WEIGHT_DEEPFAKE,
+            "gps": Config.WEIGHT_GPS,
+            "child": Config.WEIGHT_CHILD,
+            "faces": Config.WEIGHT_FACES,
+            "barcode": Config.WEIGHT_BARCODE,
+            "pii": Config.WEIGHT_PII,
+        }
+        unknown = set(weights or {}) - set(self.WEIGHT_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown policy weights: {', '.join(sorted(unknown))}")
+        self.weights.update(weights or {})
+        self.thresholds = {"red": Config.RISK_RED_BELOW, "green": Config.RISK_GREEN_FROM}
+        self.thresholds.update(thresholds or {})
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if "version" not in data:
+            raise ValueError(f"Policy file {path} has no 'version'")
+        return cls(data["version"], data.get("weights"), data.get("thresholds"))
+
+    @classmethod
+    def default(cls):
+        """The policy file from Config.RISK_POLICY_PATH, or the Config weights."""
+        if Config.RISK_POLICY_PATH:
+            return cls.load(Config.RISK_POLICY_PATH)
+        return cls()
+
+    def status(self, score):
+        return "RED" if score < self.thresholds["red"] else "AMBER" if score < self.thresholds["green"] else "GREEN"
+
+    def to_dict(self):
+        return {"version": self.version, "weights": dict(self.weights), "thresholds": dict(self.thresholds)}
+
+def make_record(forensics, content_detections, is_child, pii_list, barcodes, metadata, source=None):
+    """
+    Flattens one scan into a detection record: everything the score depends
+    on, and nothing that needs the pixels. Records are stored as JSON Lines
+    so they can be re-scored later (see rescore.py).
+    """
+    return {
+        "schema": RECORD_SCHEMA,
+        "source": source,
+        "scanned_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "gps_found": bool(metadata.get('gps_found')),
+        "is_stripped": bool(metadata.get('is_stripped', False)),
+        "device_info": metadata.get('device_info', 'Unknown'),
+        "faces": sum(1 for d in content_detections if d['type'] == 'FACE'),
+        "is_child": bool(is_child),
+        "ela_manipulated": bool(forensics.get('ela_manipulated')),
+        "barcodes": len(barcodes or []),
+        "pii": len(pii_list or []),
+    }
+
+def rotate_records(path, backups):
+    """Shifts path -> path.1 -> path.2 ..., deleting what falls past `backups`."""
+    if backups <= 0:
+        os.remove(path)
+        return
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+def append_records(path, records, max_bytes=None, backups=0):
+    """
+    Appends records to a JSON Lines file, one write per call. With
+    max_bytes, a file that has reached that size is rotated first.
+    """
+    lines = "".join(json.dumps(r, default=str) + "\n" for r in records)
+    if not lines:
+        return
+    if max_bytes is not None:
+        try:
+            if os.path.getsize(path) >= max_bytes:
+                rotate_records(path, backups)
+        except FileNotFoundError:
+            # Not created yet, or another worker rotated it just now
+            pass
+    with open(path, "a") as f:
+        f.write(lines)
 
 class RiskEngine:
-    def calculate_trust_score(self, forensics, content_detections, is_child, pii_list, barcodes, metadata):
+    def __init__(self, policy=None):
+        self.policy = policy or RiskPolicy.default()
+
+    def score_record(self, record):
+        """Returns (score, threats) for a detection record."""
+        w = self.policy.weights
         score = 100
         threats = []
-        report_log = [] 
+        if record["gps_found"]:
+            score -= w["gps"]
+            threats.append("GPS Location Data Embedded")
+        if record["faces"] > 0:
+            if record["is_child"]:
+                score -= w["child"]
+                threats.append("Child Detected (Sharenting Risk)")
+            else:
+                score -= w["faces"]
+        if record["ela_manipulated"]:
+            score -= w["deepfake"]
+            threats.append("Potential Digital Manipulation")
+        if record["barcodes"]:
+            score -= w["barcode"]
+            threats.append(f"{record['barcodes']} Barcodes Found")
+        if record["pii"]:
+            score -= w["pii"]
+            threats.append("Personal Text (PII) Found")
+        return max(score, 0), threats
+
+    def render_report(self, record, score=None):
+        """Builds the human-readable analysis log for a record (only when asked for)."""
+        if score is None:
+            score, _ = self.score_record(record)
+        report_log = []
 
         # --- 1. METADATA CHECK ---
-        if metadata.get('gps_found'):
-            score -= Config.WEIGHT_GPS
-            threats.append("GPS Location Data Embedded")
+        if record["gps_found"]:
             report_log.append("[!] LOCATION DATA: DETECTED (High Risk)")
-        elif metadata.get('is_stripped', False):
+        elif record["is_stripped"]:
             report_log.append("[+] METADATA: STRIPPED/CLEAN (Safe)")
         else:
-            report_log.append(f"[i] DEVICE INFO: {metadata.get('device_info', 'Unknown')}")
+            report_log.append(f"[i] DEVICE INFO: {record['device_info']}")
             report_log.append("[+] LOCATION DATA: NONE (Safe)")
 
         # --- 2. FACIAL RECOGNITION ---
-        faces = [d for d in content_detections if d['type'] == 'FACE']
-        if len(faces) > 0:
-            if is_child:
-                score -= Config.WEIGHT_CHILD
-                threats.append("Child Detected (Sharenting Risk)")
-                report_log.append(f"[!] SUBJECTS: {len(faces)} FOUND - CHILD DETECTED (Risk)")
+        faces = record["faces"]
+        if faces > 0:
+            if record["is_child"]:
+                report_log.append(f"[!] SUBJECTS: {faces} FOUND - CHILD DETECTED (Risk)")
             else:
-                score -= 5 
-                report_log.append(f"[i] SUBJECTS: {len(faces)} ADULTS DETECTED (Privacy Note)")
+                report_log.append(f"[i] SUBJECTS: {faces} ADULTS DETECTED (Privacy Note)")
         else:
             report_log.append("[+] SUBJECTS: NONE (Privacy Safe)")
 
         # --- 3. FORENSICS ---
-        if forensics.get('ela_manipulated'):
-            score -= Config.WEIGHT_DEEPFAKE
-            threats.append("Potential Digital Manipulation")
+        if record["ela_manipulated"]:
             report_log.append("[!] INTEGRITY: ANOMALIES DETECTED (Possible Edit)")
         else:
             report_log.append("[+] INTEGRITY: VERIFIED ORGANIC (No Edits)")
 
         # --- 4. DATA MINING ---
-        if barcodes:
-            score -= Config.WEIGHT_BARCODE
-            threats.append(f"{len(barcodes)} Barcodes Found")
-            report_log.append(f"[!] HIDDEN DATA: {len(barcodes)} BARCODES FOUND")
+        if record["barcodes"]:
+            report_log.append(f"[!] HIDDEN DATA: {record['barcodes']} BARCODES FOUND")
         else:
             report_log.append("[+] HIDDEN DATA: NONE (Safe)")
 
-        if pii_list:
-            score -= Config.WEIGHT_PII
-            threats.append("Personal Text (PII) Found")
+        if record["pii"]:
             report_log.append(f"[!] TEXT SCAN: PII DETECTED")
         else:
             report_log.append("[+] TEXT SCAN: CLEAN (Safe)")
 
         # --- FINAL REPORT GENERATION ---
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        status_color = "RED" if score < 50 else "AMBER" if score < 85 else "GREEN"
-        
-        full_report = f"""
+        timestamp = record.get("scanned_at") or datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        status_color = self.policy.status(score)
+
+        return f"""
 /// TRUSTLENS ANALYSIS LOG ///
 TIMESTAMP: {timestamp}
-STATUS: {status_color} (SCORE: {max(score, 0)})
+STATUS: {status_color} (SCORE: {score})
 ------------------------------------------
 {chr(10).join(report_log)}
 ------------------------------------------
-CONCLUSION: {'SAFE TO SHARE' if score >= 85 else 'REVIEW RECOMMENDED'}
+CONCLUSION: {'SAFE TO SHARE' if score >= self.policy.thresholds['green'] else 'REVIEW RECOMMENDED'}
 """
-        return max(score, 0), threats, full_report
\ No newline at end of file
+
+    @timed("risk")
+    def assess(self, record, with_report=True):
+        """
+        Scores a record and stamps it with the policy version, score and
+        status it got, so a later re-score can tell what changed.
+        Returns (score, threats, full_report); the report is None when
+        with_report is False.
+        """
+        score, threats = self.score_record(record)
+        record.update(policy=self.policy.version, score=score, status=self.policy.status(score))
+        full_report = self.render_report(record, score) if with_report else None
+        return score, threats, full_report
+
+    def calculate_trust_score(self, forensics, content_detections, is_child, pii_list, barcodes, metadata, with_report=True):
+        record = make_record(forensics, content_detections, is_child, pii_list, barcodes, metadata)
+        return self.assess(record, with_report)
@@ -1,8 +1,10 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import shutil, os, cv2, io, uuid, asyncio, numpy as np, base64, hashlib, hmac, sys
-from PIL import Image
+from typing import Optional
+from collections import deque
+from contextlib import asynccontextmanager
+import os, io, cv2, uuid, tempfile, asyncio, time, logging, numpy as np, base64, hashlib, hmac, sys
 
 # macOS fix for zbar library
 lib_path = os.path.join(os.path.dirname(__file__), "lib")
@@ -11,14 +13,30 @@ if os.path.exists(lib_path):
     os.environ["PATH"] = lib_path + ":" + os.environ.get("PATH", "")
     sys.path.append(lib_path)
 
-# Core Guardian Engines
-from analyzer_content import AnalyzerContent
-from analyzer_forensics import AnalyzerForensics
-from analyzer_metadata import AnalyzerMetadata
-from risk_engine import RiskEngine
-from protection_tools import ProtectionTools
+# Core Guardian Engines (built lazily on first use, see registry.py)
+import registry
+import instrumentation
+import output_encoders
+import metadata_stripper
+import utils_io
+import multipage
+import redaction_check
+from analyzer_triage import STAGE_FACES, STAGE_BARCODES, STAGE_TEXT
+from session_store import check_session_id
+from risk_engine import make_record, append_records
+from config import Config
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    purge = asyncio.create_task(purge_sessions_loop()) if Config.SESSION_PURGE_INTERVAL else None
+    try:
+        yield
+    finally:
+        if purge is not None:
+            purge.cancel()
+
+app = FastAPI(lifespan=lifespan)
+logger = logging.getLogger("trustlens")
 
 # SECURITY CONFIGURATION
 # This MUST match the key in protection_tools.py
@@ -29,172 +47,613 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the browser read X-TrustLens-* (encoding, pages, redaction check)
+    expose_headers=["*"],
 )
 
-content_analyzer = AnalyzerContent()
-forensics_analyzer = AnalyzerForensics()
-metadata_analyzer = AnalyzerMetadata()
-risk_engine = RiskEngine()
-protection_tools = ProtectionTools()
-
-UPLOAD_DIR = "temp_uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-async def auto_stabilize(image_path):
-    """Caps resolution at 2000px to prevent system memory overflow."""
-    img = cv2.imread(image_path)
-    if img is None: return None
-    h, w = img.shape[:2]
-    if max(h, w) > 2000:
-        scale = 2000 / max(h, w)
-        img = cv2.resize(img, (0,0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
-        cv2.imwrite(image_path, img)
-    return img
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Tracks in-flight requests and latency, and adds a Server-Timing header."""
+    if not instrumentation.enabled():
+        return await call_next(request)
+    token = instrumentation.begin_request()
+    instrumentation.gauge_add("trustlens_http_in_flight", 1)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        instrumentation.gauge_add("trustlens_http_in_flight", -1)
+        # Route template, not the raw URL, so unknown paths can't explode the label set
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        instrumentation.observe("trustlens_http_request_seconds", elapsed, {"path": path, "status": str(status)})
+        server_timing = instrumentation.end_request(token)
+    total = f"total;dur={elapsed * 1000:.1f}"
+    response.headers["Server-Timing"] = f"{server_timing}, {total}" if server_timing else total
+    return response
+
+async def offload(fn, *args):
+    """Runs blocking work on a worker thread, tracking how many jobs are waiting."""
+    instrumentation.gauge_add("trustlens_worker_queue_depth", 1)
+    def run():
+        instrumentation.gauge_add("trustlens_worker_queue_depth", -1)
+        return fn(*args)
+    return await asyncio.to_thread(run)
+
+def log_failure(kind, e):
+    logger.error(f"{kind.upper()}_ERROR: {e}")
+    instrumentation.inc("trustlens_errors_total", {"kind": kind})
+
+async def purge_sessions_loop():
+    """Deletes expired sessions every SESSION_PURGE_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(Config.SESSION_PURGE_INTERVAL)
+        try:
+            removed = await offload(registry.get("sessions").purge_expired)
+            if removed:
+                logger.info(f"Purged {removed} expired sessions")
+        except Exception as e:
+            log_failure("session_purge", e)
+
+@instrumentation.timed("thumbnail")
+def encode_thumbnail(img_bgr, box):
+    """Crops a detection and returns it as a Base64 JPEG data URL."""
+    h, w = img_bgr.shape[:2]
+    bx, by, bw, bh = box
+    y1, y2 = max(0, int(by)), min(h, int(by + bh))
+    x1, x2 = max(0, int(bx)), min(w, int(bx + bw))
+    crop = img_bgr[y1:y2, x1:x2]
+    if crop.size == 0:
+        return ""
+    _, buffer = cv2.imencode('.jpg', crop)
+    return f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
+
+def auto_stabilize(contents, info=None):
+    """
+    Caps resolution at Config.WORKING_MAX_SIDE to prevent system memory overflow.
+    The size is read from the header first and large JPEGs are decoded at a
+    reduced scale, so the full-resolution image is never held in memory
+    (formats that can't be reduced are refused above Config.LOAD_PIXEL_BUDGET).
+    Returns the decoded image (BGR) and the bytes to keep for the session
+    (the original upload, or a re-encoded JPEG if it had to be resized).
+    """
+    info = info or utils_io.probe_image(contents)
+    img = cv2.cvtColor(utils_io.decode_image_bytes(contents, Config.WORKING_MAX_SIDE, info=info), cv2.COLOR_RGB2BGR)
+    if img.shape[0] * img.shape[1] < info["pixels"]:
+        _, buffer = cv2.imencode('.jpg', img)
+        contents = buffer.tobytes()
+    return img, contents
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(instrumentation.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health")
+async def health():
+    """Liveness probe: the process is up, models may still be cold."""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe: preloads every model and runs one dummy inference each."""
+    try:
+        timings = await offload(registry.warm_up)
+        return {"status": "ready", "warmup_ms": timings}
+    except Exception as e:
+        log_failure("warmup", e)
+        raise HTTPException(status_code=503, detail="Engines not ready")
+
+# Triage stages that only came near their threshold queue here, so under
+# load they wait behind the stages the triage was sure about.
+deferred_slots = asyncio.Semaphore(Config.TRIAGE_DEFERRED_SLOTS)
+
+async def run_content_stages(img_rgb, reuse=None):
+    """
+    Runs the triage, then only the content detectors it considers worthwhile.
+    Near-threshold stages run last, at most TRIAGE_DEFERRED_SLOTS at a time.
+    With reuse (face results of a near-duplicate) the face stage is skipped.
+    """
+    content_analyzer = registry.get("content")
+    triage_analyzer = registry.get("triage")
+    decision = await offload(triage_analyzer.classify, img_rgb)
+    run, deferred, skipped = triage_analyzer.plan(decision)
+    detectors = {
+        STAGE_FACES: content_analyzer.analyze_faces,
+        STAGE_BARCODES: content_analyzer.scan_barcodes,
+        STAGE_TEXT: content_analyzer.scan_text_pii,
+    }
+
+    async def timed(stage):
+        start = time.perf_counter()
+        result = await offload(detectors[stage], img_rgb)
+        triage_analyzer.record_stage_time(stage, (time.perf_counter() - start) * 1000)
+        return result
+
+    results = {STAGE_FACES: ([], False), STAGE_BARCODES: [], STAGE_TEXT: []}
+    if reuse is not None:
+        results[STAGE_FACES] = reuse["faces"], reuse["is_child"]
+    for stage in run:
+        if not (stage == STAGE_FACES and reuse is not None):
+            results[stage] = await timed(stage)
+    if deferred:
+        async with deferred_slots:
+            for stage in deferred:
+                if not (stage == STAGE_FACES and reuse is not None):
+                    results[stage] = await timed(stage)
+
+    raw_faces, is_child = results[STAGE_FACES]
+    return raw_faces, is_child, results[STAGE_BARCODES], results[STAGE_TEXT], \
+        triage_analyzer.report(decision, skipped, deferred)
+
+async def analyze_content(img_rgb):
+    """
+    Content analysis with near-duplicate reuse (off unless Config.PHASH_ENABLED):
+    if a perceptually identical image was already analysed in this
+    namespace, its face detections are rescaled and reused. Barcodes and
+    text are always scanned again, and are never stored in the index.
+    """
+    if not Config.PHASH_ENABLED:
+        raw_faces, is_child, barcodes, pii_text, triage = await run_content_stages(img_rgb)
+        return raw_faces, is_child, barcodes, pii_text, triage, None
+
+    index = registry.get("phash")
+    namespace = Config.PHASH_NAMESPACE
+    h, w = img_rgb.shape[:2]
+    value = await offload(index.hash_image, img_rgb)
+    match = await offload(index.lookup, value, w, h, namespace)
+    reuse = match["result"] if match is not None and match["reusable"] else None
+
+    start = time.perf_counter()
+    raw_faces, is_child, barcodes, pii_text, triage = await run_content_stages(img_rgb, reuse)
+    elapsed = (time.perf_counter() - start) * 1000
+    if reuse is not None:
+        saved = max(0.0, (match["analysis_ms"] or 0.0) - elapsed)
+        index.stats["ms_saved"] += saved
+        dedup = {"hit": True, "distance": match["distance"], "group_id": match["group_id"], "ms_saved": round(saved, 1)}
+        return raw_faces, is_child, barcodes, pii_text, triage, dedup
+
+    result = {"faces": raw_faces, "is_child": is_child, "barcodes": barcodes, "pii": pii_text}
+    group_id = await offload(index.add, value, w, h, result, elapsed, namespace, match["group_id"] if match else None)
+    return raw_faces, is_child, barcodes, pii_text, triage, {"hit": False, "group_id": group_id}
+
+def format_detections(img_bgr, raw_faces, barcodes, pii_text):
+    """Percent boxes and thumbnails for the client, per kind (ids are added by number_detections)."""
+    h, w = img_bgr.shape[:2]
+
+    def pct(box):
+        bx, by, bw, bh = box
+        return [(bx / w) * 100, (by / h) * 100, (bw / w) * 100, (bh / h) * 100]
+
+    # Process Faces
+    faces = []
+    for f in raw_faces:
+        conf = f.get('confidence', 0.0)
+        faces.append({
+            **f,
+            'box': pct(f['box']),
+            'confidence': 0.0 if (conf is None or np.isnan(conf)) else float(conf),
+            'thumbnail': encode_thumbnail(img_bgr, f['box'])
+        })
+
+    # Process Barcodes (with a thumbnail)
+    codes = [{**b, 'box': pct(b['box']), 'thumbnail': encode_thumbnail(img_bgr, b['box'])} for b in barcodes]
+
+    # Process PII
+    pii = [{**p, 'box': pct(p['box']), 'thumbnail': ""} for p in pii_text]  # PII often too small/sensitive for thumbs
+    return faces, codes, pii
+
+def number_detections(faces, barcodes, pii):
+    """Flattens the per-kind lists in the order /api/protect indexes them and assigns ids."""
+    all_detections = []
+    for prefix, items in (("FACE", faces), ("BARCODE", barcodes), ("PII", pii)):
+        for i, d in enumerate(items):
+            all_detections.append({**d, 'id': f"{prefix}_{i+1:02d}"})
+    return all_detections
+
+async def score_and_record(session_id, ai_flag, all_detections, is_child, pii_text, barcodes, meta, **extra):
+    record = make_record({'ela_manipulated': ai_flag}, all_detections, is_child, pii_text, barcodes, meta, source=session_id)
+    record.update(extra)
+    score, _, report = registry.get("risk").assess(record)
+    if Config.RISK_RECORDS_PATH:
+        # Kept so scores can be recomputed offline when the policy changes (rescore.py)
+        await offload(append_records, Config.RISK_RECORDS_PATH, [record],
+                      Config.RISK_RECORDS_MAX_BYTES, Config.RISK_RECORDS_BACKUPS)
+    return score, report
 
 @app.post("/api/scan")
 async def scan_image(file: UploadFile = File(...)):
     """Diagnostic scan with Base64 thumbnails and precise coordinate mapping."""
+    meta_task = None
     try:
         session_id = str(uuid.uuid4())
-        file_path = os.path.join(UPLOAD_DIR, f"{session_id}.jpg")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        contents = await file.read()
+        sessions = registry.get("sessions")
+
+        # Header-only EXIF audit of the original upload (before any resize
+        # re-encodes it), running off the event loop alongside the scan
+        meta_task = asyncio.create_task(
+            offload(registry.get("metadata").get_metadata_risk_from_bytes, contents)
+        )
 
-        img_bgr = await auto_stabilize(file_path)
-        if img_bgr is None: raise HTTPException(status_code=400, detail="Invalid image")
+        try:
+            info = utils_io.probe_image(contents)
+            if not multipage.is_multipage(info):
+                with instrumentation.stage("decode"):
+                    img_bgr, stored = await offload(auto_stabilize, contents, info)
+        except utils_io.ImageTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid image")
+        if multipage.is_multipage(info):
+            return await scan_document(session_id, contents, sessions, meta_task)
+        await offload(sessions.put_image, session_id, stored)
         
         h, w, _ = img_bgr.shape
         img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
         
-        # Parallelize heavy analysis
-        raw_faces, is_child = await asyncio.to_thread(content_analyzer.analyze_faces, img_rgb)
-        barcodes = await asyncio.to_thread(content_analyzer.scan_barcodes, img_rgb)
-        pii_text = await asyncio.to_thread(content_analyzer.scan_text_pii, img_rgb)
-        
-        all_detections = []
-        
-        # Process Faces
-        for i, f in enumerate(raw_faces):
-            conf = f.get('confidence', 0.0)
-            bx, by, bw, bh = f['box']
-            
-            y1, y2 = max(0, int(by)), min(h, int(by + bh))
-            x1, x2 = max(0, int(bx)), min(w, int(bx + bw))
-            
-            crop = img_bgr[y1:y2, x1:x2]
-            crop_b64 = ""
-            if crop.size > 0: 
-                _, buffer = cv2.imencode('.jpg', crop)
-                crop_b64 = f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
-
-            box_pct = [(bx / w) * 100, (by / h) * 100, (bw / w) * 100, (bh / h) * 100]
-
-            all_detections.append({
-                **f,
-                'box': box_pct,
-                'id': f"FACE_{i+1:02d}",
-                'confidence': 0.0 if (np.isnan(conf) or conf is None) else float(conf),
-                'thumbnail': crop_b64
-            })
-
-        # Process Barcodes
-        for i, b in enumerate(barcodes):
-            bx, by, bw, bh = b['box']
-            box_pct = [(bx / w) * 100, (by / h) * 100, (bw / w) * 100, (bh / h) * 100]
-            
-            # Thumbnail for barcode
-            y1, y2 = max(0, int(by)), min(h, int(by + bh))
-            x1, x2 = max(0, int(bx)), min(w, int(bx + bw))
-            crop = img_bgr[y1:y2, x1:x2]
-            crop_b64 = ""
-            if crop.size > 0:
-                _, buffer = cv2.imencode('.jpg', crop)
-                crop_b64 = f"data:image/jpeg;base64,{base64.b64encode(buffer).decode('utf-8')}"
-
-            all_detections.append({
-                **b,
-                'box': box_pct,
-                'id': f"BARCODE_{i+1:02d}",
-                'thumbnail': crop_b64
-            })
-
-        # Process PII
-        for i, p in enumerate(pii_text):
-            bx, by, bw, bh = p['box']
-            box_pct = [(bx / w) * 100, (by / h) * 100, (bw / w) * 100, (bh / h) * 100]
-            all_detections.append({
-                **p,
-                'box': box_pct,
-                'id': f"PII_{i+1:02d}",
-                'thumbnail': "" # PII often too small/sensitive for thumbs
-            })
+        # Near-duplicate lookup, then triage, then the heavy analysis that is still needed
+        raw_faces, is_child, barcodes, pii_text, triage, dedup = await analyze_content(img_rgb)
+
+        # Pixel-space detections go with the session, so /api/protect on any
+        # worker can act on them without running the detectors again
+        await offload(sessions.put_detections, session_id, {
+            "faces": raw_faces, "is_child": is_child, "barcodes": barcodes,
+            "pii": pii_text, "size": [w, h],
+        })
+
+        all_detections = number_detections(*format_detections(img_bgr, raw_faces, barcodes, pii_text))
             
-        meta = metadata_analyzer.get_metadata_risk(file_path)
-        ai_flag, _ = await asyncio.to_thread(forensics_analyzer.detect_deepfake_artifacts, img_rgb)
-        score, _, report = risk_engine.calculate_trust_score({'ela_manipulated': ai_flag}, all_detections, is_child, pii_text, barcodes, meta)
+        meta = await meta_task
+        ai_flag, _ = await offload(registry.get("forensics").detect_deepfake_artifacts, img_rgb)
+        score, report = await score_and_record(session_id, ai_flag, all_detections, is_child, pii_text, barcodes, meta)
 
-        return {"session_id": session_id, "score": score, "detections": all_detections, "meta": meta, "report": report}
+        return {"session_id": session_id, "score": score, "detections": all_detections, "meta": meta, "report": report, "triage": triage, "dedup": dedup}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"SCAN_ERROR: {e}")
+        log_failure("scan", e)
         raise HTTPException(status_code=500, detail="Diagnostic Scan Interrupted")
+    finally:
+        # Error paths (400, 413, 500) never await the EXIF audit: don't leave it pending
+        if meta_task is not None and not meta_task.done():
+            meta_task.cancel()
+
+async def scan_document(session_id, contents, sessions, meta_task):
+    """
+    Multi-page scan. Pages are decoded one at a time and analysed
+    concurrently, with at most Config.PAGE_WORKERS pages in memory; their
+    detections are merged into a single risk report.
+    """
+    pages_in = multipage.iter_pages(contents, Config.WORKING_MAX_SIDE)
+    working = io.BytesIO()
+    writer = multipage.PageWriter(working)
+
+    def next_page():
+        page = next(pages_in, None)
+        if page is not None:
+            # Working-resolution copy of the document for /api/protect
+            writer.add(page)
+        return page
+
+    async def analyze_page(img_rgb):
+        raw_faces, is_child, barcodes, pii_text, triage, dedup = await analyze_content(img_rgb)
+        ai_flag, _ = await offload(registry.get("forensics").detect_deepfake_artifacts, img_rgb)
+        img_bgr = cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR)
+        h, w = img_rgb.shape[:2]
+        return {
+            "faces": raw_faces, "is_child": is_child, "barcodes": barcodes, "pii": pii_text,
+            "size": [w, h], "ela": ai_flag, "triage": triage, "dedup": dedup,
+            "formatted": format_detections(img_bgr, raw_faces, barcodes, pii_text),
+        }
+
+    pages, pending = [], deque()
+    try:
+        while True:
+            page = await offload(next_page)
+            if page is None:
+                break
+            pending.append(asyncio.create_task(analyze_page(page)))
+            del page
+            if len(pending) >= Config.PAGE_WORKERS:
+                pages.append(await pending.popleft())
+        while pending:
+            pages.append(await pending.popleft())
+    except utils_io.ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    finally:
+        for task in pending:
+            task.cancel()
+        writer.close()
+
+    await offload(sessions.put_image, session_id, working.getvalue())
+    await offload(sessions.put_detections, session_id, {
+        "pages": [{k: p[k] for k in ("faces", "is_child", "barcodes", "pii", "size")} for p in pages],
+    })
+
+    # Page-tagged, numbered across the whole document in the order /api/protect indexes faces
+    faces, codes, pii = [], [], []
+    for index, p in enumerate(pages):
+        page_faces, page_codes, page_pii = p["formatted"]
+        faces += [{**d, "page": index} for d in page_faces]
+        codes += [{**d, "page": index} for d in page_codes]
+        pii += [{**d, "page": index} for d in page_pii]
+    all_detections = number_detections(faces, codes, pii)
+
+    merged = multipage.merge_page_results(pages)
+    meta = await meta_task
+    score, report = await score_and_record(
+        session_id, any(p["ela"] for p in pages), all_detections, merged["is_child"],
+        merged["pii"], merged["barcodes"], meta, pages=len(pages))
+
+    return {
+        "session_id": session_id, "score": score, "detections": all_detections, "meta": meta,
+        "report": report, "triage": None, "dedup": None,
+        "pages": [{"page": i, "size": p["size"], "triage": p["triage"], "dedup": p["dedup"]} for i, p in enumerate(pages)],
+    }
+
+def stream_stripped(data):
+    """Streams a metadata-free copy of a stored upload without decoding pixels."""
+    yield from metadata_stripper.iter_stripped(io.BytesIO(data))
+
+async def tile_response(brush_session, dirty, tile, output_format):
+    """Returns only the rectangle a brush call changed (X-Tile-Box: x,y,w,h in px)."""
+    w, h = brush_session.size
+    rect = dirty or (0, 0, 0, 0)
+    headers = {"X-Tile-Box": ",".join(str(v) for v in rect), "X-Image-Size": f"{w},{h}"}
+    if dirty is None:
+        return Response(status_code=204, headers=headers)
+    preset = output_encoders.resolve_preset(output_format or "png_fast")
+    encoded = await offload(output_encoders.encode_image, tile, preset)
+    headers["X-TrustLens-Encoding"] = preset
+    return Response(content=encoded.tobytes(), media_type=output_encoders.PRESETS[preset]["media_type"], headers=headers)
+
+def apply_actions(img_rgb, requested_actions, faces, selected, data_boxes, session_id):
+    """Blur, redact, cloak and sign, in that order, as requested."""
+    protection_tools = registry.get("protection")
+
+    if "visible_blur" in requested_actions or "blur_selected" in requested_actions:
+        img_rgb = protection_tools.visible_blur(img_rgb, selected)
+
+    if "redact_data" in requested_actions:
+        img_rgb = protection_tools.visible_blur(img_rgb, data_boxes)
+
+    if "ai_cloak" in requested_actions:
+        img_rgb = protection_tools.ai_cloak(img_rgb, faces)
+
+    if "secure_sign" in requested_actions:
+        # We pass session_id to bind the signature to this specific process
+        img_rgb = protection_tools.apply_steganography(img_rgb, session_id, SECRET_KEY)
+    return img_rgb
+
+def iter_file(f):
+    """Streams a file in chunks and closes it at the end."""
+    try:
+        while chunk := f.read(Config.OUTPUT_CHUNK_SIZE):
+            yield chunk
+    finally:
+        f.close()
+
+def verification_headers(session_id, checked):
+    """Redaction check summary; the per-target results are served by /api/verification."""
+    return {**redaction_check.summary_headers(checked),
+            "X-TrustLens-Verification-Url": f"/api/verification/{session_id}"}
+
+def parse_indices(indices):
+    """Face numbers from the comma-separated `indices` form field."""
+    try:
+        values = [int(x) for x in indices.split(",") if x.strip()]
+    except ValueError:
+        raise ValueError("indices must be comma-separated face numbers")
+    if any(v < 0 for v in values):
+        raise ValueError("indices must not be negative")
+    return values
+
+async def protect_document(session_id, stored, requested_actions, target_indices, sessions, verify):
+    """
+    Multi-page protect: the actions run on every page (a few pages at a time,
+    in parallel) and the result is a multi-page TIFF. Face indices count
+    across the document, in the order the scan listed them.
+    """
+    cached = await offload(sessions.get_detections, session_id)
+    page_dets = cached.get("pages") if cached else None
+    if page_dets is None:
+        raise HTTPException(status_code=409, detail="Document detections are missing, scan it again")
+
+    target = set(target_indices)
+    selected_by_page, first_by_page = [], []
+    first = {"FACE": 0, "BARCODE": 0, "PII": 0}
+    for dets in page_dets:
+        selected_by_page.append({i for i in range(len(dets["faces"])) if first["FACE"] + i in target})
+        first_by_page.append(dict(first))
+        first = {"FACE": first["FACE"] + len(dets["faces"]), "BARCODE": first["BARCODE"] + len(dets["barcodes"]),
+                 "PII": first["PII"] + len(dets["pii"])}
+
+    def protect_page(item):
+        index, img_rgb = item
+        dets = page_dets[index]
+        faces, data_boxes = dets["faces"], dets["barcodes"] + dets["pii"]
+        selected = [faces[i] for i in sorted(selected_by_page[index])]
+        img_rgb = apply_actions(img_rgb, requested_actions, faces, selected, data_boxes, session_id)
+        checked = []
+        if verify:
+            targets = redaction_check.collect_targets(requested_actions, faces, selected_by_page[index],
+                                                      data_boxes, first_by_page[index])
+            checked = [{**r, "page": index} for r in
+                       redaction_check.verify_redactions(img_rgb, targets, registry.get("content"))]
+        return img_rgb, checked
+
+    def render():
+        # Small documents stay in memory, big ones spill to disk
+        out = tempfile.SpooledTemporaryFile(max_size=32 * 2**20)
+        checked = []
+        with multipage.PageWriter(out) as writer:
+            for page, page_checked in multipage.map_pages(enumerate(multipage.iter_pages(stored)), protect_page):
+                writer.add(page)
+                checked += page_checked
+        size = out.seek(0, os.SEEK_END)
+        out.seek(0)
+        return out, size, writer.pages, checked
+
+    try:
+        out, size, pages, checked = await offload(render)
+    except Exception as e:
+        log_failure("protection", e)
+        raise HTTPException(status_code=500, detail=str(e))
+    headers = {
+        "Content-Disposition": "attachment; filename=protected.tiff",
+        "Content-Length": str(size),
+        "X-TrustLens-Encoding": "tiff_deflate",
+        "X-TrustLens-Pages": str(pages),
+    }
+    if verify:
+        await offload(sessions.put_verification, session_id, checked)
+        headers.update(verification_headers(session_id, checked))
+    return StreamingResponse(iter_file(out), media_type=multipage.MEDIA_TYPE, headers=headers)
 
 @app.post("/api/protect")
 async def protect_image(
     action: str = Form(...), 
     indices: str = Form(""), 
     session_id: str = Form(...),
-    brush_data: str = Form("")
+    brush_data: str = Form(""),
+    output_format: str = Form(""),
+    png_level: Optional[int] = Form(None),
+    png_strategy: Optional[str] = Form(None),
+    brush_output: str = Form("full"),
+    verify: Optional[bool] = Form(None)
 ):
     """SEQUENTIAL ACTION ENGINE: Uses secure cryptographic signing tied to pixels."""
+    if output_format and output_format not in output_encoders.PRESETS:
+        raise HTTPException(status_code=400, detail=f"Unknown output_format. Options: {', '.join(output_encoders.PRESETS)}")
+    try:
+        check_session_id(session_id)
+        output_encoders.check_png_options(png_level, png_strategy)
+        target_indices = parse_indices(indices)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if verify is None:
+        verify = Config.VERIFY_REDACTIONS
+    sessions = registry.get("sessions")
     try:
-        target_file = os.path.join(UPLOAD_DIR, f"{session_id}.jpg")
-        img_rgb = cv2.cvtColor(cv2.imread(target_file), cv2.COLOR_BGR2RGB)
-        
-        all_faces, _ = content_analyzer.analyze_faces(img_rgb)
-        barcodes = content_analyzer.scan_barcodes(img_rgb)
-        pii_text = content_analyzer.scan_text_pii(img_rgb)
-        
         requested_actions = action.split(',')
 
+        # Brush edits reuse a per-worker cache that already holds the decoded
+        # image and its blurred layer, so repeated paint calls skip the store
+        brush_session = None
+        if "manual_brush" in requested_actions and brush_data:
+            brush_session = registry.get("brush").get(session_id)
+
+        stored = None
+        if brush_session is None:
+            stored = await offload(sessions.get_image, session_id)
+    except Exception as e:
+        log_failure("session", e)
+        raise HTTPException(status_code=503, detail="Session store unavailable")
+    if brush_session is None and stored is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    if stored is not None and multipage.is_multipage(utils_io.probe_image(stored)):
+        if "manual_brush" in requested_actions:
+            raise HTTPException(status_code=400, detail="Manual brush is only available for single images")
+        return await protect_document(session_id, stored, requested_actions, target_indices, sessions, verify)
+    try:
+        # Metadata-only request: rewrite the container, keep the pixels as they are
+        if set(requested_actions) == {"strip_metadata"}:
+            fmt = metadata_stripper.detect_format(stored[:16])
+            if fmt:
+                ext = "jpg" if fmt == "jpeg" else fmt
+                return StreamingResponse(
+                    stream_stripped(stored),
+                    media_type=metadata_stripper.MEDIA_TYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename=protected.{ext}"}
+                )
+            # Unknown container: fall through, the PNG re-encode below drops all metadata
+
+        if brush_session is not None:
+            img_rgb = brush_session.original
+        else:
+            with instrumentation.stage("decode"):
+                img_bgr = cv2.imdecode(np.frombuffer(stored, np.uint8), cv2.IMREAD_COLOR)
+            img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+
+        all_faces, barcodes, pii_text = [], [], []
+        if any(a in requested_actions for a in ("visible_blur", "blur_selected", "redact_data", "ai_cloak")):
+            cached = await offload(sessions.get_detections, session_id)
+            if cached is not None and cached.get("size") == [img_rgb.shape[1], img_rgb.shape[0]]:
+                instrumentation.cache_hit("session_detections")
+                all_faces, barcodes, pii_text = cached["faces"], cached["barcodes"], cached["pii"]
+            else:
+                # Same analysis path as the scan (dedup index + triage), so face indices line up
+                instrumentation.cache_miss("session_detections")
+                all_faces, _, barcodes, pii_text, _, _ = await analyze_content(img_rgb)
+        
         if "manual_brush" in requested_actions and brush_data:
             try:
                 coords = [float(x) for x in brush_data.split(',') if x]
                 points = [(coords[i], coords[i+1]) for i in range(0, len(coords), 2)]
                 h, w = img_rgb.shape[:2]
                 pixel_points = [(p[0] * w / 100, p[1] * h / 100) for p in points]
-                img_rgb = protection_tools.apply_brush_blur(img_rgb, pixel_points)
-            except Exception as e: print(f"BRUSH ERROR: {e}")
+                if brush_session is None:
+                    brush_session = await offload(registry.get("brush").create, session_id, img_rgb)
+                # Only the strokes added since the last call are blended in
+                tile_only = brush_output == "tile" and set(requested_actions) == {"manual_brush"}
+                dirty, painted = await offload(brush_session.paint, pixel_points, tile_only)
+                if tile_only:
+                    return await tile_response(brush_session, dirty, painted, output_format)
+                img_rgb = painted
+            except Exception as e: log_failure("brush", e)
 
-        if "visible_blur" in requested_actions or "blur_selected" in requested_actions:
-            target_indices = [int(x) for x in indices.split(",") if x]
-            selected = [all_faces[i] for i in target_indices if i < len(all_faces)]
-            img_rgb = protection_tools.visible_blur(img_rgb, selected)
-            
-        if "redact_data" in requested_actions:
-            img_rgb = protection_tools.visible_blur(img_rgb, barcodes + pii_text)
-
-        if "ai_cloak" in requested_actions:
-            img_rgb = protection_tools.ai_cloak(img_rgb, all_faces)
+        selected = [all_faces[i] for i in target_indices if i < len(all_faces)]
+        img_rgb = apply_actions(img_rgb, requested_actions, all_faces, selected, barcodes + pii_text, session_id)
 
-        if "secure_sign" in requested_actions:
-            # We pass session_id to bind the signature to this specific process
-            img_rgb = protection_tools.apply_steganography(img_rgb, session_id, SECRET_KEY)
+        # Lossless output is required to preserve LSB integrity of signed images
+        preset = output_encoders.resolve_preset(output_format, signed="secure_sign" in requested_actions)
+        spec = output_encoders.PRESETS[preset]
+        targets = redaction_check.collect_targets(requested_actions, all_faces, set(target_indices),
+                                                  barcodes + pii_text) if verify else []
+        # The re-scan only touches the redacted areas; it runs while the output is encoded
+        encoded, checked = await asyncio.gather(
+            offload(output_encoders.encode_image, img_rgb, preset, png_level, png_strategy),
+            offload(redaction_check.verify_redactions, img_rgb, targets, registry.get("content")) if targets else asyncio.sleep(0, []),
+        )
 
-        buf = io.BytesIO()
-        final_pil = Image.fromarray(img_rgb)
-        # Lossless PNG is required to preserve LSB integrity
-        final_pil.save(buf, format='PNG', optimize=False)
-        buf.seek(0)
-        
+        headers = {
+            "Content-Disposition": f"attachment; filename=protected{spec['ext']}",
+            "Content-Length": str(encoded.size),
+            "X-TrustLens-Encoding": preset,
+        }
+        if verify:
+            await offload(sessions.put_verification, session_id, checked)
+            headers.update(verification_headers(session_id, checked))
         return StreamingResponse(
-            buf, 
-            media_type="image/png",
-            headers={"Content-Disposition": "attachment; filename=protected.png"}
+            output_encoders.iter_chunks(encoded),
+            media_type=spec["media_type"],
+            headers=headers,
         )
     except Exception as e:
-        print(f"PROTECTION_FAILURE: {e}")
+        log_failure("protection", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/verification/{session_id}")
+async def get_verification(session_id: str):
+    """Per-target results of the last redaction check of a session (see /api/protect)."""
+    try:
+        check_session_id(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        results = await offload(registry.get("sessions").get_verification, session_id)
+    except Exception as e:
+        log_failure("session", e)
+        raise HTTPException(status_code=503, detail="Session store unavailable")
+    if results is None:
+        raise HTTPException(status_code=404, detail="No redaction check for this session")
+    return {"session_id": session_id, "verified": len(results),
+            "residual": [r["id"] for r in results if r["residual"]], "results": results}
+
 @app.post("/api/verify")
 async def verify_signature(file: UploadFile = File(...)):
     """
@@ -203,7 +662,8 @@ async def verify_signature(file: UploadFile = File(...)):
     try:
         contents = await file.read()
         nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with instrumentation.stage("decode"):
+            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         if img is None: return {"status": "ERROR", "message": "Invalid Image"}
         
         img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
@@ -256,5 +716,5 @@ async def verify_signature(file: UploadFile = File(...)):
         }
         
     except Exception as e:
-        print(f"VERIFY_ERROR: {e}")
+        log_failure("verify", e)
         return {"status": "ERROR", "message": str(e)}
\ No newline at end of file
@@ -0,0 +1,331 @@
+"""
+Pluggable session storage.
+
+A session holds the uploaded (stabilised) image bytes plus the detections
+found by /api/scan, so /api/protect can run on any worker or node and does
+not need to re-run the detectors. Pick the backend with Config.SESSION_BACKEND.
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+import re
+import socket
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+from config import Config
+
+_SESSION_ID = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+
+
+def check_session_id(session_id: str) -> str:
+    """Session ids end up in paths and keys, so only allow uuid-like values."""
+    if not _SESSION_ID.match(session_id or ""):
+        raise ValueError("Invalid session id")
+    return session_id
+
+
+class SessionStore(ABC):
+    """Interface every session backend implements."""
+
+    @abstractmethod
+    def put_image(self, session_id: str, data: bytes):
+        ...
+
+    @abstractmethod
+    def get_image(self, session_id: str):
+        """Returns the image bytes, or None if the session is unknown or expired."""
+
+    @abstractmethod
+    def put_detections(self, session_id: str, detections: dict):
+        ...
+
+    @abstractmethod
+    def get_detections(self, session_id: str):
+        """Returns the cached detections dict, or None."""
+
+    @abstractmethod
+    def put_verification(self, session_id: str, results: list):
+        ...
+
+    @abstractmethod
+    def get_verification(self, session_id: str):
+        """Returns the per-target results of the last redaction check, or None."""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    def purge_expired(self):
+        """
+        Removes sessions older than SESSION_TTL and returns how many went.
+        The server calls it every SESSION_PURGE_INTERVAL seconds. Backends
+        whose keys expire on their own have nothing to do.
+        """
+        return 0
+
+
+class LocalSessionStore(SessionStore):
+    """
+    Plain files in one directory: <id>.jpg, <id>.json and <id>.verify
+    (redaction check results). Single worker only.
+    Sessions older than SESSION_TTL are no longer returned, and purge_expired
+    deletes them.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or Config.SESSION_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, session_id, ext):
+        return os.path.join(self.root, f"{check_session_id(session_id)}{ext}")
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            if time.time() - os.path.getmtime(path) > Config.SESSION_TTL:
+                return None
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put_image(self, session_id, data):
+        with open(self._path(session_id, ".jpg"), "wb") as f:
+            f.write(data)
+
+    def get_image(self, session_id):
+        return self._read(self._path(session_id, ".jpg"))
+
+    def put_detections(self, session_id, detections):
+        with open(self._path(session_id, ".json"), "w") as f:
+            json.dump(detections, f, default=float)
+
+    def get_detections(self, session_id):
+        data = self._read(self._path(session_id, ".json"))
+        return json.loads(data) if data is not None else None
+
+    def put_verification(self, session_id, results):
+        with open(self._path(session_id, ".verify"), "w") as f:
+            json.dump(results, f, default=float)
+
+    def get_verification(self, session_id):
+        data = self._read(self._path(session_id, ".verify"))
+        return json.loads(data) if data is not None else None
+
+    def delete(self, session_id):
+        for ext in (".jpg", ".json", ".verify"):
+            try:
+                os.remove(self._path(session_id, ext))
+            except FileNotFoundError:
+                pass
+
+    def purge_expired(self):
+        """Removes sessions whose image or detections are older than SESSION_TTL."""
+        cutoff = time.time() - Config.SESSION_TTL
+        expired = set()
+        for name in os.listdir(self.root):
+            session_id, ext = os.path.splitext(name)
+            if ext not in (".jpg", ".json", ".verify") or not _SESSION_ID.match(session_id):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.root, name)) < cutoff:
+                    expired.add(session_id)
+            except OSError:
+                continue
+        for session_id in expired:
+            self.delete(session_id)
+        return len(expired)
+
+
+class SharedDirSessionStore(LocalSessionStore):
+    """
+    Layout for a directory shared by many workers or nodes (e.g. NFS).
+    Files are sharded as <root>/<2 chars>/<id>/ and every write goes to a
+    temp file in the same directory followed by an atomic rename, so a
+    reader on another node never sees a half-written file.
+    """
+
+    _NAMES = {".jpg": "image.bin", ".json": "detections.json", ".verify": "verification.json"}
+
+    def _path(self, session_id, ext):
+        session_id = check_session_id(session_id)
+        return os.path.join(self.root, session_id[:2], session_id, self._NAMES[ext])
+
+    def _atomic_write(self, path, data: bytes):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_image(self, session_id, data):
+        self._atomic_write(self._path(session_id, ".jpg"), data)
+
+    def put_detections(self, session_id, detections):
+        self._atomic_write(self._path(session_id, ".json"), json.dumps(detections, default=float).encode())
+
+    def put_verification(self, session_id, results):
+        self._atomic_write(self._path(session_id, ".verify"), json.dumps(results, default=float).encode())
+
+    def delete(self, session_id):
+        super().delete(session_id)
+        try:
+            os.rmdir(os.path.dirname(self._path(session_id, ".jpg")))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        """Removes sessions older than SESSION_TTL. Safe to run from any node."""
+        cutoff = time.time() - Config.SESSION_TTL
+        removed = 0
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for session_id in os.listdir(shard_dir):
+                image = os.path.join(shard_dir, session_id, "image.bin")
+                try:
+                    if os.path.getmtime(image) < cutoff:
+                        self.delete(session_id)
+                        removed += 1
+                except (OSError, ValueError):
+                    continue
+        return removed
+
+
+class _RespConnection:
+    """Minimal RESP2 client: enough for SET/GET/DEL against any Redis-protocol server."""
+
+    def __init__(self, host, port, db=0, password=None, timeout=5.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    def execute(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif isinstance(arg, int):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n" % len(arg))
+            parts.append(arg)
+            parts.append(b"\r\n")
+        self.sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Session store connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Session store error: {rest.decode()}")
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            return self.reader.read(length + 2)[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count == -1 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply from session store: {line!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Stores sessions in a Redis-protocol server (Redis, Valkey, KeyDB, or a
+    local stand-in speaking RESP), so every worker on every node sees them.
+    Keys expire after SESSION_TTL.
+    """
+
+    def __init__(self, url=None, prefix="trustlens:session:"):
+        parsed = urlparse(url or Config.SESSION_REDIS_URL)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self._local = threading.local()  # one connection per worker thread
+
+    def _execute(self, *args):
+        for attempt in (0, 1):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = _RespConnection(self.host, self.port, self.db, self.password)
+            try:
+                return conn.execute(*args)
+            except (ConnectionError, OSError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+    def _key(self, session_id, kind):
+        return f"{self.prefix}{check_session_id(session_id)}:{kind}"
+
+    def put_image(self, session_id, data):
+        self._execute("SET", self._key(session_id, "image"), data, "EX", Config.SESSION_TTL)
+
+    def get_image(self, session_id):
+        return self._execute("GET", self._key(session_id, "image"))
+
+    def put_detections(self, session_id, detections):
+        payload = json.dumps(detections, default=float)
+        self._execute("SET", self._key(session_id, "detections"), payload, "EX", Config.SESSION_TTL)
+
+    def get_detections(self, session_id):
+        data = self._execute("GET", self._key(session_id, "detections"))
+        return json.loads(data) if data is not None else None
+
+    def put_verification(self, session_id, results):
+        payload = json.dumps(results, default=float)
+        self._execute("SET", self._key(session_id, "verification"), payload, "EX", Config.SESSION_TTL)
+
+    def get_verification(self, session_id):
+        data = self._execute("GET", self._key(session_id, "verification"))
+        return json.loads(data) if data is not None else None
+
+    def delete(self, session_id):
+        self._execute("DEL", self._key(session_id, "image"), self._key(session_id, "detections"),
+                      self._key(session_id, "verification"))
+
+
+BACKENDS = {
+    "local": LocalSessionStore,
+    "shared": SharedDirSessionStore,
+    "redis": RedisSessionStore,
+}
+
+
+def create_session_store(backend=None):
+    """Builds the store selected by Config.SESSION_BACKEND."""
+    backend = backend or Config.SESSION_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown session backend '{backend}'. Options: {', '.join(BACKENDS)}")
+    return BACKENDS[backend]()
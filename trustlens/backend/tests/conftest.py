@@ -0,0 +1,8 @@
+"""
+The backend is a flat set of modules run from its own directory
+(`python server.py`), so the tests import them the same way.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
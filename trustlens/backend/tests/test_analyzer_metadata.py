@@ -0,0 +1,104 @@
+import io
+from fractions import Fraction
+
+import exifread
+import numpy as np
+import pytest
+from PIL import Image, ExifTags
+
+from analyzer_metadata import AnalyzerMetadata, find_exif_block, parse_tiff_tags
+
+IFD0 = {ExifTags.Base.Make: "BenchCam", ExifTags.Base.Model: "Model 1",
+        ExifTags.Base.Software: "TrustLens 2.0", ExifTags.Base.Artist: "Jane Doe"}
+DATETIME = "2024:05:01 12:34:56"
+LATITUDE = (52.0, 31.0, 12.5)
+
+
+def camera_exif(gps=True, sub_ifd=True):
+    exif = Image.Exif()
+    exif.update(IFD0)
+    if sub_ifd:
+        exif.get_ifd(ExifTags.IFD.Exif)[ExifTags.Base.DateTimeOriginal] = DATETIME
+    if gps:
+        gps_ifd = exif.get_ifd(ExifTags.IFD.GPSInfo)
+        gps_ifd[ExifTags.GPS.GPSLatitudeRef] = "N"
+        gps_ifd[ExifTags.GPS.GPSLatitude] = LATITUDE
+    return exif
+
+
+def encode(fmt, exif=None):
+    image = Image.fromarray(np.random.default_rng(0).integers(0, 255, (48, 64, 3), dtype=np.uint8))
+    buf = io.BytesIO()
+    kwargs = {"exif": exif.tobytes()} if exif is not None else {}
+    image.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def pil_tags(data):
+    """The privacy_map tags as PIL reads them, for comparison."""
+    exif = Image.open(io.BytesIO(data)).getexif()
+    tags = {}
+    names = {ExifTags.Base.Make: "Image Make", ExifTags.Base.Model: "Image Model",
+             ExifTags.Base.Software: "Image Software", ExifTags.Base.Artist: "Image Artist"}
+    for tag, name in names.items():
+        if tag in exif:
+            tags[name] = str(exif[tag]).strip()
+    sub = exif.get_ifd(ExifTags.IFD.Exif)
+    if ExifTags.Base.DateTimeOriginal in sub:
+        tags["EXIF DateTimeOriginal"] = sub[ExifTags.Base.DateTimeOriginal]
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    if ExifTags.GPS.GPSLatitude in gps:
+        tags["GPS GPSLatitude"] = [Fraction(float(v)).limit_denominator(1000) for v in gps[ExifTags.GPS.GPSLatitude]]
+    return tags
+
+
+def as_fractions(value):
+    return [Fraction(part) for part in value.strip("[]").split(", ")]
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+@pytest.mark.parametrize("gps, sub_ifd", [(True, True), (False, True), (True, False), (False, False)])
+def test_header_parse_matches_pil(fmt, gps, sub_ifd):
+    data = encode(fmt, camera_exif(gps, sub_ifd))
+    tiff = find_exif_block(io.BytesIO(data))
+    assert tiff is not None
+    ours = parse_tiff_tags(tiff)
+    expected = pil_tags(data)
+
+    if "GPS GPSLatitude" in expected:
+        assert as_fractions(ours.pop("GPS GPSLatitude")) == expected.pop("GPS GPSLatitude")
+    else:
+        assert "GPS GPSLatitude" not in ours
+    assert ours == expected
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+def test_header_parse_matches_exifread_formatting(fmt):
+    # The audit table showed exifread's strings before the header-only parser
+    # (exifread finds nothing in these WebP files, the header parser does)
+    data = encode(fmt, camera_exif())
+    ours = parse_tiff_tags(find_exif_block(io.BytesIO(data)))
+    theirs = {k: str(v) for k, v in exifread.process_file(io.BytesIO(data), details=False).items() if k in ours}
+    assert ours == theirs
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+def test_no_exif(fmt):
+    data = encode(fmt)
+    assert find_exif_block(io.BytesIO(data)) is None
+    report = AnalyzerMetadata().get_metadata_risk_from_bytes(data)
+    assert report["is_stripped"] and report["audit"] == []
+
+
+def test_report_from_bytes():
+    report = AnalyzerMetadata().get_metadata_risk_from_bytes(encode("JPEG", camera_exif()))
+    assert report["gps_found"] is True
+    assert report["device_info"] == "BenchCam Model 1"
+    assert {row["tag"] for row in report["audit"]} == {
+        "GPS Location", "Camera Make", "Camera Model", "Software/OS", "Timestamp", "Owner/Artist"}
+
+
+def test_truncated_header_is_not_fatal():
+    data = encode("JPEG", camera_exif())[:40]
+    report = AnalyzerMetadata().get_metadata_risk_from_bytes(data)
+    assert report["audit"] == []
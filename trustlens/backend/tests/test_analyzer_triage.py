@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+import pytest
+
+from analyzer_triage import AnalyzerTriage, STAGE_FACES, STAGE_TEXT
+from bench_fixtures import _background, face_sample, render_landscape
+
+PHOTO = (2000, 1500)
+
+
+def photo_with_face(width):
+    canvas = _background(PHOTO, seed=3)
+    face = face_sample()
+    face = cv2.resize(face, (width, int(width * face.shape[0] / face.shape[1])), interpolation=cv2.INTER_AREA)
+    canvas[700:700 + face.shape[0], 900:900 + width] = face
+    return canvas
+
+
+def photo_with_text(scale):
+    canvas = _background(PHOTO, seed=4)
+    cv2.putText(canvas, "Call me at 415-555-0134", (300, 700), cv2.FONT_HERSHEY_SIMPLEX,
+                scale, (0, 0, 0), 2, cv2.LINE_AA)
+    return canvas
+
+
+@pytest.fixture(scope="module")
+def triage():
+    return AnalyzerTriage()
+
+
+@pytest.mark.parametrize("width", [100, 150, 200])
+def test_small_face_in_a_large_photo_runs_the_face_detector(triage, width):
+    run, deferred, _ = triage.plan(triage.classify(photo_with_face(width)))
+    assert STAGE_FACES in run
+
+
+@pytest.mark.parametrize("scale", [0.8, 1.0, 1.2])
+def test_one_line_of_small_text_runs_ocr(triage, scale):
+    run, deferred, _ = triage.plan(triage.classify(photo_with_text(scale)))
+    assert STAGE_TEXT in run
+
+
+def test_near_threshold_face_is_deferred_not_skipped(triage):
+    decision = triage.classify(photo_with_face(60))
+    run, deferred, skipped = triage.plan(decision)
+    assert STAGE_FACES in deferred
+    assert STAGE_FACES not in skipped
+    assert triage.report(decision, skipped, deferred)["deferred"] == deferred
+
+
+def test_empty_landscape_skips_everything(triage):
+    run, deferred, skipped = triage.plan(triage.classify(render_landscape(PHOTO)))
+    assert run == [] and deferred == [] and len(skipped) == 3
+
+
+def test_skin_coloured_wall_is_not_a_face(triage):
+    wall = np.empty((1500, 2000, 3), dtype=np.uint8)
+    wall[:] = (200, 160, 120)
+    wall = np.clip(wall + np.random.default_rng(1).integers(0, 20, wall.shape), 0, 255).astype(np.uint8)
+    decision = triage.classify(wall)
+    assert decision["face"] is False
+
+
+def test_grayscale_keeps_the_face_detector(triage):
+    gray = cv2.cvtColor(cv2.cvtColor(photo_with_text(1.0), cv2.COLOR_RGB2GRAY), cv2.COLOR_GRAY2RGB)
+    assert triage.classify(gray)["face"] is True
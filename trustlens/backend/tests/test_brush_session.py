@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from bench_fixtures import render_faces
+from brush_session import BrushSession
+from protection_tools import ProtectionTools
+
+RADIUS = 30
+
+STROKES = {
+    "centre": [[(300, 200), (310, 205), (320, 212)], [(330, 220), (345, 228)]],
+    "edges": [[(0, 0), (5, 3)], [(639, 479), (630, 470)], [(639, 0)]],
+    "apart": [[(60, 60)], [(580, 420)], [(320, 40), (320, 60)]],
+    "off_image": [[(-20, 100), (660, 240)], [(320, 500)]],
+    "same_point_twice": [[(200, 150)], [(200, 150)]],
+}
+
+
+def full_render(image, points):
+    return ProtectionTools().apply_brush_blur(image, points, radius=RADIUS)
+
+
+def paste(canvas, dirty, tile):
+    x, y, w, h = dirty
+    assert tile.shape[:2] == (h, w)
+    canvas[y:y + h, x:x + w] = tile
+
+
+@pytest.fixture(scope="module")
+def image():
+    return render_faces((640, 480), 2)
+
+
+@pytest.mark.parametrize("name", STROKES)
+def test_tiles_rebuild_the_full_re_render(image, name):
+    """A client that pastes every tile onto its copy sees exactly what a full render gives."""
+    session = BrushSession(image, radius=RADIUS)
+    canvas = image.copy()
+    points = []
+    for stroke in STROKES[name]:
+        points = points + stroke
+        dirty, tile = session.paint(points, tile=True)
+        if dirty is not None:
+            paste(canvas, dirty, tile)
+        assert np.array_equal(canvas, full_render(image, points))
+
+
+def test_full_output_matches_the_full_re_render(image):
+    session = BrushSession(image, radius=RADIUS)
+    points = []
+    for stroke in STROKES["centre"]:
+        points = points + stroke
+        _, painted = session.paint(points)
+        assert np.array_equal(painted, full_render(image, points))
+
+
+def test_undo_restores_what_the_removed_strokes_touched(image):
+    session = BrushSession(image, radius=RADIUS)
+    canvas = image.copy()
+    first, second = [(100, 100), (110, 104)], [(500, 380)]
+    for points in (first, first + second, first):
+        dirty, tile = session.paint(points, tile=True)
+        paste(canvas, dirty, tile)
+    assert np.array_equal(canvas, full_render(image, first))
+
+    dirty, tile = session.paint([], tile=True)
+    paste(canvas, dirty, tile)
+    assert np.array_equal(canvas, image)
+
+
+def test_undo_after_strokes_outside_the_image(image):
+    session = BrushSession(image, radius=RADIUS)
+    canvas = image.copy()
+    assert session.paint([(-500, -500)], tile=True) == (None, None)
+    dirty, tile = session.paint([(10, 10)], tile=True)
+    paste(canvas, dirty, tile)
+    assert np.array_equal(canvas, full_render(image, [(10, 10)]))
+
+
+def test_repeating_the_same_strokes_changes_nothing(image):
+    session = BrushSession(image, radius=RADIUS)
+    points = [(250, 250), (260, 255)]
+    session.paint(points, tile=True)
+    assert session.paint(points, tile=True) == (None, None)
+
+
+def test_tile_stays_inside_the_image(image):
+    session = BrushSession(image, radius=RADIUS)
+    dirty, tile = session.paint([(2, 477)], tile=True)
+    x, y, w, h = dirty
+    assert x == 0 and y + h == 480
+    assert w < 640 and h < 480
+    assert tile.shape == (h, w, 3)
+
+
+def test_session_leaves_the_input_alone(image):
+    before = image.copy()
+    session = BrushSession(image, radius=RADIUS)
+    session.paint([(320, 240)])
+    assert np.array_equal(image, before)
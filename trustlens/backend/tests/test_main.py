@@ -0,0 +1,17 @@
+import sys
+
+import main
+from test_multipage import PAGES, render_page, tiff
+
+
+def test_image_refuses_multipage_documents(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "doc.tif"
+    path.write_bytes(tiff([render_page(marks) for marks in PAGES]))
+    monkeypatch.setattr(sys, "argv", ["main.py", "--image", str(path)])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("only the first page would be loaded")
+
+    monkeypatch.setattr("utils_io.load_image_safe", fail)
+    main.main()
+    assert "multi-page document" in capsys.readouterr().out
@@ -0,0 +1,138 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import ExifTags, Image, ImageCms, PngImagePlugin
+
+import metadata_stripper
+from analyzer_metadata import find_exif_block
+from metadata_stripper import strip_bytes, iter_stripped
+from test_analyzer_metadata import camera_exif
+
+XMP = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+       b'<rdf:Description xmlns:exif="http://ns.adobe.com/exif/1.0/" exif:GPSLatitude="52,31.2N"/>'
+       b'</rdf:RDF></x:xmpmeta>')
+SECRETS = (b"BenchCam", b"Jane Doe", b"GPSLatitude", b"xmpmeta", b"secret comment")
+
+
+def pixels(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def photo():
+    rng = np.random.default_rng(1)
+    return Image.fromarray(rng.integers(0, 255, (120, 160, 3), dtype=np.uint8))
+
+
+def tagged(fmt):
+    """An image with EXIF (incl. GPS), XMP and a comment, as a camera or editor writes them."""
+    buf = io.BytesIO()
+    exif = camera_exif().tobytes()
+    if fmt == "JPEG":
+        icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+        photo().save(buf, format="JPEG", exif=exif, xmp=XMP, comment=b"secret comment", icc_profile=icc)
+        # A vendor trailer after EOI
+        buf.write(b"secret comment trailer")
+    elif fmt == "PNG":
+        info = PngImagePlugin.PngInfo()
+        info.add_itxt("XML:com.adobe.xmp", XMP.decode())
+        info.add_text("Comment", "secret comment")
+        photo().save(buf, format="PNG", exif=exif, pnginfo=info)
+    else:
+        photo().save(buf, format="WEBP", exif=exif, xmp=XMP, lossless=True)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+def test_metadata_is_gone_and_pixels_are_identical(fmt):
+    data = tagged(fmt)
+    for secret in SECRETS[:4]:
+        assert secret in data
+    stripped = strip_bytes(data)
+
+    for secret in SECRETS:
+        assert secret not in stripped
+    assert find_exif_block(io.BytesIO(stripped)) is None
+    image = Image.open(io.BytesIO(stripped))
+    assert not image.getexif()
+    assert "xmp" not in image.info and "XML:com.adobe.xmp" not in image.info
+    assert np.array_equal(pixels(stripped), pixels(data))
+
+
+def test_jpeg_keeps_the_icc_profile_and_scan_bytes():
+    data = tagged("JPEG")
+    stripped = strip_bytes(data)
+    assert Image.open(io.BytesIO(stripped)).info["icc_profile"] == Image.open(io.BytesIO(data)).info["icc_profile"]
+    # The entropy-coded scan is copied, not re-encoded
+    scan = data[data.index(b"\xff\xda"):data.index(b"\xff\xd9") + 2]
+    assert stripped.endswith(scan)
+
+
+def test_webp_header_flags_are_cleared():
+    stripped = strip_bytes(tagged("WEBP"))
+    assert stripped[12:16] == b"VP8X"
+    assert stripped[20] & 0x0C == 0
+    assert int.from_bytes(stripped[4:8], "little") == len(stripped) - 8
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+def test_small_blocks_give_the_same_output(fmt, monkeypatch):
+    data = tagged(fmt)
+    expected = strip_bytes(data)
+    monkeypatch.setattr(metadata_stripper, "CHUNK_SIZE", 7)
+    assert b"".join(iter_stripped(io.BytesIO(data))) == expected
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG", "WEBP"])
+def test_clean_files_pass_through(fmt):
+    buf = io.BytesIO()
+    photo().save(buf, format=fmt)
+    data = buf.getvalue()
+    assert strip_bytes(strip_bytes(data)) == strip_bytes(data)
+    assert np.array_equal(pixels(strip_bytes(data)), pixels(data))
+
+
+def test_unsupported_format_is_refused():
+    with pytest.raises(ValueError):
+        strip_bytes(b"GIF89a" + b"\x00" * 32)
+
+
+
+def rotated_jpeg(exif):
+    buf = io.BytesIO()
+    photo().save(buf, format="JPEG", exif=exif)
+    return buf.getvalue()
+
+
+def big_endian_exif(orientation):
+    """Orientation and Artist in a Motorola-order block, as many cameras write it."""
+    artist = b"Jane Doe\x00"
+    ifd = (b"MM\x00\x2a\x00\x00\x00\x08\x00\x02"
+           + b"\x01\x12\x00\x03\x00\x00\x00\x01" + orientation.to_bytes(2, "big") + b"\x00\x00"
+           + b"\x01\x3b\x00\x02" + len(artist).to_bytes(4, "big") + (38).to_bytes(4, "big")
+           + b"\x00\x00\x00\x00" + artist)
+    return b"Exif\x00\x00" + ifd
+
+
+@pytest.mark.parametrize("orientation", [3, 6, 8])
+def test_jpeg_keeps_only_the_orientation(orientation):
+    exif = camera_exif()
+    exif[ExifTags.Base.Orientation] = orientation
+    data = rotated_jpeg(exif)
+    stripped = strip_bytes(data)
+    assert dict(Image.open(io.BytesIO(stripped)).getexif()) == {ExifTags.Base.Orientation: orientation}
+    assert not any(secret in stripped for secret in SECRETS)
+    assert np.array_equal(pixels(stripped), pixels(data))
+
+
+def test_big_endian_orientation_is_kept():
+    stripped = strip_bytes(rotated_jpeg(big_endian_exif(6)))
+    assert dict(Image.open(io.BytesIO(stripped)).getexif()) == {ExifTags.Base.Orientation: 6}
+    assert b"Jane Doe" not in stripped
+
+
+def test_upright_jpeg_gets_no_exif():
+    exif = camera_exif()
+    exif[ExifTags.Base.Orientation] = 1
+    stripped = strip_bytes(rotated_jpeg(exif))
+    assert find_exif_block(io.BytesIO(stripped)) is None
@@ -0,0 +1,229 @@
+import io
+import threading
+import time
+import uuid
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import multipage
+import registry
+import server
+from config import Config
+from session_store import LocalSessionStore
+from utils_io import ImageTooLarge
+
+WHITE, GREEN, RED = (255, 255, 255), (0, 255, 0), (255, 0, 0)
+
+# Page contents: (colour, x, y, w, h). White squares are faces, green ones
+# barcodes and red bars PII for MarkedContent.
+PAGES = [
+    [(WHITE, 40, 40, 60, 60)],
+    [(RED, 100, 100, 80, 20)],
+    [(WHITE, 20, 120, 50, 50), (WHITE, 200, 60, 60, 60), (GREEN, 250, 170, 40, 40)],
+]
+
+
+def render_page(marks, size=(320, 240)):
+    w, h = size
+    page = np.full((h, w, 3), 40, dtype=np.uint8)
+    for colour, x, y, bw, bh in marks:
+        page[y:y + bh, x:x + bw] = colour
+    return page
+
+
+def tiff(pages):
+    images = [Image.fromarray(p) for p in pages]
+    buf = io.BytesIO()
+    images[0].save(buf, format="TIFF", save_all=True, append_images=images[1:], compression="tiff_deflate")
+    return buf.getvalue()
+
+
+def png(page):
+    ok, data = cv2.imencode(".png", cv2.cvtColor(page, cv2.COLOR_RGB2BGR))
+    return data.tobytes()
+
+
+class MarkedContent:
+    """Stands in for the content analyzer: finds the solid colour marks of render_page."""
+
+    @staticmethod
+    def _find(image_rgb, colour):
+        mask = np.all(np.abs(image_rgb.astype(int) - colour) <= 5, axis=-1).astype(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        return [[int(v) for v in stats[i, :4]] for i in range(1, count) if stats[i, 4] >= 50]
+
+    def analyze_faces(self, image_rgb):
+        return [{"type": "FACE", "box": box, "confidence": 0.9} for box in self._find(image_rgb, WHITE)], False
+
+    def scan_barcodes(self, image_rgb):
+        return [{"type": "BARCODE", "box": box, "data": "code"} for box in self._find(image_rgb, GREEN)]
+
+    def scan_text_pii(self, image_rgb):
+        return [{"type": "PII", "kind": "ssn", "box": box, "text": "SENSITIVE"} for box in self._find(image_rgb, RED)]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    store = LocalSessionStore(str(tmp_path))
+    monkeypatch.setitem(registry._instances, "sessions", store)
+    monkeypatch.setitem(registry._instances, "content", MarkedContent())
+    # The marks are too plain for the triage to call them text or faces
+    monkeypatch.setattr(Config, "TRIAGE_ENABLED", False)
+    return TestClient(server.app), store
+
+
+def scan(client, data, name="doc.tif"):
+    response = client.post("/api/scan", files={"file": (name, data, "image/tiff")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def without(det, *keys):
+    return {k: v for k, v in det.items() if k not in keys}
+
+
+# --- Pages ---
+
+def test_iter_pages_decodes_every_page():
+    pages = [render_page(marks) for marks in PAGES]
+    decoded = list(multipage.iter_pages(tiff(pages)))
+    assert len(decoded) == len(pages)
+    assert all(np.array_equal(a, b) for a, b in zip(decoded, pages))
+
+
+def test_iter_pages_downscales_to_max_side():
+    pages = [render_page(PAGES[0], (640, 480)), render_page(PAGES[1], (200, 100))]
+    sizes = [p.shape[:2] for p in multipage.iter_pages(tiff(pages), max_side=320)]
+    assert sizes == [(240, 320), (100, 200)]
+
+
+def test_too_many_pages_are_refused(monkeypatch):
+    monkeypatch.setattr(Config, "MAX_PAGES", 2)
+    with pytest.raises(ImageTooLarge):
+        list(multipage.iter_pages(tiff([render_page([])] * 3)))
+
+
+def test_map_pages_keeps_order_and_bounds_pages_in_flight():
+    workers, lock = 3, threading.Lock()
+    state = {"read": 0, "done": 0, "ahead": 0}
+
+    def pages():
+        for i in range(12):
+            with lock:
+                state["read"] += 1
+                state["ahead"] = max(state["ahead"], state["read"] - state["done"])
+            yield i
+
+    def work(i):
+        time.sleep(0.01 * (i % 3))
+        return i * 10
+
+    results = []
+    for value in multipage.map_pages(pages(), work, workers=workers):
+        results.append(value)
+        with lock:
+            state["done"] += 1
+    assert results == [i * 10 for i in range(12)]
+    assert state["ahead"] <= workers
+
+
+def test_page_writer_is_lossless():
+    pages = [render_page(marks) for marks in PAGES]
+    decoded = list(multipage.iter_pages(multipage.write_pages(pages)))
+    assert all(np.array_equal(a, b) for a, b in zip(decoded, pages))
+
+
+def test_merge_tags_every_detection_with_its_page():
+    content = MarkedContent()
+    per_page = []
+    for marks in PAGES:
+        page = render_page(marks)
+        faces, is_child = content.analyze_faces(page)
+        per_page.append({"faces": faces, "is_child": is_child,
+                         "barcodes": content.scan_barcodes(page), "pii": content.scan_text_pii(page)})
+    merged = multipage.merge_page_results(per_page)
+    assert [d["page"] for d in merged["faces"]] == [0, 2, 2]
+    assert [d["page"] for d in merged["barcodes"]] == [2]
+    assert [d["page"] for d in merged["pii"]] == [1]
+    assert merged["is_child"] is False
+
+
+# --- /api/scan and /api/protect on a document ---
+
+def test_document_scan_matches_a_scan_of_each_page(app):
+    client, store = app
+    pages = [render_page(marks) for marks in PAGES]
+    result = scan(client, tiff(pages))
+
+    assert len(result["pages"]) == 3
+    assert [(d["id"], d["page"]) for d in result["detections"]] == [
+        ("FACE_01", 0), ("FACE_02", 2), ("FACE_03", 2), ("BARCODE_01", 2), ("PII_01", 1)]
+
+    for index, page in enumerate(pages):
+        single = scan(client, png(page), "page.png")
+        expected = [without(d, "id") for d in single["detections"]]
+        found = [without(d, "id", "page") for d in result["detections"] if d["page"] == index]
+        assert found == expected
+
+    stored = store.get_detections(result["session_id"])["pages"]
+    assert [len(p["faces"]) for p in stored] == [1, 0, 2]
+    assert [p["size"] for p in stored] == [[320, 240]] * 3
+
+
+def test_document_scan_works_at_the_working_resolution(app, monkeypatch):
+    client, store = app
+    monkeypatch.setattr(Config, "WORKING_MAX_SIDE", 160)
+    pages = [render_page([(WHITE, 80, 80, 120, 120)], (640, 480)), render_page([], (320, 240))]
+    result = scan(client, tiff(pages))
+
+    assert [p["size"] for p in result["pages"]] == [[160, 120], [160, 120]]
+    face = result["detections"][0]
+    assert face["page"] == 0 and face["box"] == pytest.approx([12.5, 16.667, 18.75, 25.0], abs=0.1)
+    working = list(multipage.iter_pages(store.get_image(result["session_id"])))
+    assert [p.shape[:2] for p in working] == [(120, 160), (120, 160)]
+
+
+def test_document_with_too_many_pages_is_refused(app, monkeypatch):
+    client, _ = app
+    monkeypatch.setattr(Config, "MAX_PAGES", 2)
+    response = client.post("/api/scan", files={"file": ("doc.tif", tiff([render_page([])] * 3), "image/tiff")})
+    assert response.status_code == 413
+
+
+def test_document_protect_matches_protecting_each_page(app):
+    client, store = app
+    pages = [render_page(marks) for marks in PAGES]
+    result = scan(client, tiff(pages))
+    session_id = result["session_id"]
+
+    # FACE_02 is the first face of page 2
+    response = client.post("/api/protect", data={"action": "visible_blur,redact_data", "indices": "1",
+                                                  "session_id": session_id, "verify": "true"})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == multipage.MEDIA_TYPE
+    assert response.headers["X-TrustLens-Pages"] == "3"
+    protected = list(multipage.iter_pages(response.content))
+
+    # The same actions through the single-image path, one page at a time
+    stored = store.get_detections(session_id)["pages"]
+    local_indices = ["", "", "0"]
+    for index, page in enumerate(pages):
+        page_id = str(uuid.uuid4())
+        store.put_image(page_id, png(page))
+        store.put_detections(page_id, stored[index])
+        single = client.post("/api/protect", data={"action": "visible_blur,redact_data", "indices": local_indices[index],
+                                                    "session_id": page_id, "verify": "false"})
+        assert single.status_code == 200, single.text
+        expected = cv2.cvtColor(cv2.imdecode(np.frombuffer(single.content, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+        assert np.array_equal(protected[index], expected)
+
+    assert np.array_equal(protected[0], pages[0])  # nothing selected or redacted there
+    assert not np.array_equal(protected[2], pages[2])
+
+    checked = client.get(response.headers["X-TrustLens-Verification-Url"]).json()["results"]
+    assert [(r["id"], r["page"]) for r in checked] == [("PII_01", 1), ("FACE_02", 2), ("BARCODE_01", 2)]
+    assert response.headers["X-TrustLens-Residual"] == "none"
@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+
+import bench_fixtures
+from analyzer_content import AnalyzerContent
+from phash_index import PHashIndex, analyze_with_index, phash, hamming
+
+FACE = {"type": "FACE", "box": [10, 10, 40, 40], "confidence": 0.9}
+
+
+def photo_with_qr(payload):
+    """The same photo, with a small QR code in one corner."""
+    img = bench_fixtures.render_faces((1200, 900), 1)
+    qr = cv2.QRCodeEncoder.create().encode(payload)
+    qr = cv2.resize(qr, (240, 240), interpolation=cv2.INTER_NEAREST)
+    img[20:260, 20:260] = cv2.cvtColor(qr, cv2.COLOR_GRAY2RGB)
+    return img
+
+
+def analyzer(calls):
+    content = AnalyzerContent()
+
+    def analyze(img, reuse):
+        calls.append(reuse is not None)
+        faces = reuse["faces"] if reuse else [dict(FACE)]
+        return {"faces": faces, "is_child": False, "barcodes": content.scan_barcodes(img), "pii": []}
+    return analyze
+
+
+def test_hit_rescans_barcodes_and_never_stores_payloads(tmp_path):
+    alice, bob = photo_with_qr("ACCOUNT-ALICE-4111111111111111"), photo_with_qr("ACCOUNT-BOB-4111111111111111")
+    assert hamming(phash(alice), phash(bob)) <= 6
+
+    index = PHashIndex(str(tmp_path / "index.sqlite"))
+    calls = []
+    first, info = analyze_with_index(index, alice, analyzer(calls), "tenant")
+    second, info = analyze_with_index(index, bob, analyzer(calls), "tenant")
+
+    assert info["hit"] and calls == [False, True]
+    assert [b["data"] for b in first["barcodes"]] == ["ACCOUNT-ALICE-4111111111111111"]
+    assert [b["data"] for b in second["barcodes"]] == ["ACCOUNT-BOB-4111111111111111"]
+    assert second["faces"][0]["box"] == FACE["box"]
+    index.close()
+    assert b"ACCOUNT" not in (tmp_path / "index.sqlite").read_bytes()
+
+
+def test_namespaces_do_not_share_results(tmp_path):
+    img = photo_with_qr("x")
+    index = PHashIndex(str(tmp_path / "index.sqlite"))
+    calls = []
+    analyze_with_index(index, img, analyzer(calls), "alice")
+    _, info = analyze_with_index(index, img, analyzer(calls), "bob")
+    assert not info["hit"] and calls == [False, False]
+    _, info = analyze_with_index(index, img, analyzer(calls), "alice")
+    assert info["hit"]
+
+
+def test_old_index_with_full_results_is_dropped(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "index.sqlite")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE images (id INTEGER PRIMARY KEY, hash TEXT, result TEXT)")
+    db.execute("INSERT INTO images (hash, result) VALUES ('0', '{\"barcodes\": [{\"data\": \"SECRET\"}]}')")
+    db.commit()
+    db.close()
+    PHashIndex(path).close()
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM images").fetchone()[0] == 0
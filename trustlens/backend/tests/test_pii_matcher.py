@@ -0,0 +1,105 @@
+import pytest
+
+from pii_matcher import find_pii, luhn_valid, match_words, VALIDATORS
+
+
+def found(text):
+    return [(kind, text[start:end]) for kind, start, end in find_pii(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    # A phone number followed by more digits must not be swallowed by a failed card match
+    ("Tel 555-234-5678 90210", [("phone", "555-234-5678")]),
+    ("555-234-5678 2024", [("phone", "555-234-5678")]),
+    ("555-234-5678 555-987-6543", [("phone", "555-234-5678"), ("phone", "555-987-6543")]),
+    ("202-555-0173 12 34", [("phone", "202-555-0173")]),
+    ("Card 4111 1111 1111 1111", [("card", "4111 1111 1111 1111")]),
+    # The valid card is found inside a longer run of digit groups
+    ("Ref 12 4111 1111 1111 1111", [("card", "4111 1111 1111 1111")]),
+    ("4111111111111111 then 555-234-5678", [("card", "4111111111111111"), ("phone", "555-234-5678")]),
+    ("SSN 123-45-6789", [("ssn", "123-45-6789")]),
+    ("mail jane.doe@example.com or +44 20 7946 0958",
+     [("email", "jane.doe@example.com"), ("phone", "+44 20 7946 0958")]),
+    ("(415) 555-0134", [("phone", "(415) 555-0134")]),
+    ("Order 4111 1111 1111 1112", []),
+    ("SSN 000-12-3456", []),
+    ("Room 123 on floor 4", []),
+])
+def test_find_pii(text, expected):
+    assert found(text) == expected
+
+
+def test_adjacent_matches_stay_apart():
+    text = "4111111111111111-555-234-5678"
+    assert list(find_pii(text)) == [("card", 0, 16), ("phone", 17, 29)]
+
+
+def test_luhn():
+    assert luhn_valid("4111111111111111")
+    assert luhn_valid("5500000000000004")
+    assert luhn_valid("79927398713")
+    assert not luhn_valid("4111111111111112")
+    # A repeated digit can pass Luhn but is never taken for a card
+    assert luhn_valid("0000000000000")
+    assert not VALIDATORS["card"]("0000000000000")
+
+
+@pytest.mark.parametrize("ssn, valid", [
+    ("123-45-6789", True),
+    ("000-45-6789", False),
+    ("666-45-6789", False),
+    ("912-45-6789", False),
+    ("123-00-6789", False),
+    ("123-45-0000", False),
+])
+def test_ssn_rules(ssn, valid):
+    assert VALIDATORS["ssn"](ssn) is valid
+
+
+@pytest.mark.parametrize("phone, valid", [
+    ("415-555-0134", True),
+    ("1 415 555 0134", True),
+    ("+44 20 7946 0958", True),
+    ("015-555-0134", False),   # area code starts with 0
+    ("415-155-0134", False),   # exchange starts with 1
+    ("222-222-2222", False),   # not a real number
+    ("+1 23", False),
+])
+def test_nanp_rules(phone, valid):
+    assert VALIDATORS["phone"](phone) is valid
+
+
+def word_table(lines):
+    data = {k: [] for k in ("text", "conf", "block_num", "par_num", "line_num", "left", "top", "width", "height")}
+    for line_num, line in enumerate(lines):
+        x = 0
+        for word in line.split():
+            data["text"].append(word)
+            data["conf"].append(90)
+            data["block_num"].append(1)
+            data["par_num"].append(1)
+            data["line_num"].append(line_num)
+            data["left"].append(x)
+            data["top"].append(line_num * 20)
+            data["width"].append(len(word) * 10)
+            data["height"].append(15)
+            x += len(word) * 10 + 10
+    return data
+
+
+def test_match_words_boxes_the_matched_words():
+    data = word_table(["Call 555-234-5678 90210 today", "Card 4111 1111 1111 1111"])
+    matches = match_words(data)
+    assert [(m["kind"], m["words"]) for m in matches] == [("phone", [1]), ("card", [5, 6, 7, 8])]
+    assert matches[1]["box"] == [50, 20, 190, 15]
+
+
+def test_match_words_does_not_join_lines():
+    data = word_table(["Ref 415-555", "0134 end"])
+    assert match_words(data) == []
+
+
+def test_match_words_skips_unsure_words():
+    data = word_table(["Call 555-234-5678"])
+    data["conf"][1] = 10
+    assert match_words(data) == []
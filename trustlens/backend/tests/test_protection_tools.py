@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+import pytest
+
+from bench_fixtures import render_faces
+from protection_tools import ProtectionTools
+
+
+def full_frame_blur(image_rgb, detections):
+    """visible_blur as it was before the windowed rewrite: both blurs over the whole frame."""
+    original = image_rgb.copy()
+    mask = np.zeros(original.shape[:2], dtype=np.uint8)
+    h_img, w_img = original.shape[:2]
+    for det in detections:
+        if det['type'] == 'FACE':
+            x, y, w, h = det['box']
+            pad_w, pad_h = int(w * 0.1), int(h * 0.1)
+            x_pad = max(0, int(x - pad_w))
+            y_pad = max(0, int(y - pad_h))
+            w_pad = min(w_img - x_pad, int(w + (pad_w * 2)))
+            h_pad = min(h_img - y_pad, int(h + (pad_h * 2)))
+            center_x = int(x_pad + w_pad/2)
+            center_y = int(y_pad + h_pad/2)
+            cv2.ellipse(mask, (center_x, center_y), (max(1, int(w_pad/2)), max(1, int(h_pad/2))), 0, 0, 360, 255, -1)
+
+    mask_blurred = cv2.GaussianBlur(mask, (51, 51), 0)
+    heavy_blur = cv2.GaussianBlur(original, (99, 99), 30)
+    mask_stack = np.stack([mask_blurred]*3, axis=-1).astype(np.float32) / 255.0
+    result = (original.astype(np.float32) * (1.0 - mask_stack) + heavy_blur.astype(np.float32) * mask_stack)
+    result = np.clip(result, 0, 255).astype(np.uint8)
+
+    for det in detections:
+        if det['type'] != 'FACE':
+            x, y, w, h = det['box']
+            pad_w, pad_h = int(w * 0.1), int(h * 0.1)
+            x_pad = max(0, int(x - pad_w))
+            y_pad = max(0, int(y - pad_h))
+            w_pad = min(w_img - x_pad, int(w + (pad_w * 2)))
+            h_pad = min(h_img - y_pad, int(h + (pad_h * 2)))
+            cv2.rectangle(result, (x_pad, y_pad), (x_pad + w_pad, y_pad + h_pad), (0, 0, 0), -1)
+    return result
+
+
+def face(x, y, w, h):
+    return {"type": "FACE", "box": [x, y, w, h], "confidence": 0.9}
+
+
+CASES = {
+    "centre": [face(500, 300, 160, 200)],
+    "touching_corners": [face(0, 0, 120, 150), face(1100, 650, 100, 100)],
+    "tiny": [face(640, 400, 3, 4)],
+    "overlapping_with_pii": [face(300, 200, 200, 240), face(420, 260, 180, 200),
+                             {"type": "PII", "box": [900, 100, 200, 40]}],
+    "pii_only": [{"type": "BARCODE", "box": [50, 50, 120, 120]}],
+    "float_boxes": [face(250.7, 120.2, 90.5, 110.9)],
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_windowed_blur_matches_full_frame_blur(name):
+    image = render_faces((1200, 750), 2)
+    expected = full_frame_blur(image, CASES[name])
+    result = ProtectionTools().visible_blur(image, CASES[name])
+    assert np.array_equal(result, expected)
+
+
+def test_visible_blur_leaves_the_input_alone():
+    image = render_faces((640, 480), 1)
+    before = image.copy()
+    ProtectionTools().visible_blur(image, CASES["centre"])
+    assert np.array_equal(image, before)
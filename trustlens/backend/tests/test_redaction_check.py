@@ -0,0 +1,233 @@
+import uuid
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import redaction_check
+import registry
+import server
+from config import Config
+from protection_tools import ProtectionTools
+from session_store import LocalSessionStore
+from test_multipage import GREEN, RED, WHITE, MarkedContent, png, render_page
+
+MARKS = [(WHITE, 60, 60, 80, 80), (WHITE, 400, 80, 70, 70), (GREEN, 250, 300, 50, 50),
+         (RED, 40, 380, 160, 24), (RED, 420, 400, 180, 24)]
+
+
+class RecordingContent(MarkedContent):
+    """MarkedContent that keeps the shape of every image it was asked to scan."""
+
+    def __init__(self):
+        self.calls = []
+
+    def analyze_faces(self, image_rgb):
+        self.calls.append(("faces", image_rgb.shape[:2]))
+        return super().analyze_faces(image_rgb)
+
+    def scan_barcodes(self, image_rgb):
+        self.calls.append(("barcodes", image_rgb.shape[:2]))
+        return super().scan_barcodes(image_rgb)
+
+    def scan_text_pii(self, image_rgb):
+        self.calls.append(("text", image_rgb.shape[:2]))
+        return super().scan_text_pii(image_rgb)
+
+
+class NoiseTolerantContent(MarkedContent):
+    """Finds faces through the cloaking noise, as a real detector does."""
+
+    def analyze_faces(self, image_rgb):
+        mask = np.all(image_rgb >= 200, axis=-1).astype(np.uint8)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((5, 5), np.uint8))
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+        boxes = [[int(v) for v in stats[i, :4]] for i in range(1, count) if stats[i, 4] >= 50]
+        return [{"type": "FACE", "box": box, "confidence": 0.9} for box in boxes], False
+
+
+@pytest.fixture(scope="module")
+def image():
+    return render_page(MARKS, (640, 480))
+
+
+@pytest.fixture(scope="module")
+def detections(image):
+    content = MarkedContent()
+    faces, _ = content.analyze_faces(image)
+    return faces, content.scan_barcodes(image) + content.scan_text_pii(image)
+
+
+def ids(targets):
+    return [(target_id, actions) for target_id, _, actions in targets]
+
+
+# --- Targets ---
+
+def test_targets_follow_the_scan_numbering(detections):
+    faces, data = detections
+    targets = redaction_check.collect_targets(["visible_blur", "redact_data"], faces, {1}, data)
+    assert ids(targets) == [("FACE_02", ["visible_blur"]), ("BARCODE_01", ["redact_data"]),
+                            ("PII_01", ["redact_data"]), ("PII_02", ["redact_data"])]
+
+
+def test_cloaking_targets_every_face(detections):
+    faces, data = detections
+    targets = redaction_check.collect_targets(["blur_selected", "ai_cloak"], faces, {0}, data)
+    assert ids(targets) == [("FACE_01", ["visible_blur", "ai_cloak"]), ("FACE_02", ["ai_cloak"])]
+
+
+def test_document_pages_continue_the_numbering(detections):
+    faces, data = detections
+    first = {"FACE": 3, "BARCODE": 1, "PII": 0}
+    targets = redaction_check.collect_targets(["visible_blur", "redact_data"], faces, {0}, data, first)
+    assert [t[0] for t in targets] == ["FACE_04", "BARCODE_02", "PII_01", "PII_02"]
+
+
+def test_no_protective_action_no_targets(detections):
+    faces, data = detections
+    assert redaction_check.collect_targets(["secure_sign"], faces, {0, 1}, data) == []
+
+
+# --- Re-scan ---
+
+def test_untouched_targets_are_residual(image, detections):
+    faces, data = detections
+    targets = redaction_check.collect_targets(["visible_blur", "redact_data"], faces, {0, 1}, data)
+    results = redaction_check.verify_redactions(image, targets, MarkedContent())
+    assert [r["id"] for r in results if r["residual"]] == ["FACE_01", "FACE_02", "BARCODE_01", "PII_01", "PII_02"]
+    assert results[0]["found"]["box"] == faces[0]["box"]
+
+
+def test_protected_targets_are_not_residual(image, detections):
+    faces, data = detections
+    tools = ProtectionTools()
+    protected = tools.visible_blur(tools.visible_blur(image, faces), data)
+    targets = redaction_check.collect_targets(["visible_blur", "redact_data"], faces, {0, 1}, data)
+    results = redaction_check.verify_redactions(protected, targets, MarkedContent())
+    assert len(results) == 5
+    assert not any(r["residual"] for r in results)
+
+
+def test_only_the_missed_target_is_residual(image, detections):
+    faces, data = detections
+    protected = ProtectionTools().visible_blur(image, [faces[0]] + data[:2])
+    targets = redaction_check.collect_targets(["visible_blur", "redact_data"], faces, {0, 1}, data)
+    results = redaction_check.verify_redactions(protected, targets, MarkedContent())
+    assert [r["id"] for r in results if r["residual"]] == ["FACE_02", "PII_02"]
+
+
+def test_partly_legible_text_is_residual(image, detections):
+    _, data = detections
+    pii = data[1]
+    x, y, w, h = pii["box"]
+    protected = image.copy()
+    protected[y:y + h, x:x + w // 2] = 0  # the left half only
+    results = redaction_check.verify_redactions(protected, [("PII_01", pii, ["redact_data"])], MarkedContent())
+    assert results[0]["residual"]
+
+
+def test_detections_next_to_a_target_are_not_residual(image):
+    # A different face right beside the target: found in the padded crop, but not the same box
+    target = {"type": "FACE", "box": [150, 60, 60, 60]}
+    protected = render_page([(WHITE, 60, 60, 80, 80)], (640, 480))
+    results = redaction_check.verify_redactions(protected, [("FACE_01", target, ["visible_blur"])], MarkedContent())
+    assert not results[0]["residual"]
+
+
+def test_rescan_only_sees_padded_crops(image, detections):
+    faces, data = detections
+    targets = redaction_check.collect_targets(["visible_blur", "redact_data"], faces, {0, 1}, data)
+    content = RecordingContent()
+    redaction_check.verify_redactions(image, targets, content)
+
+    assert [kind for kind, _ in content.calls] == ["faces", "faces", "barcodes", "text"]
+    for (kind, (h, w)), (_, det, _) in zip(content.calls[:3], targets):
+        bx, by, bw, bh = det["box"]
+        pad = max(Config.VERIFY_MIN_PAD, int(max(bw, bh) * Config.VERIFY_PAD_RATIO))
+        assert w <= bw + 2 * pad and h <= bh + 2 * pad
+    # Both PII crops stacked into one strip, read in a single call
+    strip_h, strip_w = content.calls[3][1]
+    assert strip_h < image.shape[0] and strip_w < image.shape[1]
+
+
+def test_targets_at_the_border_are_clipped():
+    image = render_page([(WHITE, 0, 0, 50, 50)], (200, 150))
+    target = {"type": "FACE", "box": [0, 0, 50, 50]}
+    content = RecordingContent()
+    results = redaction_check.verify_redactions(image, [("FACE_01", target, ["visible_blur"])], content)
+    assert results[0]["residual"]
+    assert content.calls == [("faces", (75, 75))]
+
+
+def test_summary_headers():
+    results = [{"id": "FACE_01", "actions": ["visible_blur"], "residual": False},
+               {"id": "PII_02", "actions": ["redact_data"], "residual": True, "found": {"box": [1, 2, 3, 4], "confidence": 1.0}}]
+    headers = redaction_check.summary_headers(results)
+    assert headers == {"X-TrustLens-Verified": "2", "X-TrustLens-Residual-Count": "1", "X-TrustLens-Residual": "PII_02"}
+    assert redaction_check.summary_headers([])["X-TrustLens-Residual"] == "none"
+
+
+def test_summary_headers_stay_small_for_large_documents():
+    results = [{"id": f"PII_{i + 1:02d}", "actions": ["redact_data"], "residual": True, "page": i // 20,
+                "found": {"box": [i, i, 40, 12], "confidence": 1.0}} for i in range(4000)]
+    headers = redaction_check.summary_headers(results, max_ids=3)
+    assert headers["X-TrustLens-Residual"] == "PII_01,PII_02,PII_03,+3997 more"
+    assert headers["X-TrustLens-Residual-Count"] == "4000"
+    assert sum(len(k) + len(v) for k, v in redaction_check.summary_headers(results).items()) < 1024
+
+
+# --- /api/protect ---
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, image):
+    store = LocalSessionStore(str(tmp_path))
+    monkeypatch.setitem(registry._instances, "sessions", store)
+    monkeypatch.setitem(registry._instances, "content", NoiseTolerantContent())
+    session_id = str(uuid.uuid4())
+    content = MarkedContent()
+    faces, _ = content.analyze_faces(image)
+    store.put_image(session_id, png(image))
+    store.put_detections(session_id, {"faces": faces, "is_child": False, "barcodes": content.scan_barcodes(image),
+                                      "pii": content.scan_text_pii(image), "size": [640, 480]})
+    return TestClient(server.app), session_id
+
+
+def protect(client, session_id, **form):
+    return client.post("/api/protect", data={"session_id": session_id, **form})
+
+
+def test_protect_reports_what_is_still_detectable(app):
+    client, session_id = app
+    response = protect(client, session_id, action="visible_blur,ai_cloak", indices="0")
+    assert response.status_code == 200, response.text
+    # Cloaking keeps FACE_02 recognisable here: only the blurred face is gone
+    assert response.headers["X-TrustLens-Verified"] == "2"
+    assert response.headers["X-TrustLens-Residual"] == "FACE_02"
+    url = response.headers["X-TrustLens-Verification-Url"]
+    assert url == f"/api/verification/{session_id}"
+    details = client.get(url).json()
+    assert details["residual"] == ["FACE_02"]
+    assert [(r["id"], r["actions"]) for r in details["results"]] == [("FACE_01", ["visible_blur", "ai_cloak"]),
+                                                                      ("FACE_02", ["ai_cloak"])]
+    assert details["results"][1]["found"]["box"] == [400, 80, 70, 70]
+
+
+def test_verification_details_need_a_checked_session(app):
+    client, session_id = app
+    assert client.get(f"/api/verification/{session_id}").status_code == 404
+    assert client.get("/api/verification/bad.id").status_code == 400
+
+
+def test_protect_verification_can_be_turned_off(app, monkeypatch):
+    client, session_id = app
+    response = protect(client, session_id, action="visible_blur,redact_data", indices="0,1", verify="false")
+    assert response.status_code == 200
+    assert "X-TrustLens-Residual" not in response.headers
+
+    monkeypatch.setattr(Config, "VERIFY_REDACTIONS", False)
+    response = protect(client, session_id, action="visible_blur,redact_data", indices="0,1")
+    assert "X-TrustLens-Residual" not in response.headers
+    response = protect(client, session_id, action="visible_blur,redact_data", indices="0,1", verify="true")
+    assert response.headers["X-TrustLens-Residual"] == "none"
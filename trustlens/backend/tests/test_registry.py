@@ -0,0 +1,80 @@
+import threading
+
+import instrumentation
+import registry
+
+
+def registry_lookups():
+    counters = instrumentation._counters
+    return {result: counters.get(("trustlens_cache_requests_total", (("cache", "registry"), ("result", result))), 0.0)
+            for result in ("hit", "miss")}
+
+
+def test_miss_on_build_hit_on_reuse(monkeypatch):
+    monkeypatch.setitem(registry.ANALYZERS, "test_engine", ("collections", "Counter"))
+    monkeypatch.delitem(registry._instances, "test_engine", raising=False)
+    before = registry_lookups()
+    first = registry.get("test_engine")
+    after_build = registry_lookups()
+    assert after_build["miss"] - before["miss"] == 1
+    assert after_build["hit"] == before["hit"]
+
+    assert registry.get("test_engine") is first
+    assert registry.get("test_engine") is first
+    after_reuse = registry_lookups()
+    assert after_reuse["miss"] == after_build["miss"]
+    assert after_reuse["hit"] - after_build["hit"] == 2
+    registry._instances.pop("test_engine")
+
+
+BUILT = []
+
+
+class CountedEngine:
+    def __init__(self):
+        BUILT.append(self)
+
+
+def test_concurrent_first_lookups_build_once(monkeypatch):
+    monkeypatch.setitem(registry.ANALYZERS, "test_engine", (__name__, "CountedEngine"))
+    monkeypatch.delitem(registry._instances, "test_engine", raising=False)
+    BUILT.clear()
+    before = registry_lookups()
+    threads = [threading.Thread(target=registry.get, args=("test_engine",)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    after = registry_lookups()
+    assert len(BUILT) == 1
+    assert after["miss"] - before["miss"] == 1
+    assert after["hit"] - before["hit"] == 7
+    registry._instances.pop("test_engine")
+
+
+def test_unknown_engine_is_not_counted():
+    before = registry_lookups()
+    try:
+        registry.get("no_such_engine")
+    except KeyError:
+        pass
+    assert registry_lookups() == before
+
+
+def test_default_warm_up_leaves_stateful_engines_alone(monkeypatch):
+    built = []
+
+    class Engine:
+        def warm_up(self):
+            pass
+
+    def get(name):
+        built.append(name)
+        return Engine()
+
+    monkeypatch.setattr(registry, "get", get)
+    monkeypatch.setattr(registry, "_warmed", {})
+    timings = registry.warm_up()
+    assert built == list(registry.ENGINES)
+    assert set(timings) == set(registry.ENGINES)
+    assert not {"phash", "brush", "sessions"} & set(built)
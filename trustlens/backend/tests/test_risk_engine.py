@@ -0,0 +1,37 @@
+import json
+
+from risk_engine import append_records
+
+
+def read(path):
+    with open(path) as f:
+        return [json.loads(line)["n"] for line in f]
+
+
+def test_append_without_limit_never_rotates(tmp_path):
+    path = str(tmp_path / "records.jsonl")
+    for n in range(5):
+        append_records(path, [{"n": n}])
+    assert read(path) == [0, 1, 2, 3, 4]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["records.jsonl"]
+
+
+def test_rotation_keeps_only_the_configured_backups(tmp_path):
+    path = str(tmp_path / "records.jsonl")
+    for n in range(6):
+        # Each record is ~10 bytes, so every second append rotates
+        append_records(path, [{"n": n}], max_bytes=15, backups=2)
+    assert read(path) == [4, 5]
+    assert read(path + ".1") == [2, 3]
+    assert read(path + ".2") == [0, 1]
+    for n in range(6, 8):
+        append_records(path, [{"n": n}], max_bytes=15, backups=2)
+    assert read(path + ".2") == [2, 3]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["records.jsonl", "records.jsonl.1", "records.jsonl.2"]
+
+
+def test_rotation_without_backups_deletes(tmp_path):
+    path = str(tmp_path / "records.jsonl")
+    for n in range(3):
+        append_records(path, [{"n": n}], max_bytes=1, backups=0)
+    assert read(path) == [2]
@@ -0,0 +1,83 @@
+import io
+import uuid
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import registry
+import server
+from bench_fixtures import render_faces
+from session_store import LocalSessionStore
+
+FACE = {"type": "FACE", "box": [200, 150, 120, 150], "confidence": 0.9}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    store = LocalSessionStore(str(tmp_path))
+    monkeypatch.setitem(registry._instances, "sessions", store)
+    return TestClient(server.app), store
+
+
+def image_session(store):
+    session_id = str(uuid.uuid4())
+    image = render_faces((640, 480), 1)
+    ok, png = cv2.imencode(".png", cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+    store.put_image(session_id, png.tobytes())
+    store.put_detections(session_id, {"faces": [FACE], "is_child": False, "barcodes": [], "pii": [], "size": [640, 480]})
+    return session_id
+
+
+def document_session(store):
+    session_id = str(uuid.uuid4())
+    pages = [Image.fromarray(render_faces((320, 240), 1)) for _ in range(2)]
+    buf = io.BytesIO()
+    pages[0].save(buf, format="TIFF", save_all=True, append_images=pages[1:])
+    store.put_image(session_id, buf.getvalue())
+    page = {"faces": [FACE], "is_child": False, "barcodes": [], "pii": [], "size": [320, 240]}
+    store.put_detections(session_id, {"pages": [page, page]})
+    return session_id
+
+
+def protect(client, session_id, **form):
+    return client.post("/api/protect", data={"action": "visible_blur", "session_id": session_id,
+                                             "verify": "false", **form})
+
+
+@pytest.mark.parametrize("form", [
+    {"png_level": "12"},
+    {"png_level": "-1"},
+    {"png_strategy": "bogus"},
+    {"indices": "a"},
+    {"indices": "0,x"},
+    {"indices": "-1"},
+])
+def test_bad_options_are_client_errors(app, form):
+    client, store = app
+    response = protect(client, image_session(store), **form)
+    assert response.status_code == 400, response.text
+
+
+@pytest.mark.parametrize("form", [{"indices": "a"}, {"indices": "1,,b"}])
+def test_bad_indices_on_a_document_are_client_errors(app, form):
+    client, store = app
+    response = protect(client, document_session(store), **form)
+    assert response.status_code == 400, response.text
+
+
+def test_valid_options_still_encode(app):
+    client, store = app
+    response = protect(client, image_session(store), indices="0", png_level="1", png_strategy="rle")
+    assert response.status_code == 200, response.text
+    assert response.headers["X-TrustLens-Encoding"] == "png"
+    assert response.content[:8] == b"\x89PNG\r\n\x1a\n"
+
+
+def test_valid_indices_on_a_document(app):
+    client, store = app
+    response = protect(client, document_session(store), indices="0, 1")
+    assert response.status_code == 200, response.text
+    assert response.headers["X-TrustLens-Pages"] == "2"
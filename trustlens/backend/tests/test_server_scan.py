@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import registry
+import server
+from config import Config
+
+
+class SlowMetadata:
+    def get_metadata_risk_from_bytes(self, data):
+        time.sleep(0.3)
+        return {"gps_found": False}
+
+
+@pytest.fixture
+def scan_tasks(monkeypatch):
+    """The app with a slow EXIF audit; yields (client, tasks created by the request)."""
+    monkeypatch.setitem(registry._instances, "metadata", SlowMetadata())
+    tasks = []
+    create_task = asyncio.create_task
+
+    def tracking(coro, **kwargs):
+        task = create_task(coro, **kwargs)
+        tasks.append(task)
+        return task
+
+    monkeypatch.setattr(server.asyncio, "create_task", tracking)
+    with TestClient(server.app) as client:
+        tasks.clear()  # lifespan tasks
+        yield client, tasks
+
+
+def settled(tasks, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not all(t.done() for t in tasks) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return tasks
+
+
+def test_invalid_upload_cancels_the_metadata_audit(scan_tasks):
+    client, tasks = scan_tasks
+    response = client.post("/api/scan", files={"file": ("x.jpg", b"not an image", "image/jpeg")})
+    assert response.status_code == 400
+    assert len(tasks) == 1
+    assert settled(tasks)[0].cancelled()
+
+
+def test_oversized_upload_cancels_the_metadata_audit(scan_tasks, monkeypatch):
+    client, tasks = scan_tasks
+    monkeypatch.setattr(Config, "LOAD_MAX_PIXELS", 100)
+    ok, png = cv2.imencode(".png", np.zeros((64, 64, 3), dtype=np.uint8))
+    response = client.post("/api/scan", files={"file": ("x.png", png.tobytes(), "image/png")})
+    assert response.status_code == 413
+    assert len(tasks) == 1
+    assert settled(tasks)[0].cancelled()
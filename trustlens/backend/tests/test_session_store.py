@@ -0,0 +1,224 @@
+import asyncio
+import os
+import socketserver
+import threading
+import time
+import uuid
+
+import pytest
+
+import registry
+import server
+from config import Config
+from session_store import LocalSessionStore, RedisSessionStore, SessionStore, SharedDirSessionStore
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    """
+    In-process stand-in for a Redis server: SET (with EX), GET, DEL, SELECT
+    and AUTH over RESP2. Expiry follows `self.now`, which tests can move.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.data = {}
+        self.clock = 0.0
+        self.connections = []
+
+    def now(self):
+        return self.clock
+
+    def alive(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and self.now() >= expires:
+            del self.data[key]
+            return None
+        return value
+
+    def drop_connections(self):
+        for conn in self.connections:
+            conn.close()
+        self.connections.clear()
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line[:1] == b"*"
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, str):
+            self.wfile.write(b"+" + value.encode() + b"\r\n")
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    def handle(self):
+        server = self.server
+        server.connections.append(self.connection)
+        while True:
+            try:
+                args = self.read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            name = args[0].upper()
+            if name == b"SET":
+                expires = None
+                if len(args) == 5 and args[3].upper() == b"EX":
+                    expires = server.now() + int(args[4])
+                server.data[args[1]] = (args[2], expires)
+                self.reply("OK")
+            elif name == b"GET":
+                self.reply(server.alive(args[1]))
+            elif name == b"DEL":
+                self.reply(sum(server.data.pop(k, None) is not None for k in args[1:]))
+            elif name in (b"SELECT", b"AUTH"):
+                self.reply("OK")
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def resp_server():
+    server = RespServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis_store(resp_server):
+    host, port = resp_server.server_address
+    return RedisSessionStore(f"redis://{host}:{port}/1")
+
+
+def test_redis_set_get(redis_store):
+    session_id = str(uuid.uuid4())
+    redis_store.put_image(session_id, b"\x00\xffimage\r\nbytes")
+    redis_store.put_detections(session_id, {"faces": [{"box": [1, 2, 3, 4]}], "size": [10, 10]})
+    assert redis_store.get_image(session_id) == b"\x00\xffimage\r\nbytes"
+    assert redis_store.get_detections(session_id) == {"faces": [{"box": [1, 2, 3, 4]}], "size": [10, 10]}
+    assert redis_store.get_image(str(uuid.uuid4())) is None
+    redis_store.put_verification(session_id, [{"id": "FACE_01", "residual": False}])
+    assert redis_store.get_verification(session_id) == [{"id": "FACE_01", "residual": False}]
+
+
+def test_redis_keys_expire_after_ttl(redis_store, resp_server):
+    session_id = str(uuid.uuid4())
+    redis_store.put_image(session_id, b"image")
+    resp_server.clock += Config.SESSION_TTL - 1
+    assert redis_store.get_image(session_id) == b"image"
+    resp_server.clock += 1
+    assert redis_store.get_image(session_id) is None
+
+
+def test_redis_delete(redis_store):
+    session_id = str(uuid.uuid4())
+    redis_store.put_image(session_id, b"image")
+    redis_store.put_detections(session_id, {})
+    redis_store.delete(session_id)
+    assert redis_store.get_image(session_id) is None
+    assert redis_store.get_detections(session_id) is None
+
+
+def test_redis_reconnects_after_a_dropped_connection(redis_store, resp_server):
+    session_id = str(uuid.uuid4())
+    redis_store.put_image(session_id, b"image")
+    resp_server.drop_connections()
+    assert redis_store.get_image(session_id) == b"image"
+
+
+def test_redis_rejects_bad_session_ids(redis_store):
+    with pytest.raises(ValueError):
+        redis_store.get_image("../etc/passwd")
+
+
+def age(store, session_id, seconds):
+    directory = os.path.dirname(store._path(session_id, ".jpg"))
+    stamp = time.time() - seconds
+    for name in os.listdir(directory):
+        os.utime(os.path.join(directory, name), (stamp, stamp))
+
+
+def test_shared_dir_purge_removes_only_expired_sessions(tmp_path):
+    store = SharedDirSessionStore(str(tmp_path))
+    old, fresh = str(uuid.uuid4()), str(uuid.uuid4())
+    for session_id in (old, fresh):
+        store.put_image(session_id, b"image")
+        store.put_detections(session_id, {"faces": []})
+        store.put_verification(session_id, [{"id": "FACE_01", "residual": False}])
+    age(store, old, Config.SESSION_TTL + 10)
+
+    assert store.get_image(old) is None  # already hidden from readers
+    assert store.purge_expired() == 1
+    assert not os.path.exists(os.path.dirname(store._path(old, ".jpg")))
+    assert store.get_image(fresh) == b"image"
+    assert store.purge_expired() == 0
+
+
+def test_local_purge_removes_only_expired_sessions(tmp_path):
+    store = LocalSessionStore(str(tmp_path))
+    old, fresh = str(uuid.uuid4()), str(uuid.uuid4())
+    for session_id in (old, fresh):
+        store.put_image(session_id, b"image")
+        store.put_detections(session_id, {"faces": []})
+        store.put_verification(session_id, [])
+    stamp = time.time() - Config.SESSION_TTL - 10
+    for ext in (".jpg", ".json", ".verify"):
+        os.utime(store._path(old, ext), (stamp, stamp))
+    (tmp_path / "notes.txt").write_text("not a session")
+
+    assert store.get_image(old) is None
+    assert store.get_detections(old) is None
+    assert store.purge_expired() == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{fresh}.jpg", f"{fresh}.json", f"{fresh}.verify", "notes.txt"])
+    assert store.get_image(fresh) == b"image"
+    assert store.purge_expired() == 0
+
+
+def test_incomplete_backends_fail_when_built():
+    class Partial(SessionStore):
+        def put_image(self, session_id, data):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_server_purges_sessions_periodically(monkeypatch):
+    class Store:
+        calls = 0
+
+        def purge_expired(self):
+            Store.calls += 1
+            return 0
+
+    monkeypatch.setitem(registry._instances, "sessions", Store())
+    monkeypatch.setattr(Config, "SESSION_PURGE_INTERVAL", 0.01)
+
+    async def run():
+        task = asyncio.create_task(server.purge_sessions_loop())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert Store.calls >= 2
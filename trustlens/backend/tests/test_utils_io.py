@@ -0,0 +1,173 @@
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import utils_io
+from config import Config
+
+MODES = ("RGB", "L", "RGBA")
+
+
+def pixels(width, height, mode="RGB"):
+    """Noise plus gradients, so every row, column and channel differs."""
+    rng = np.random.default_rng(width * height)
+    noise = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+    ramp = (np.arange(width)[None, :] + np.arange(height)[:, None]) % 256
+    noise[..., 0] = (noise[..., 0] // 2 + ramp // 2).astype(np.uint8)
+    image = Image.fromarray(noise, "RGBA")
+    return image if mode == "RGBA" else image.convert(mode)
+
+
+def raw_tiff(tmp_path, width, height, mode="RGB", name="raw.tif"):
+    path = str(tmp_path / name)
+    pixels(width, height, mode).save(path, compression="raw")
+    return path
+
+
+def reference(path):
+    """What the plain decoder gives for the whole file, in RGB."""
+    return cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_probe_maps_raw_tiffs_only(tmp_path, mode):
+    path = raw_tiff(tmp_path, 120, 80, mode)
+    info = utils_io.probe_image(path)
+    assert (info["width"], info["height"], info["format"]) == (120, 80, "TIFF")
+    assert info["raw_tiles"]
+
+    compressed = str(tmp_path / "lzw.tif")
+    pixels(120, 80, mode).save(compressed, compression="tiff_lzw")
+    assert utils_io.probe_image(compressed)["raw_tiles"] is None
+    # In-memory uploads cannot be mapped from disk
+    with open(path, "rb") as f:
+        assert utils_io.probe_image(f.read())["raw_tiles"] is None
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_full_load_matches_imread(tmp_path, mode):
+    path = raw_tiff(tmp_path, 333, 217, mode)
+    assert np.array_equal(utils_io.load_image_safe(path), reference(path))
+
+
+@pytest.mark.parametrize("box", [
+    (10, 20, 50, 40),          # inside
+    (0, 0, 333, 217),          # the whole image
+    (300, 200, 100, 100),      # runs past the bottom-right corner
+    (-15, -5, 40, 30),         # starts before the top-left corner
+    (12.4, 7.6, 20.5, 9.5),    # float box, rounded
+])
+@pytest.mark.parametrize("mode", MODES)
+def test_read_region_matches_an_imread_crop(tmp_path, mode, box):
+    path = raw_tiff(tmp_path, 333, 217, mode)
+    x, y, w, h = (int(round(v)) for v in box)
+    expected = reference(path)[max(0, y):y + h, max(0, x):x + w]
+    assert np.array_equal(utils_io.read_region(path, box), expected)
+
+
+def test_read_region_outside_the_image_is_empty(tmp_path):
+    path = raw_tiff(tmp_path, 64, 64)
+    assert utils_io.read_region(path, (100, 100, 10, 10)).shape == (0, 0, 3)
+
+
+def test_read_region_at_a_scale(tmp_path):
+    path = raw_tiff(tmp_path, 333, 217)
+    crop = reference(path)[40:140, 20:220]
+    expected = cv2.resize(crop, (100, 50), interpolation=cv2.INTER_AREA)
+    assert np.array_equal(utils_io.read_region(path, (20, 40, 200, 100), scale=0.5), expected)
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_banded_downscale_matches_a_whole_image_resize(tmp_path, mode):
+    # 1024 -> 256 is an exact factor of 4, read in several bands of rows
+    path = raw_tiff(tmp_path, 1024, 640, mode)
+    expected = cv2.resize(reference(path), (256, 160), interpolation=cv2.INTER_AREA)
+    assert np.array_equal(utils_io.load_image_safe(path, max_side=256), expected)
+
+
+def test_pixel_budget_downscale_stays_close_to_a_whole_image_resize(tmp_path):
+    # Smooth content: on noise a two-step resize and a single one legitimately differ
+    path = str(tmp_path / "smooth.tif")
+    smooth = cv2.GaussianBlur(np.asarray(pixels(1000, 700)), (31, 31), 8)
+    Image.fromarray(smooth).save(path, compression="raw")
+    budget = 100_000
+    result = utils_io.load_image_safe(path, pixel_budget=budget)
+    assert result.shape[0] * result.shape[1] <= budget
+    expected = cv2.resize(reference(path), result.shape[1::-1], interpolation=cv2.INTER_AREA)
+    # Box filter then a small resize instead of one resize: off by rounding only
+    assert np.abs(result.astype(int) - expected.astype(int)).max() <= 2
+
+
+def test_mapped_raster_joins_separate_strips(tmp_path):
+    """Strips at arbitrary offsets (with gaps between them) read back as one image."""
+    image = np.asarray(pixels(90, 70))
+    path = str(tmp_path / "strips.bin")
+    tiles, offset = [], 13
+    with open(path, "wb") as f:
+        f.write(b"\0" * offset)
+        for y0, y1 in ((0, 25), (25, 50), (50, 70)):
+            tiles.append((0, y0, 90, y1, offset, 3, False))
+            data = image[y0:y1].tobytes() + b"\xff" * 7
+            f.write(data)
+            offset += len(data)
+    raster = utils_io.MappedRaster(path, tiles, 90, 70)
+    assert np.array_equal(raster.read(0, 0, 90, 70), image)
+    assert np.array_equal(raster.read(30, 20, 60, 55), image[20:55, 30:60])
+
+
+def test_rgba_alpha_is_premultiplied_like_imread(tmp_path):
+    """Raw and compressed RGBA files must give the same pixels."""
+    raw = raw_tiff(tmp_path, 64, 48, "RGBA")
+    compressed = str(tmp_path / "lzw.tif")
+    pixels(64, 48, "RGBA").save(compressed, compression="tiff_lzw")
+    assert utils_io.probe_image(raw)["raw_tiles"][0][6] is True
+    assert np.array_equal(utils_io.load_image_safe(raw), utils_io.load_image_safe(compressed))
+
+
+def test_header_check_refuses_before_decoding(tmp_path, monkeypatch):
+    path = raw_tiff(tmp_path, 200, 100)
+    monkeypatch.setattr(Config, "LOAD_MAX_PIXELS", 200 * 100 - 1)
+    with pytest.raises(utils_io.ImageTooLarge):
+        utils_io.load_image_safe(path)
+
+
+def large_png(tmp_path, width=1000, height=700):
+    path = str(tmp_path / "large.png")
+    pixels(width, height).save(path)
+    return path
+
+
+def test_png_above_the_budget_is_refused_before_decoding(tmp_path, monkeypatch):
+    path = large_png(tmp_path)
+
+    def decode(*args):
+        raise AssertionError("decoded a PNG above the pixel budget")
+
+    monkeypatch.setattr(cv2, "imread", decode)
+    monkeypatch.setattr(cv2, "imdecode", decode)
+    with pytest.raises(utils_io.ImageTooLarge):
+        utils_io.load_image_safe(path, pixel_budget=100_000)
+    with open(path, "rb") as f:
+        with pytest.raises(utils_io.ImageTooLarge):
+            utils_io.decode_image_bytes(f.read(), max_side=256, pixel_budget=100_000)
+    monkeypatch.setattr(Config, "LOAD_PIXEL_BUDGET", 100_000)
+    with pytest.raises(utils_io.ImageTooLarge):
+        utils_io.read_region(path, (0, 0, 50, 50))
+
+
+def test_png_within_the_budget_is_downscaled(tmp_path):
+    path = large_png(tmp_path)
+    expected = cv2.resize(reference(path), (256, 179), interpolation=cv2.INTER_AREA)
+    assert np.array_equal(utils_io.load_image_safe(path, max_side=256, pixel_budget=700_000), expected)
+    assert np.array_equal(utils_io.read_region(path, (10, 20, 30, 40)), reference(path)[20:60, 10:40])
+
+
+def test_jpeg_above_the_budget_is_decoded_reduced(tmp_path):
+    path = str(tmp_path / "large.jpg")
+    pixels(1000, 700).save(path, quality=95)
+    result = utils_io.load_image_safe(path, pixel_budget=100_000)
+    assert result.shape[0] * result.shape[1] <= 100_000
+    # An eighth of the file is still over four times this budget
+    with pytest.raises(utils_io.ImageTooLarge):
+        utils_io.load_image_safe(path, pixel_budget=2_000)
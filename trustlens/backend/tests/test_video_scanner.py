@@ -0,0 +1,49 @@
+import itertools
+import threading
+
+import pytest
+
+from video_scanner import _threaded
+
+
+def counting(closed):
+    try:
+        for i in itertools.count():
+            yield i
+    finally:
+        closed.set()
+
+
+def test_items_arrive_in_order():
+    assert list(_threaded(iter(range(50)), maxsize=4)) == list(range(50))
+
+
+def test_consumer_stopping_early_releases_the_producer():
+    closed = threading.Event()
+    before = threading.active_count()
+    items = _threaded(counting(closed), maxsize=2)
+    assert [next(items) for _ in range(3)] == [0, 1, 2]
+    items.close()
+    # The producer was blocked on a full queue: it must have stopped and closed its source
+    assert closed.is_set()
+    assert threading.active_count() == before
+
+
+def test_consumer_error_stops_the_producer():
+    closed = threading.Event()
+    with pytest.raises(RuntimeError):
+        for i in _threaded(counting(closed), maxsize=2):
+            if i == 5:
+                raise RuntimeError("writer failed")
+    assert closed.is_set()
+
+
+def test_producer_error_reaches_the_consumer():
+    def broken():
+        yield 1
+        raise ValueError("bad frame")
+
+    items = _threaded(broken(), maxsize=2)
+    assert next(items) == 1
+    with pytest.raises(ValueError):
+        next(items)
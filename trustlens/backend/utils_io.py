@@ -1,15 +1,204 @@
 import cv2
+import io
+import math
 import numpy as np
 import os
+import warnings
 from PIL import Image
+from config import Config
 
-def load_image_safe(path: str) -> np.ndarray:
+# Largest libjpeg DCT scaling OpenCV exposes, best first
+_JPEG_REDUCTIONS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+# Uncompressed pixel layouts we can map straight from disk: rawmode -> channels
+_RAW_CHANNELS = {"L": 1, "RGB": 3, "RGBA": 4, "RGBX": 4}
+# Unassociated alpha: libtiff (cv2.imread) multiplies the colour by it
+_PREMULTIPLIED = {"RGBA"}
+
+# Rows per band when downscaling a mapped image (times the reduction factor)
+_BAND_ROWS = 64
+
+class ImageTooLarge(ValueError):
+    """The header announces more pixels than Config.LOAD_MAX_PIXELS, or than we can decode within the pixel budget."""
+
+def probe_image(source) -> dict:
+    """
+    Reads only the header of an image (path or bytes) and returns its
+    width, height, format, mode and, for uncompressed files, the strip
+    layout. No pixel data is decoded.
+    """
+    fp = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    with warnings.catch_warnings():
+        # Our own LOAD_MAX_PIXELS check below replaces Pillow's bomb warning
+        warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+        try:
+            img = Image.open(fp)
+        except Image.DecompressionBombError as e:
+            raise ImageTooLarge(str(e))
+        except Exception:
+            raise ValueError("Error: This file is not a valid image.")
+    with img:
+        width, height = img.size
+        info = {
+            "width": width,
+            "height": height,
+            "pixels": width * height,
+            "format": img.format,
+            "mode": img.mode,
+            "frames": getattr(img, "n_frames", 1),
+            "raw_tiles": _raw_tiles(img) if isinstance(fp, str) else None,
+        }
+    if info["pixels"] > Config.LOAD_MAX_PIXELS:
+        raise ImageTooLarge(f"Image is {width}x{height}, above the {Config.LOAD_MAX_PIXELS} pixel limit.")
+    return info
+
+def _raw_tiles(img):
+    """
+    Strips / tiles of an uncompressed image as
+    (x0, y0, x1, y1, offset, channels, premultiply), or None if any part of the file is compressed or in a layout we don't map.
+    """
+    tiles = []
+    for name, extents, offset, args in img.tile:
+        if name != "raw" or not args:
+            return None
+        rawmode = args[0] if isinstance(args, tuple) else args
+        stride = args[1] if isinstance(args, tuple) and len(args) > 1 else 0
+        orientation = args[2] if isinstance(args, tuple) and len(args) > 2 else 1
+        if rawmode not in _RAW_CHANNELS or orientation != 1:
+            return None
+        x0, y0, x1, y1 = extents
+        channels = _RAW_CHANNELS[rawmode]
+        if stride and stride != (x1 - x0) * channels:
+            return None
+        tiles.append((x0, y0, x1, y1, offset, channels, rawmode in _PREMULTIPLIED))
+    return tiles or None
+
+def plan_scale(width, height, max_side=None, pixel_budget=None) -> float:
+    """The largest scale (<= 1) that fits both the side cap and the pixel budget."""
+    pixel_budget = pixel_budget or Config.LOAD_PIXEL_BUDGET
+    scale = 1.0
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+    if width * height * scale * scale > pixel_budget:
+        scale = math.sqrt(pixel_budget / (width * height))
+        # Sides are rounded when resizing, step down until the result really fits
+        while round(width * scale) * round(height * scale) > pixel_budget:
+            scale -= 1 / max(width, height)
+    return scale
+
+def _to_rgb(pixels, premultiply=False):
+    if pixels.ndim == 2 or pixels.shape[2] == 1:
+        return cv2.cvtColor(np.ascontiguousarray(pixels), cv2.COLOR_GRAY2RGB)
+    if premultiply:
+        # Same rounding as libtiff, so mapped and decoded files give the same pixels
+        alpha = pixels[:, :, 3:].astype(np.uint16)
+        return ((pixels[:, :, :3] * alpha + 127) // 255).astype(np.uint8)
+    return np.ascontiguousarray(pixels[:, :, :3])
+
+def _resize(image, scale):
+    h, w = image.shape[:2]
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    if size == (w, h):
+        return image
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+class MappedRaster:
+    """
+    Reads rectangles of an uncompressed image straight from the file with
+    np.memmap. Only the strips a read touches are paged in, and nothing
+    stays resident after the read returns.
+    """
+    def __init__(self, path, tiles, width, height):
+        self.path = path
+        self.tiles = tiles
+        self.width = width
+        self.height = height
+
+    def read(self, x0, y0, x1, y1) -> np.ndarray:
+        out = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        for tx0, ty0, tx1, ty1, offset, channels, premultiply in self.tiles:
+            ix0, iy0, ix1, iy1 = max(x0, tx0), max(y0, ty0), min(x1, tx1), min(y1, ty1)
+            if ix0 >= ix1 or iy0 >= iy1:
+                continue
+            tile = np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset,
+                             shape=(ty1 - ty0, tx1 - tx0, channels))
+            region = tile[iy0 - ty0:iy1 - ty0, ix0 - tx0:ix1 - tx0]
+            out[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0] = _to_rgb(region, premultiply)
+            del tile
+        return out
+
+    def downscale(self, scale) -> np.ndarray:
+        """Box-averages the image band by band, so only a few rows are in memory at once."""
+        factor = max(1, int(1 / scale))
+        if factor == 1:
+            return _resize(self.read(0, 0, self.width, self.height), scale)
+        out_w, out_h = self.width // factor, self.height // factor
+        small = np.empty((out_h, out_w, 3), dtype=np.uint8)
+        band = _BAND_ROWS * factor
+        for y in range(0, out_h * factor, band):
+            rows = self.read(0, y, out_w * factor, min(y + band, out_h * factor))
+            # INTER_AREA with an integer factor is an exact box filter, so bands join seamlessly
+            out_rows = rows.shape[0] // factor
+            small[y // factor:y // factor + out_rows] = cv2.resize(rows, (out_w, out_rows), interpolation=cv2.INTER_AREA)
+        # The integer box filter lands just above the target, finish with a small resize
+        return _resize(small, scale * factor)
+
+def _reduction(info, scale):
+    """
+    How much the codec shrinks the file while decoding it at `scale`:
+    libjpeg can skip DCT coefficients (1/2, 1/4, 1/8). PNG, WebP and
+    compressed TIFF are always decoded whole, at factor 1.
+    """
+    if scale < 1 and info["format"] == "JPEG":
+        for factor, _ in _JPEG_REDUCTIONS:
+            if factor * scale <= 1:
+                return factor
+    return 1
+
+def _decode_whole(source, info, factor, pixel_budget):
+    """
+    Decodes the file in one go (reduced by `factor`), in BGR. Refuses it
+    first if that would hold more than `pixel_budget` pixels at once
+    (JPEGs: more than the nearest libjpeg scale above it).
+    """
+    decoded = -(-info["width"] // factor) * -(-info["height"] // factor)
+    # libjpeg scales by halves: the step just above the target holds at most 4x its pixels
+    limit = pixel_budget * 4 if info["format"] == "JPEG" else pixel_budget
+    if decoded > limit:
+        raise ImageTooLarge(f"{info['format']} image is {info['width']}x{info['height']}: it can't be decoded "
+                            f"within the {pixel_budget} pixel budget.")
+    flag = dict(_JPEG_REDUCTIONS).get(factor, cv2.IMREAD_COLOR)
+    if isinstance(source, str):
+        image_bgr = cv2.imread(source, flag)
+    else:
+        image_bgr = cv2.imdecode(np.frombuffer(source, np.uint8), flag)
+    if image_bgr is None:
+        raise ValueError("Error: This file is not a valid image.")
+    return image_bgr
+
+def _decode(source, info, max_side, pixel_budget):
+    pixel_budget = pixel_budget or Config.LOAD_PIXEL_BUDGET
+    scale = plan_scale(info["width"], info["height"], max_side, pixel_budget)
+
+    if info["raw_tiles"]:
+        raster = MappedRaster(source, info["raw_tiles"], info["width"], info["height"])
+        return raster.downscale(scale) if scale < 1 else raster.read(0, 0, info["width"], info["height"])
+
+    factor = _reduction(info, scale)
+    image_bgr = _decode_whole(source, info, factor, pixel_budget)
+    return cv2.cvtColor(_resize(image_bgr, scale * factor), cv2.COLOR_BGR2RGB)
+
+def load_image_safe(path: str, max_side=None, pixel_budget=None) -> np.ndarray:
     """
     Loads an image from the computer disk into memory.
-    
+
     Args:
         path (str): The location of the file (e.g., "C:/photos/me.jpg").
-        
+        max_side (int): Optional cap on the longest side, in pixels.
+        pixel_budget (int): Most pixels to hold in memory (default Config.LOAD_PIXEL_BUDGET).
+            Bigger JPEGs and uncompressed TIFFs come back downscaled; other
+            formats can't be decoded at a reduced size and raise ImageTooLarge.
+
     Returns:
         np.ndarray: A matrix of numbers representing the pixels (RGB format).
     """
@@ -17,23 +206,51 @@ def load_image_safe(path: str) -> np.ndarray:
     if not os.path.exists(path):
         raise FileNotFoundError(f"Error: The file at {path} was not found.")
 
-    # 2. Read the image using OpenCV.
-    # OpenCV reads images in 'BGR' (Blue-Green-Red) order by default.
-    image_bgr = cv2.imread(path)
+    # 2. Read the size from the header before decoding anything.
+    # Images above Config.LOAD_MAX_PIXELS are refused here.
+    info = probe_image(path)
 
-    if image_bgr is None:
-        raise ValueError("Error: This file is not a valid image.")
+    # 3. Decode at the smallest resolution that fits the budget: JPEGs are
+    # reduced inside the codec, uncompressed TIFFs are read strip by strip,
+    # anything else above the budget is refused.
+    return _decode(path, info, max_side, pixel_budget)
+
+def decode_image_bytes(data: bytes, max_side=None, pixel_budget=None, info=None) -> np.ndarray:
+    """Same as load_image_safe, for an upload held in memory. Returns RGB."""
+    info = info or probe_image(data)
+    return _decode(data, info, max_side, pixel_budget)
+
+def read_region(path: str, box, scale: float = 1.0) -> np.ndarray:
+    """
+    Returns the (x, y, w, h) rectangle of an image at native resolution
+    (or `scale` of it), in RGB. Uncompressed files only read the strips
+    the box covers. Other formats are decoded whole and then cropped
+    (JPEGs at a reduced size when scale allows it), so they are held to
+    Config.LOAD_PIXEL_BUDGET like a full load.
+    """
+    info = probe_image(path)
+    x, y, w, h = (int(round(v)) for v in box)
+    x0, y0, x1, y1 = max(0, x), max(0, y), x + w, y + h
+
+    if info["raw_tiles"]:
+        x1, y1 = min(info["width"], x1), min(info["height"], y1)
+        if x0 >= x1 or y0 >= y1:
+            return np.zeros((0, 0, 3), dtype=np.uint8)
+        region = MappedRaster(path, info["raw_tiles"], info["width"], info["height"]).read(x0, y0, x1, y1)
+        return _resize(region, scale)
 
-    # 3. Convert BGR to RGB (Red-Green-Blue).
-    # Most AI libraries (like MediaPipe) expect Red to be first.
-    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
-    
-    return image_rgb
+    factor = _reduction(info, scale)
+    image_bgr = _decode_whole(path, info, factor, Config.LOAD_PIXEL_BUDGET)
+    # Clip against what was decoded: EXIF rotation may have swapped the sides
+    dh, dw = image_bgr.shape[:2]
+    crop = image_bgr[y0 // factor:min(dh, -(-y1 // factor)), x0 // factor:min(dw, -(-x1 // factor))].copy()
+    del image_bgr
+    return cv2.cvtColor(_resize(crop, scale * factor), cv2.COLOR_BGR2RGB)
 
 def save_image_safe(image_rgb: np.ndarray, original_path: str, suffix: str) -> str:
     """
     Saves the processed image back to disk.
-    
+
     Why use Pillow (Image.fromarray) instead of OpenCV (cv2.imwrite)?
     OpenCV sometimes copies old metadata. Pillow creates a fresh file structure,
     stripping hidden data automatically.
@@ -47,5 +264,5 @@ def save_image_safe(image_rgb: np.ndarray, original_path: str, suffix: str) -> s
 
     # 3. Save it. We don't attach any 'exif' data, so it's clean.
     pil_image.save(new_path)
-    
-    return new_path
\ No newline at end of file
+
+    return new_path
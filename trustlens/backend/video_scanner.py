@@ -0,0 +1,277 @@
+"""
+Video and frame-sequence scanning (detect-then-track).
+
+The full face / barcode / PII detectors only run on keyframes: every
+Config.VIDEO_KEYFRAME_INTERVAL frames, or when a scene cut is detected.
+In between, boxes are carried forward with sparse optical flow. Decoding,
+detection and the blurring writer run as a pipeline with bounded queues,
+so memory stays constant regardless of clip length.
+
+Usage:
+    python video_scanner.py clip.mp4 --out clip_safe.mp4
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import registry
+from analyzer_triage import STAGE_FACES, STAGE_BARCODES, STAGE_TEXT
+from config import Config
+
+_END = object()
+
+
+def iter_frames(path):
+    """Streams (index, BGR frame) pairs from a video file or image sequence pattern."""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {path}")
+    try:
+        index = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def _threaded(generator, maxsize, poll=0.1):
+    """
+    Runs a generator on its own thread, handing items over a bounded queue.
+    If the consumer stops early (an error downstream, or it closes this
+    generator), the thread is told to stop and the queue is drained, so the
+    producer never stays blocked on a full queue and its source is closed.
+    """
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    errors = []
+
+    def put(item):
+        # Waits for room, but gives up once the consumer has gone
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=poll)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def pump():
+        try:
+            for item in generator:
+                if not put(item):
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            if hasattr(generator, "close"):
+                generator.close()
+            put(_END)
+
+    thread = threading.Thread(target=pump, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                if errors:
+                    raise errors[0]
+                return
+            yield item
+    finally:
+        stop.set()
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        thread.join()
+
+
+class _BlurWriter:
+    """Applies visible_blur and encodes frames on a background thread."""
+
+    def __init__(self, path, fps, size, protector):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+        self.protector = protector
+        self.queue = queue.Queue(maxsize=Config.VIDEO_QUEUE_SIZE)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                break
+            if self.error is not None:
+                continue  # keep draining so the producer never blocks
+            frame, detections = item
+            try:
+                if detections:
+                    # Blur and black boxes are colour-order agnostic, so BGR is fine
+                    frame = self.protector.visible_blur(frame, detections)
+                self.writer.write(frame)
+            except Exception as e:
+                self.error = e
+
+    def put(self, frame, detections):
+        self.queue.put((frame, detections))
+
+    def close(self):
+        self.queue.put(_END)
+        self.thread.join()
+        self.writer.release()
+        if self.error is not None:
+            raise self.error
+
+
+class VideoScanner:
+    def __init__(self, keyframe_interval=None, scene_threshold=None):
+        self.keyframe_interval = keyframe_interval or Config.VIDEO_KEYFRAME_INTERVAL
+        self.scene_threshold = scene_threshold or Config.VIDEO_SCENE_THRESHOLD
+        self.content = registry.get("content")
+        self.triage = registry.get("triage")
+        self.protector = registry.get("protection")
+
+    def _signature(self, gray):
+        # Tiny thumbnail used for cut detection
+        return cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def detect(self, frame_bgr):
+        """Full detection pass (triage + detectors) on one frame, boxes in pixels."""
+        frame_rgb = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB)
+        run, deferred, _ = self.triage.plan(self.triage.classify(frame_rgb))
+        run = run + deferred
+        detections = []
+        if STAGE_FACES in run:
+            detections += self.content.analyze_faces(frame_rgb)[0]
+        if STAGE_BARCODES in run:
+            detections += self.content.scan_barcodes(frame_rgb)
+        if STAGE_TEXT in run:
+            detections += self.content.scan_text_pii(frame_rgb)
+        return detections
+
+    def track(self, prev_small, small, detections):
+        """
+        Moves every box by the median optical flow of the feature points
+        inside it. Points for all boxes go through a single LK call.
+        """
+        if not detections:
+            return detections
+        scale = Config.VIDEO_TRACK_SCALE
+        h, w = small.shape[:2]
+        points, owners = [], []
+        for i, det in enumerate(detections):
+            x, y, bw, bh = det['box']
+            x0, y0 = max(0, int(x * scale)), max(0, int(y * scale))
+            x1, y1 = min(w, int((x + bw) * scale)), min(h, int((y + bh) * scale))
+            if x1 - x0 < 4 or y1 - y0 < 4:
+                continue
+            found = cv2.goodFeaturesToTrack(prev_small[y0:y1, x0:x1], Config.VIDEO_TRACK_POINTS, 0.01, 3)
+            if found is None:
+                # Flat region: fall back to a 3x3 grid over the box
+                gx, gy = np.meshgrid(np.linspace(0, x1 - x0 - 1, 3), np.linspace(0, y1 - y0 - 1, 3))
+                found = np.stack([gx.ravel(), gy.ravel()], axis=-1).reshape(-1, 1, 2)
+            found = found.astype(np.float32) + np.array([x0, y0], dtype=np.float32)
+            points.append(found)
+            owners += [i] * len(found)
+        if not points:
+            return detections
+
+        start = np.concatenate(points)
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_small, small, start, None, winSize=(21, 21), maxLevel=3)
+        owners = np.array(owners)
+        ok = status.reshape(-1) == 1
+        shift = (moved - start).reshape(-1, 2)
+
+        tracked = []
+        for i, det in enumerate(detections):
+            sel = ok & (owners == i)
+            dx, dy = (np.median(shift[sel], axis=0) / scale) if sel.sum() >= 3 else (0.0, 0.0)
+            x, y, bw, bh = det['box']
+            tracked.append({**det, 'box': [x + float(dx), y + float(dy), bw, bh]})
+        return tracked
+
+    def scan(self, path, out_path=None):
+        """
+        Scans a clip, optionally writing a redacted copy to out_path.
+        Returns a summary with per-keyframe detection counts and throughput.
+        """
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        cap.release()
+
+        writer = None
+        detections, prev_small, last_signature, last_key = [], None, None, None
+        frames = keyframes = cuts = 0
+        peak_targets = 0
+        start = time.perf_counter()
+        frame_source = _threaded(iter_frames(path), Config.VIDEO_QUEUE_SIZE)
+        try:
+            for index, frame in frame_source:
+                if writer is None and out_path:
+                    h, w = frame.shape[:2]
+                    writer = _BlurWriter(out_path, fps, (w, h), self.protector)
+
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                small = cv2.resize(gray, (0, 0), fx=Config.VIDEO_TRACK_SCALE, fy=Config.VIDEO_TRACK_SCALE,
+                                   interpolation=cv2.INTER_AREA)
+                signature = self._signature(gray)
+
+                is_cut = last_signature is not None and \
+                    float(np.abs(signature - last_signature).mean()) > self.scene_threshold
+                if last_key is None or is_cut or index - last_key >= self.keyframe_interval:
+                    detections = self.detect(frame)
+                    keyframes += 1
+                    cuts += int(is_cut)
+                    last_key = index
+                    last_signature = signature
+                else:
+                    detections = self.track(prev_small, small, detections)
+
+                peak_targets = max(peak_targets, len(detections))
+                prev_small = small
+                frames += 1
+                if writer is not None:
+                    writer.put(frame, detections)
+        finally:
+            # Stops the decoder thread too if we leave early
+            frame_source.close()
+            if writer is not None:
+                writer.close()
+
+        elapsed = time.perf_counter() - start
+        processed_fps = frames / elapsed if elapsed > 0 else 0.0
+        return {
+            "frames": frames,
+            "keyframes": keyframes,
+            "scene_cuts": cuts,
+            "peak_targets": peak_targets,
+            "elapsed_s": round(elapsed, 2),
+            "processed_fps": round(processed_fps, 1),
+            "realtime_factor": round(processed_fps / fps, 2) if fps else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TrustLens video scanner")
+    parser.add_argument("video", help="Video file (or image sequence pattern like frames/%%05d.png)")
+    parser.add_argument("--out", help="Write a redacted copy here (mp4)")
+    parser.add_argument("--keyframe-interval", type=int, default=None)
+    args = parser.parse_args()
+
+    summary = VideoScanner(keyframe_interval=args.keyframe_interval).scan(args.video, args.out)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()